@@ -0,0 +1,2 @@
+"""Benchmarks for pubtools-exodus, run against local stand-ins for
+exodus-gw and exodus-rsync. See benchmarks/README.md."""
@@ -0,0 +1,279 @@
+"""A local, in-process stand-in for exodus-gw.
+
+Implements enough of the exodus-gw API for pubtools-exodus to create,
+populate and commit publishes and to upload content, with configurable
+latency and error injection.
+"""
+
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+
+try:
+    from typing import Optional
+except ImportError:  # pragma: no cover
+    # Only needed for type comments, and unavailable on Python 2.
+    pass
+
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler
+from six.moves.urllib.parse import parse_qs, urlparse
+
+try:
+    from http.server import ThreadingHTTPServer
+except ImportError:  # pragma: no cover
+    # Python 2
+    from BaseHTTPServer import HTTPServer
+    from SocketServer import ThreadingMixIn
+
+    class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):  # type: ignore
+        pass
+
+
+# Errors are only injected for methods which clients retry; a failed POST
+# isn't retried by pubtools-exodus, so would just end the run.
+RETRIED_METHODS = ("GET", "HEAD", "PUT", "DELETE")
+
+
+class FakeGateway(object):
+    """Serves a fake exodus-gw on a local port.
+
+    Args:
+        latency (float):
+            Seconds to delay every response.
+        error_rate (float):
+            Fraction of retryable requests which fail with 503.
+        commit_polls (int):
+            Number of times a commit task is polled before it completes.
+        seed (int):
+            Seed for error injection, for repeatable runs.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, commit_polls=2, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.commit_polls = commit_polls
+
+        self.requests = Counter()
+        self.errors = 0
+        self.items = 0
+        self.uploaded_bytes = 0
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._polls = Counter()
+        self._blobs = set()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:%s" % self._server.server_address[1]
+
+    def start(self):
+        handler = type("Handler", (FakeGatewayHandler,), {"gateway": self})
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def stats(self):
+        return {
+            "requests": dict(self.requests),
+            "errors_injected": self.errors,
+            "items": self.items,
+            "uploaded_bytes": self.uploaded_bytes,
+        }
+
+    def inject_error(self, method):
+        if not self.error_rate or method not in RETRIED_METHODS:
+            return False
+        with self._lock:
+            if self._random.random() >= self.error_rate:
+                return False
+            self.errors += 1
+            return True
+
+    def handle(self, method, path, query, body):
+        """Returns (status, headers, body) for a request."""
+
+        parts = path.strip("/").split("/")
+
+        if method == "GET" and parts == ["whoami"]:
+            return self.json(
+                {
+                    "client": {
+                        "roles": ["pusher"],
+                        "authenticated": True,
+                        "serviceAccountId": "benchmark",
+                    },
+                    "user": {
+                        "roles": [],
+                        "authenticated": False,
+                        "internalUsername": None,
+                    },
+                }
+            )
+
+        if len(parts) >= 2 and parts[1] == "publish":
+            return self.handle_publish(method, parts, body)
+
+        if method == "GET" and len(parts) == 2 and parts[0] == "task":
+            with self._lock:
+                self._polls[parts[1]] += 1
+                done = self._polls[parts[1]] >= self.commit_polls
+            return self.json(self.task(parts[1], done))
+
+        if len(parts) == 3 and parts[0] == "upload":
+            return self.handle_upload(method, parts[2], query, body)
+
+        return self.json({"detail": "Not Found"}, 404)
+
+    def handle_publish(self, method, parts, body):
+        env = parts[0]
+
+        if method == "POST" and len(parts) == 2:
+            publish_id = str(uuid.uuid4())
+            base = "/%s/publish/%s" % (env, publish_id)
+            return self.json(
+                {
+                    "id": publish_id,
+                    "env": env,
+                    "links": {"self": base, "commit": base + "/commit"},
+                    "items": [],
+                }
+            )
+
+        if method == "PUT" and len(parts) == 3:
+            items = json.loads(body.decode("utf-8"))
+            with self._lock:
+                self.items += len(items)
+            return self.json({})
+
+        if method == "POST" and len(parts) == 4 and parts[3] == "commit":
+            return self.json(self.task(str(uuid.uuid4()), False))
+
+        return self.json({"detail": "Not Found"}, 404)
+
+    def handle_upload(self, method, key, query, body):
+        if method == "HEAD":
+            status = 200 if key in self._blobs else 404
+            return status, {}, b""
+
+        if method == "DELETE":
+            return 204, {}, b""
+
+        if method == "PUT":
+            with self._lock:
+                self.uploaded_bytes += len(body)
+                if "uploadId" not in query:
+                    self._blobs.add(key)
+            return 200, {"ETag": '"%s"' % uuid.uuid4().hex}, b""
+
+        if method == "POST" and "uploads" in query:
+            return (
+                200,
+                {"Content-Type": "application/xml"},
+                (
+                    "<InitiateMultipartUploadResult>"
+                    "<UploadId>%s</UploadId>"
+                    "</InitiateMultipartUploadResult>" % uuid.uuid4().hex
+                ).encode("utf-8"),
+            )
+
+        if method == "POST" and "uploadId" in query:
+            with self._lock:
+                self._blobs.add(key)
+            return (
+                200,
+                {"Content-Type": "application/xml"},
+                b"<CompleteMultipartUploadResult/>",
+            )
+
+        return self.json({"detail": "Not Found"}, 404)
+
+    @staticmethod
+    def task(task_id, done):
+        return {
+            "id": task_id,
+            "state": "COMPLETE" if done else "IN_PROGRESS",
+            "links": {"self": "/task/%s" % task_id},
+        }
+
+    @staticmethod
+    def json(data, status=200):
+        return (
+            status,
+            {"Content-Type": "application/json"},
+            json.dumps(data).encode("utf-8"),
+        )
+
+
+class FakeGatewayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    gateway = None  # type: Optional[FakeGateway]
+
+    def handle_any(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+
+        url = urlparse(self.path)
+        path = url.path
+        query = parse_qs(url.query, keep_blank_values=True)
+
+        gateway = self.gateway
+        with gateway._lock:  # pylint: disable=protected-access
+            gateway.requests["%s %s" % (self.command, endpoint(path))] += 1
+
+        if gateway.latency:
+            time.sleep(gateway.latency)
+
+        if gateway.inject_error(self.command):
+            status, headers, out = gateway.json({"detail": "injected"}, 503)
+        else:
+            status, headers, out = gateway.handle(
+                self.command, path, query, body
+            )
+
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(out)
+
+    do_GET = do_HEAD = do_PUT = do_POST = do_DELETE = handle_any
+
+    def log_message(self, *_):  # pylint: disable=arguments-differ
+        pass
+
+
+def endpoint(path):
+    """Returns a request path with ids removed, for counting requests by
+    endpoint."""
+
+    parts = path.strip("/").split("/")
+    if parts[0] == "task":
+        return "/task/{id}"
+    if parts[0] == "upload":
+        return "/upload/{env}/{key}"
+    if len(parts) >= 2 and parts[1] == "publish":
+        rest = ["{id}"] + parts[3:] if len(parts) > 2 else []
+        return "/".join(["/{env}/publish"] + rest)
+    return path
@@ -0,0 +1,174 @@
+"""Compares the ways pubtools-exodus can checksum files.
+
+Usage:
+
+    python -m benchmarks.hashing --files 1000 --file-size 4096,16777216 \\
+        --workers 4 [--repeat 3] [--output results.json]
+
+For each combination of file count and size, generated files are hashed:
+
+- serially, one file after another (serial);
+- by --workers threads, as by pubtools-exodus-push --workers (threads);
+- by a pool of --workers processes, as by pubtools-exodus-push
+  --hash-processes (processes).
+
+Files are hashed once before timing, so results reflect hashing files in
+the page cache rather than the speed of the disk. Process pool start-up is
+included in the timings.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+from pubtools.exodus._tasks.hasher import ProcessHasher
+from pubtools.exodus._tasks.native import sha256_file
+from pubtools.exodus._tasks.pipeline import threaded_map
+
+from .run import int_list, median
+
+METHODS = ("serial", "threads", "processes")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--files",
+        type=int_list,
+        default=[1000],
+        help="Comma-separated counts of files to hash",
+    )
+    parser.add_argument(
+        "--file-size",
+        type=int_list,
+        default=[4096, 16 * 1024 * 1024],
+        help="Comma-separated sizes of each file, in bytes",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() if hasattr(os, "cpu_count") else 4,
+        help="Number of threads or processes to hash with",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of times to run each case",
+    )
+    parser.add_argument("--output", help="Write results to this file")
+    return parser.parse_args(argv)
+
+
+def make_files(path, count, size):
+    chunk = os.urandom(min(size, 1024 * 1024))
+    paths = []
+    for i in range(count):
+        name = os.path.join(path, "file-%s" % i)
+        with open(name, "wb") as f:
+            # Vary the start of each file so their digests differ.
+            f.write(("%s\n" % i).encode("utf-8"))
+            remaining = size
+            while remaining > 0:
+                f.write(chunk[:remaining])
+                remaining -= len(chunk)
+        paths.append(name)
+    return paths
+
+
+def hash_serial(paths, _workers):
+    return [sha256_file(path) for path in paths]
+
+
+def hash_threads(paths, workers):
+    return list(threaded_map(sha256_file, paths, workers=workers))
+
+
+def hash_processes(paths, workers):
+    with ProcessHasher(workers) as hasher:
+        return [key for _, _, key in hasher.hash_files([(p,) for p in paths])]
+
+
+def run_method(method, paths, workers):
+    fn = {
+        "serial": hash_serial,
+        "threads": hash_threads,
+        "processes": hash_processes,
+    }[method]
+    start = time.time()
+    digests = fn(paths, workers)
+    elapsed = time.time() - start
+    assert len(digests) == len(paths)
+    return elapsed
+
+
+def run(config):
+    results = []
+    for count in config.files:
+        for size in config.file_size:
+            tmpdir = tempfile.mkdtemp(prefix="exodus-bench-hash-")
+            try:
+                paths = make_files(tmpdir, count, size)
+                hash_serial(paths, 1)
+
+                for method in METHODS:
+                    runs = [
+                        run_method(method, paths, config.workers)
+                        for _ in range(config.repeat)
+                    ]
+                    elapsed = median(runs)
+                    results.append(
+                        {
+                            "method": method,
+                            "files": count,
+                            "file_size": size,
+                            "workers": config.workers,
+                            "elapsed": runs,
+                            "elapsed_median": elapsed,
+                            "files_per_sec": count / elapsed,
+                            "bytes_per_sec": count * size / elapsed,
+                        }
+                    )
+                    sys.stderr.write(
+                        "%-10s files=%-6s size=%-9s %8.3fs %10.1f MB/s\n"
+                        % (
+                            method,
+                            count,
+                            size,
+                            elapsed,
+                            count * size / elapsed / 1e6,
+                        )
+                    )
+            finally:
+                shutil.rmtree(tmpdir, ignore_errors=True)
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "results": results,
+    }
+
+
+def main(argv=None):
+    config = parse_args(argv)
+
+    output = run(config)
+
+    text = json.dumps(output, indent=2, sort_keys=True)
+    if config.output:
+        with open(config.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    return output
+
+
+if __name__ == "__main__":
+    main()
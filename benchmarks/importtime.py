@@ -0,0 +1,157 @@
+"""Measures the startup cost of pubtools-exodus entry points.
+
+Usage:
+
+    python -m benchmarks.importtime [--repeat 10] [--output results.json] \\
+        [--check]
+
+pubtools loads the pubtools-exodus Pulp hooks in every task, whether or not
+Exodus is enabled, so their import cost is paid many times a day. Each
+case here runs in a fresh Python process and reports the median time taken
+by the case itself (excluding interpreter startup), along with any known
+slow-to-import modules the case loaded. With --check, the command fails if
+a case loads a module it's expected to avoid.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+# Modules which are slow to import and which cheap entry points must not
+# load. Between them they account for most of the import time of
+# pubtools-exodus when loaded eagerly.
+SLOW_MODULES = ("requests", "urllib3", "attr", "pushsource")
+
+# Cases as (name, code, extra environment). The code runs after a timer
+# starts in a fresh interpreter.
+CASES = [
+    (
+        "pulp-hooks-disabled",
+        "from pubtools.pluggy import pm\n"
+        "import pubtools.exodus._hooks.pulp\n"
+        "pm.hook.task_start()\n",
+        {"EXODUS_ENABLED": "false"},
+    ),
+    (
+        "push-help",
+        "from pubtools.exodus._tasks.push import entry_point\n"
+        "try:\n"
+        "    entry_point(['--help'])\n"
+        "except SystemExit:\n"
+        "    pass\n",
+        {},
+    ),
+]
+
+# Wraps a case to time it and report the slow modules it loaded, as JSON
+# on the last line of output.
+WRAPPER = """
+import json, sys
+from timeit import default_timer
+start = default_timer()
+%s
+elapsed = default_timer() - start
+slow = [m for m in %r if m in sys.modules]
+print(json.dumps({"elapsed": elapsed, "slow_modules": slow}))
+"""
+
+
+def run_case(code, env):
+    child_env = os.environ.copy()
+    child_env.update(env)
+    output = subprocess.check_output(
+        [sys.executable, "-c", WRAPPER % (code, SLOW_MODULES)],
+        env=child_env,
+        universal_newlines=True,
+    )
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def median(values):
+    values = sorted(values)
+    mid = len(values) // 2
+    if len(values) % 2:
+        return values[mid]
+    return (values[mid - 1] + values[mid]) / 2.0
+
+
+def run(repeat):
+    results = []
+    for name, code, env in CASES:
+        runs = [run_case(code, env) for _ in range(repeat)]
+        elapsed = median([r["elapsed"] for r in runs])
+        results.append(
+            {
+                "case": name,
+                "elapsed": [r["elapsed"] for r in runs],
+                "elapsed_median": elapsed,
+                "slow_modules": runs[-1]["slow_modules"],
+            }
+        )
+        sys.stderr.write(
+            "%-20s %8.1fms  slow modules: %s\n"
+            % (
+                name,
+                elapsed * 1000,
+                ", ".join(runs[-1]["slow_modules"]) or "none",
+            )
+        )
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "results": results,
+    }
+
+
+def check(output):
+    """Returns lines describing cases which loaded slow modules."""
+
+    return [
+        "%s imported %s" % (r["case"], ", ".join(r["slow_modules"]))
+        for r in output["results"]
+        if r["slow_modules"]
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=10,
+        help="Number of times to run each case",
+    )
+    parser.add_argument("--output", help="Write results to this file")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Fail if any case imports a known slow module",
+    )
+    config = parser.parse_args(argv)
+
+    output = run(config.repeat)
+
+    text = json.dumps(output, indent=2, sort_keys=True)
+    if config.output:
+        with open(config.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    problems = check(output)
+    for line in problems:
+        sys.stderr.write(line + "\n")
+    if config.check and problems:
+        sys.exit(1)
+
+    return output
+
+
+if __name__ == "__main__":
+    main()
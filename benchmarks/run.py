@@ -0,0 +1,356 @@
+"""Runs pubtools-exodus benchmarks and writes results as JSON.
+
+Usage:
+
+    python -m benchmarks.run --items 10,100 --file-size 1024,1048576 \\
+        --workers 1,4 --output results.json [--compare baseline.json]
+
+Each case pushes generated content with ExodusPushTask, or publishes a
+number of repositories through the Pulp hooks, against a local fake
+exodus-gw (and, for the rsync engine, a fake exodus-rsync).
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .fakegw import FakeGateway
+
+BIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bin")
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ("push-rsync", "push-native", "pulp")
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",")]
+
+
+def str_list(value):
+    return value.split(",")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--scenarios",
+        type=str_list,
+        default=list(SCENARIOS),
+        help="Comma-separated scenarios to run (%s)" % ",".join(SCENARIOS),
+    )
+    parser.add_argument(
+        "--items",
+        type=int_list,
+        default=[10, 100],
+        help="Comma-separated push item (or Pulp repository) counts",
+    )
+    parser.add_argument(
+        "--files-per-item",
+        type=int,
+        default=10,
+        help="Number of files in each push item",
+    )
+    parser.add_argument(
+        "--file-size",
+        type=int_list,
+        default=[1024, 1024 * 1024],
+        help="Comma-separated file sizes, in bytes",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int_list,
+        default=[1, 4],
+        help="Comma-separated concurrency levels",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of times to run each case",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="Seconds of latency added to each exodus-gw response",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of retryable exodus-gw requests which fail with 503",
+    )
+    parser.add_argument(
+        "--rsync-latency",
+        type=float,
+        default=0.0,
+        help="Seconds of startup latency for each fake exodus-rsync",
+    )
+    parser.add_argument(
+        "--output", help="Write results to this file (default: stdout)"
+    )
+    parser.add_argument(
+        "--compare",
+        metavar="BASELINE",
+        help="Compare results with those in an earlier results file",
+    )
+    return parser.parse_args(argv)
+
+
+def make_staged(root, items, files_per_item, file_size):
+    """Creates a staged source with the given number of push items, each a
+    directory holding 'files_per_item' files of 'file_size' bytes."""
+
+    for i in range(items):
+        raw = os.path.join(root, "dest-%s" % i, "RAW")
+        os.makedirs(raw)
+        for j in range(files_per_item):
+            with open(os.path.join(raw, "file-%s" % j), "wb") as f:
+                # Unique content per file, so that nothing is deduplicated
+                f.write(("%s/%s\n" % (i, j)).encode("utf-8").ljust(file_size))
+
+
+def gateway_env(gateway, tmpdir, rsync_latency):
+    cert = os.path.join(tmpdir, "bench.crt")
+    key = os.path.join(tmpdir, "bench.key")
+    for path in (cert, key):
+        with open(path, "w") as f:
+            f.write(path)
+
+    path = os.pathsep.join(
+        [BIN_DIR, os.path.dirname(sys.executable), os.environ.get("PATH", "")]
+    )
+    pythonpath = os.pathsep.join([ROOT_DIR, os.environ.get("PYTHONPATH", "")])
+
+    return {
+        "EXODUS_ENABLED": "true",
+        "EXODUS_GW_URL": gateway.url,
+        "EXODUS_GW_ENV": "bench",
+        "EXODUS_GW_CERT": cert,
+        "EXODUS_GW_KEY": key,
+        "EXODUS_GW_WAIT": "0.5",
+        "EXODUS_GW_WAIT_MIN": "0.01",
+        "FAKE_EXODUS_RSYNC_LATENCY": str(rsync_latency),
+        "PATH": path,
+        "PYTHONPATH": pythonpath,
+    }
+
+
+class patched_environ(object):
+    def __init__(self, env):
+        self.env = env
+        self.saved = None
+
+    def __enter__(self):
+        self.saved = dict(os.environ)
+        os.environ.update(self.env)
+
+    def __exit__(self, *_):
+        os.environ.clear()
+        os.environ.update(self.saved)
+
+
+def run_push(engine, staged, workers):
+    # Imported late so that the benchmark harness doesn't affect import
+    # timing of the code under test.
+    from pubtools.exodus._tasks.push import ExodusPushTask
+
+    args = ["--workers", str(workers), "--engine", engine]
+    ExodusPushTask(args=args + ["staged:%s" % staged]).run()
+
+
+def run_pulp(repos, workers):
+    from pubtools.pluggy import pm
+    from pubtools.pulplib import PublishOptions, Repository
+
+    from pubtools.exodus._hooks import pulp
+
+    pulp.task_start()
+
+    def publish(i):
+        pm.hook.pulp_repository_pre_publish(
+            repository=Repository(id="repo-%s" % i), options=PublishOptions()
+        )
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(publish, range(repos)))
+
+    pm.hook.task_pulp_flush()
+    pm.hook.task_stop(failed=False)
+
+
+def run_case(config, scenario, items, file_size, workers):
+    """Runs one case once, returning a result dict."""
+
+    tmpdir = tempfile.mkdtemp(prefix="exodus-bench-")
+    try:
+        staged = os.path.join(tmpdir, "staged")
+        if scenario != "pulp":
+            make_staged(staged, items, config.files_per_item, file_size)
+
+        gateway = FakeGateway(
+            latency=config.latency, error_rate=config.error_rate
+        )
+        with gateway:
+            env = gateway_env(gateway, tmpdir, config.rsync_latency)
+            with patched_environ(env):
+                start = time.time()
+                if scenario == "pulp":
+                    run_pulp(items, workers)
+                else:
+                    run_push(scenario.split("-", 1)[1], staged, workers)
+                elapsed = time.time() - start
+
+        return dict(
+            elapsed=elapsed,
+            threads=threading.active_count(),
+            **gateway.stats()
+        )
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def median(values):
+    values = sorted(values)
+    mid = len(values) // 2
+    if len(values) % 2:
+        return values[mid]
+    return (values[mid - 1] + values[mid]) / 2.0
+
+
+def cases(config):
+    for scenario in config.scenarios:
+        if scenario not in SCENARIOS:
+            raise ValueError("Unknown scenario: %s" % scenario)
+        # File size is meaningless for Pulp, which pushes no content
+        sizes = [0] if scenario == "pulp" else config.file_size
+        for items, size, workers in itertools.product(
+            config.items, sizes, config.workers
+        ):
+            yield scenario, items, size, workers
+
+
+def case_key(result):
+    return (
+        result["scenario"],
+        result["items"],
+        result["file_size"],
+        result["workers"],
+    )
+
+
+def run(config):
+    results = []
+    for scenario, items, file_size, workers in cases(config):
+        runs = [
+            run_case(config, scenario, items, file_size, workers)
+            for _ in range(config.repeat)
+        ]
+        elapsed = median([r["elapsed"] for r in runs])
+        files = 0 if scenario == "pulp" else items * config.files_per_item
+
+        result = {
+            "scenario": scenario,
+            "items": items,
+            "files_per_item": config.files_per_item,
+            "file_size": file_size,
+            "workers": workers,
+            "elapsed": [r["elapsed"] for r in runs],
+            "elapsed_median": elapsed,
+            "items_per_sec": items / elapsed,
+            "files_per_sec": files / elapsed,
+            "bytes_per_sec": files * file_size / elapsed,
+            "gateway": {
+                key: runs[-1][key]
+                for key in ("requests", "errors_injected", "items")
+            },
+        }
+        results.append(result)
+        sys.stderr.write(
+            "%-12s items=%-6s size=%-9s workers=%-3s %8.3fs\n"
+            % (scenario, items, file_size, workers, elapsed)
+        )
+
+    return {
+        "version": package_version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {
+            "files_per_item": config.files_per_item,
+            "repeat": config.repeat,
+            "latency": config.latency,
+            "error_rate": config.error_rate,
+            "rsync_latency": config.rsync_latency,
+        },
+        "results": results,
+    }
+
+
+def package_version():
+    try:
+        import pkg_resources
+
+        return pkg_resources.get_distribution("pubtools-exodus").version
+    except Exception:  # pylint: disable=broad-except
+        return "unknown"
+
+
+def compare(baseline, current):
+    """Returns lines comparing the median time of each case in 'current'
+    with the same case in 'baseline'."""
+
+    old = {case_key(r): r for r in baseline["results"]}
+    out = [
+        "Comparing %s with baseline %s"
+        % (current["version"], baseline["version"])
+    ]
+    for result in current["results"]:
+        before = old.get(case_key(result))
+        if not before:
+            continue
+        change = result["elapsed_median"] / before["elapsed_median"] - 1
+        out.append(
+            "%-12s items=%-6s size=%-9s workers=%-3s %8.3fs -> %8.3fs (%+.1f%%)"
+            % (
+                case_key(result)
+                + (before["elapsed_median"], result["elapsed_median"])
+                + (change * 100,)
+            )
+        )
+    return out
+
+
+def main(argv=None):
+    config = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    output = run(config)
+
+    text = json.dumps(output, indent=2, sort_keys=True)
+    if config.output:
+        with open(config.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if config.compare:
+        with open(config.compare) as f:
+            baseline = json.load(f)
+        for line in compare(baseline, output):
+            sys.stderr.write(line + "\n")
+
+    return output
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+import os
+
+
+def env_flag(name, default="False"):
+    """Returns True if an environment variable is set to a true value."""
+
+    return os.getenv(name, default).lower() in ["true", "t", "1", "yes", "y"]
@@ -0,0 +1,148 @@
+import json
+import re
+
+# Text up to and including the next bracket outside of any string, capturing
+# the bracket.
+_BRACKET = re.compile(
+    r'[^"\[\]{}]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"\[\]{}]*)*([\[\]{}])'
+)
+_SPACE = re.compile(r"\s*")
+_DECODER = json.JSONDecoder()
+
+
+def _skip_value(text, idx):
+    """Returns the index just past the JSON value starting at 'idx', without
+    decoding any object or array."""
+
+    if text[idx] not in "[{":
+        # A scalar, which is cheap to decode.
+        return _DECODER.raw_decode(text, idx)[1]
+
+    depth = 0
+    while True:
+        # Matched from each bracket to the next, rather than searched for,
+        # so that invalid JSON fails in linear time.
+        match = _BRACKET.match(text, idx)
+        if not match:
+            raise ValueError("Unterminated JSON value")
+        idx = match.end()
+        if match.group(1) in "[{":
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return idx
+
+
+def json_fields(text, names):
+    """Returns a dict of the fields named in 'names' from the top level of
+    the JSON object in 'text'.
+
+    The object is scanned one field at a time, decoding only the named
+    fields and stopping once all have been found, so that large fields
+    which aren't needed, such as a publish's items, cost no more than a
+    scan of their text.
+    """
+
+    out = {}
+    try:
+        idx = _SPACE.match(text).end()
+        if text[idx] != "{":
+            raise ValueError("Expected a JSON object")
+        idx = _SPACE.match(text, idx + 1).end()
+
+        while text[idx] != "}" and len(out) < len(names):
+            name, idx = _DECODER.raw_decode(text, idx)
+            idx = _SPACE.match(text, idx).end()
+            if text[idx] != ":":
+                raise ValueError("Expected ':' at %s" % idx)
+            idx = _SPACE.match(text, idx + 1).end()
+
+            if name in names:
+                out[name], idx = _DECODER.raw_decode(text, idx)
+            else:
+                idx = _skip_value(text, idx)
+
+            idx = _SPACE.match(text, idx).end()
+            if text[idx] == ",":
+                idx = _SPACE.match(text, idx + 1).end()
+            elif text[idx] != "}":
+                raise ValueError("Expected ',' or '}' at %s" % idx)
+    except IndexError:
+        raise ValueError("Truncated JSON object")
+
+    return out
+
+
+class Handle(object):
+    """A compact reference to an object in exodus-gw, keeping only the
+    fields named in __slots__.
+
+    Handles may be read like the JSON dicts returned by exodus-gw, e.g.
+    ``publish["id"]``, but don't keep anything else from the response.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    @classmethod
+    def from_json(cls, data):
+        """Returns a handle for an object already decoded from JSON."""
+
+        return cls(**dict((name, data.get(name)) for name in cls.__slots__))
+
+    @classmethod
+    def from_response(cls, response):
+        """Returns a handle for the object in an exodus-gw response, without
+        decoding fields the handle doesn't keep."""
+
+        text = response.content.decode("utf-8")
+        return cls(**json_fields(text, cls.__slots__))
+
+    def __getitem__(self, name):
+        if name not in self.__slots__:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def get(self, name, default=None):
+        value = getattr(self, name, None) if name in self.__slots__ else None
+        return default if value is None else value
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name)
+            for name in self.__slots__
+        )
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None  # type: ignore
+
+    def __repr__(self):
+        return "%s(%s)" % (
+            type(self).__name__,
+            ", ".join(
+                "%s=%r" % (name, getattr(self, name))
+                for name in self.__slots__
+            ),
+        )
+
+
+class Publish(Handle):
+    """An exodus-gw publish, as returned by
+    :meth:`~pubtools.exodus.gateway.ExodusGatewaySession.new_publish`.
+
+    The publish's items are never kept, however many it has.
+    """
+
+    __slots__ = ("id", "env", "state", "links")
+
+
+class CommitTask(Handle):
+    """The exodus-gw task committing a publish."""
+
+    __slots__ = ("id", "publish_id", "state", "links")
@@ -1,76 +1,41 @@
-import logging
 import sys
-from threading import Lock
 
-import attr
-from pubtools.pluggy import hookimpl, pm  # pylint: disable=wrong-import-order
+from pubtools.pluggy import hookimpl, pm
 
-from ..gateway import ExodusGatewaySession
+from .._env import env_flag
 
-LOG = logging.getLogger("pubtools-exodus")
+# This module is loaded by every pubtools task with pubtools-exodus
+# installed, so it avoids importing anything more until a task actually
+# uses Exodus.
 
-# pylint: disable=unused-argument
+# True while a pubtools-exodus task is running. Such tasks create their own
+# publish, so the Pulp hooks must never create one within them.
+IN_EXODUS_TASK = False
 
 
-class ExodusPulpHandler(ExodusGatewaySession):
-    def __init__(self):
-        super(ExodusPulpHandler, self).__init__()
+def eager_publish():
+    """Returns True if the publish should be created as soon as the task
+    starts, rather than once a repository needs it.
 
-        self.lock = Lock()
+    Only Pulp tasks which publish repositories benefit, and not every task
+    using these hooks does, so this is enabled by EXODUS_PULP_EAGER_PUBLISH,
+    set in the environment of those tasks.
+    """
 
-    @hookimpl
-    def pulp_repository_pre_publish(self, repository, options):
-        """Invoked as the first step in publishing a Pulp repository.
-
-        This implementation adds to each config the --exodus-publish argument,
-        attaching the repository to an exodus-gw publish.
-
-        Args:
-            repository (:class:`~pubtools.pulplib.Repository`):
-                The repository to be published.
-            options (:class:`~pubtools.pulplib.PublishOptions`):
-                The options to use in publishing.
-        Returns:
-            options (:class:`~pubtools.pulplib.PublishOptions`):
-                The adjusted options used for this publish.
-        """
-
-        with self.lock:
-            if not self.publish:
-                self.publish = self.new_publish()
-
-        if not self.publish:
-            return None
-
-        args = (
-            list(options.rsync_extra_args) if options.rsync_extra_args else []
-        )
-        args.append("--exodus-publish=%s" % self.publish["id"])
-        return attr.evolve(options, rsync_extra_args=args)
-
-    @hookimpl
-    def task_pulp_flush(self):
-        """Invoked during task execution after successful completion of all
-        Pulp publishes.
-
-        This implementation commits the active exodus-gw publish, making
-        the content visible on the target CDN environment.
-        """
-
-        if not self.publish:
-            LOG.debug("No exodus-gw publish to commit")
-            return
-
-        self.commit_publish(self.publish)
-
-    @hookimpl
-    def task_stop(self):
-        pm.unregister(self)
+    return not IN_EXODUS_TASK and env_flag("EXODUS_PULP_EAGER_PUBLISH")
 
 
 @hookimpl
 def task_start():
-    pm.register(ExodusPulpHandler())
+    if not env_flag("EXODUS_ENABLED"):
+        return
+
+    from .pulp_handler import ExodusPulpHandler
+
+    handler = ExodusPulpHandler()
+    pm.register(handler)
+    if eager_publish():
+        handler.start_publish()
 
 
 pm.register(sys.modules[__name__])
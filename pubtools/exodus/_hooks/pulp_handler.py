@@ -0,0 +1,131 @@
+import logging
+from threading import Lock
+
+import attr
+from pubtools.pluggy import hookimpl, pm  # pylint: disable=wrong-import-order
+
+from .._env import env_flag
+from ..gateway import ExodusGatewaySession, run_in_background
+
+LOG = logging.getLogger("pubtools-exodus")
+
+# pylint: disable=unused-argument
+
+
+class ExodusPulpHandler(ExodusGatewaySession):
+    def __init__(self):
+        super(ExodusPulpHandler, self).__init__()
+
+        self.lock = Lock()
+        self.publish_future = None
+        self.commit_future = None
+
+        # If enabled, task_pulp_flush only starts the commit, and waiting
+        # for it to complete is deferred until task_stop.
+        self.background_commit = env_flag("EXODUS_PULP_BACKGROUND_COMMIT")
+
+    def start_publish(self):
+        """Begins creating an exodus-gw publish in the background, so that
+        it's likely ready by the time any repository is published."""
+
+        if self.exodus_enabled:
+            self.publish_future = run_in_background(
+                "exodus-publish", self.new_publish
+            )
+
+    def await_publish(self):
+        """Returns the exodus-gw publish for this task, waiting for it to be
+        created if necessary."""
+
+        # Fast path once the publish exists: no locking needed.
+        publish = self.publish
+        if publish:
+            return publish
+
+        with self.lock, self.metrics.timer("await_publish"):
+            if not self.publish:
+                if self.publish_future:
+                    self.publish = self.publish_future.result()
+                else:
+                    self.publish = self.new_publish()
+            return self.publish
+
+    @hookimpl
+    def pulp_repository_pre_publish(self, repository, options):
+        """Invoked as the first step in publishing a Pulp repository.
+
+        This implementation adds to each config the --exodus-publish argument,
+        attaching the repository to an exodus-gw publish.
+
+        Args:
+            repository (:class:`~pubtools.pulplib.Repository`):
+                The repository to be published.
+            options (:class:`~pubtools.pulplib.PublishOptions`):
+                The options to use in publishing.
+        Returns:
+            options (:class:`~pubtools.pulplib.PublishOptions`):
+                The adjusted options used for this publish.
+        """
+
+        publish = self.await_publish()
+        if not publish:
+            return None
+
+        self.metrics.count("repositories")
+
+        args = (
+            list(options.rsync_extra_args) if options.rsync_extra_args else []
+        )
+        args.append("--exodus-publish=%s" % publish["id"])
+        return attr.evolve(options, rsync_extra_args=args)
+
+    @hookimpl
+    def task_pulp_flush(self):
+        """Invoked during task execution after successful completion of all
+        Pulp publishes.
+
+        This implementation commits the active exodus-gw publish, making
+        the content visible on the target CDN environment.
+
+        If EXODUS_PULP_BACKGROUND_COMMIT is enabled, the commit is started
+        here but polled on a background thread, and its outcome is only
+        awaited in task_stop.
+        """
+
+        if not self.publish:
+            LOG.debug("No exodus-gw publish to commit")
+            return
+
+        if not self.background_commit:
+            self.commit_publish(self.publish)
+            return
+
+        self.commit_future = self.watch_commit(self.start_commit(self.publish))
+
+    def await_commit(self):
+        """Waits for a commit started in the background to complete."""
+
+        LOG.debug(
+            "Waiting for exodus-gw publish %s to commit", self.publish["id"]
+        )
+        with self.metrics.timer("await_commit"):
+            self.commit_future.result()
+        LOG.info("Committed exodus-gw publish %s", self.publish["id"])
+
+    @hookimpl
+    def task_stop(self):
+        try:
+            if self.commit_future:
+                self.await_commit()
+            elif self.publish_future and not self.publish:
+                # Publish was created eagerly but never needed; don't leave
+                # the creation running beyond the task.
+                try:
+                    self.publish_future.result()
+                except Exception as error:  # pylint: disable=broad-except
+                    LOG.debug("Creating exodus-gw publish failed: %s", error)
+        finally:
+            if self.session:
+                LOG.debug("exodus-gw connection pool: %s", self.pool_stats)
+                self.report_metrics("pulp")
+            pm.unregister(self)
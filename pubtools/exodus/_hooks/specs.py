@@ -0,0 +1,136 @@
+import logging
+import sys
+
+from pubtools.pluggy import hookspec, pm
+
+LOG = logging.getLogger("pubtools-exodus")
+
+# pylint: disable=unused-argument
+
+
+@hookspec
+def exodus_gw_request(method, url, status_code, duration, retries, sizes):
+    """Invoked after each request made to exodus-gw.
+
+    Args:
+        method (str):
+            HTTP method of the request.
+        url (str):
+            URL of the request.
+        status_code (int):
+            Status code of the final response, or None if no response was
+            received.
+        duration (float):
+            Seconds taken by the request, including any retries.
+        retries (int):
+            Number of times the request was retried.
+        sizes (tuple):
+            (request body size, response body size) in bytes. Either may
+            be None if not known without extra work, e.g. for a streamed
+            request body.
+    """
+
+
+@hookspec
+def exodus_publish_created(publish, duration):
+    """Invoked after an exodus-gw publish is created.
+
+    Args:
+        publish (Publish):
+            The publish, as returned by exodus-gw, keeping its "id", "env",
+            "state" and "links" but not its items. It may be read like a
+            dict, e.g. ``publish["id"]``.
+        duration (float):
+            Seconds taken to create the publish.
+    """
+
+
+@hookspec
+def exodus_publish_committed(publish_id, commit_id, state, duration):
+    """Invoked after the commit of an exodus-gw publish has finished, or
+    waiting for it has timed out.
+
+    Args:
+        publish_id (str):
+            ID of the publish being committed, if known.
+        commit_id (str):
+            ID of the commit task.
+        state (str):
+            Final state of the commit task: "COMPLETE", "FAILED", or the
+            last known state if waiting for the commit timed out.
+        duration (float):
+            Seconds spent waiting for the commit to finish.
+    """
+
+
+@hookspec
+def exodus_push_item_start(item):
+    """Invoked when pubtools-exodus-push starts pushing an item with
+    exodus-rsync.
+
+    Args:
+        item:
+            The item being pushed; a push item, or a coalesced transfer
+            with the same 'src' and 'dest' attributes.
+    """
+
+
+@hookspec
+def exodus_push_item_finish(item, duration, exit_code):
+    """Invoked when pubtools-exodus-push has finished pushing an item with
+    exodus-rsync.
+
+    Args:
+        item:
+            The item which was pushed, as passed to
+            :func:`exodus_push_item_start`.
+        duration (float):
+            Seconds taken to push the item.
+        exit_code (int):
+            Exit code of exodus-rsync; non-zero if the push failed.
+    """
+
+
+@hookspec
+def exodus_upload(key, size, duration):
+    """Invoked after content has been uploaded to exodus-gw, as done by
+    pubtools-exodus-push --engine=native.
+
+    Args:
+        key (str):
+            The object key (sha256 digest) of the content.
+        size (int):
+            Size of the content in bytes.
+        duration (float):
+            Seconds taken to upload the content.
+    """
+
+
+pm.add_hookspecs(sys.modules[__name__])
+
+
+def hook_active(name):
+    """Returns True if any implementation of the named hook is registered.
+
+    Callers should check this before doing any work needed only to invoke
+    the hook, so that events cost almost nothing when nobody listens.
+    """
+
+    return bool(getattr(pm.hook, name).get_hookimpls())
+
+
+def notify(name, **kwargs):
+    """Invokes the named hook if implemented.
+
+    Errors raised by hook implementations are logged rather than
+    propagated, as observing an operation shouldn't make it fail.
+    """
+
+    hook = getattr(pm.hook, name)
+    if not hook.get_hookimpls():
+        return
+
+    try:
+        hook(**kwargs)
+    except Exception:  # pylint: disable=broad-except
+        LOG.warning("Error in %s hook", name, exc_info=True)
@@ -0,0 +1,202 @@
+import json
+import os
+import re
+import tempfile
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import Lock
+
+from monotonic import monotonic
+
+
+class Metrics(object):
+    """Timers and counters describing a single run of a task.
+
+    Phases are named steps of a run, such as creating a publish or running
+    one exodus-rsync process. The same phase may be entered many times,
+    including concurrently; its count and total duration are recorded.
+    Counters record quantities such as items, bytes or retries.
+    """
+
+    def __init__(self):
+        self.started = monotonic()
+        self.phases = OrderedDict()
+        self.counters = OrderedDict()
+        self._lock = Lock()
+
+    @contextmanager
+    def timer(self, phase):
+        """Context manager recording the time spent within it as one
+        occurrence of 'phase'."""
+
+        start = monotonic()
+        try:
+            yield
+        finally:
+            self.record(phase, monotonic() - start)
+
+    def record(self, phase, seconds):
+        with self._lock:
+            entry = self.phases.setdefault(phase, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self):
+        """Returns the metrics as a JSON-serializable dict."""
+
+        with self._lock:
+            return {
+                "elapsed": monotonic() - self.started,
+                "phases": OrderedDict(
+                    (name, {"count": count, "seconds": seconds})
+                    for (name, (count, seconds)) in self.phases.items()
+                ),
+                "counters": OrderedDict(self.counters),
+            }
+
+    def __str__(self):
+        report = self.report()
+        parts = ["%.3fs elapsed" % report["elapsed"]]
+        for name, phase in report["phases"].items():
+            parts.append(
+                "%s %.3fs (%s)" % (name, phase["seconds"], phase["count"])
+            )
+        for name, value in report["counters"].items():
+            parts.append("%s %s" % (name, value))
+        return ", ".join(parts)
+
+
+class PoolStats(object):
+    """Counters describing use of an HTTP connection pool.
+
+    Attributes:
+        checkouts (int):
+            Number of times a connection was taken from the pool.
+        waits (int):
+            Number of checkouts made while every connection in the pool was
+            in use; these either blocked or overflowed the pool, depending
+            on whether the pool is blocking.
+        wait_time (float):
+            Total seconds spent in such checkouts.
+        new_connections (int):
+            Number of connections opened.
+    """
+
+    def __init__(self):
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.new_connections = 0
+        self._lock = Lock()
+
+    def checkout(self, waited, duration):
+        with self._lock:
+            self.checkouts += 1
+            if waited:
+                self.waits += 1
+                self.wait_time += duration
+
+    def connected(self):
+        with self._lock:
+            self.new_connections += 1
+
+    def __str__(self):
+        return (
+            "%s checkout(s), %s wait(s) totalling %.3fs, "
+            "%s new connection(s)"
+            % (
+                self.checkouts,
+                self.waits,
+                self.wait_time,
+                self.new_connections,
+            )
+        )
+
+
+def prometheus_text(report, job):
+    """Renders a metrics report in the Prometheus text exposition format,
+    as used by node_exporter's textfile collector."""
+
+    prefix = "pubtools_exodus_"
+    label = 'job="%s"' % job
+    lines = []
+
+    def metric(name, help_text, samples):
+        lines.append("# HELP %s%s %s" % (prefix, name, help_text))
+        lines.append("# TYPE %s%s gauge" % (prefix, name))
+        for labels, value in samples:
+            lines.append(
+                "%s%s{%s} %s"
+                % (prefix, name, ",".join([label] + labels), value)
+            )
+
+    metric(
+        "elapsed_seconds",
+        "Duration of the run.",
+        [([], report["elapsed"])],
+    )
+
+    phases = report["phases"].items()
+    metric(
+        "phase_seconds",
+        "Total time spent in each phase of the run.",
+        [(['phase="%s"' % name], p["seconds"]) for (name, p) in phases],
+    )
+    metric(
+        "phase_count",
+        "Number of times each phase of the run was entered.",
+        [(['phase="%s"' % name], p["count"]) for (name, p) in phases],
+    )
+
+    for name, value in report["counters"].items():
+        metric(
+            re.sub(r"[^a-zA-Z0-9_]", "_", name),
+            "Value of the %s counter at the end of the run." % name,
+            [([], value)],
+        )
+
+    return "\n".join(lines) + "\n"
+
+
+def current_umask():
+    """Returns the process's umask, which can only be read by setting it."""
+
+    umask = os.umask(0o022)
+    os.umask(umask)
+    return umask
+
+
+def write_atomic(path, content):
+    """Writes a file such that readers never see it partially written."""
+
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(path)), prefix=".tmp-"
+    )
+    try:
+        with os.fdopen(fd, "w") as tmp:
+            tmp.write(content)
+        # mkstemp creates files readable only by their owner; give the
+        # report the usual permissions, so collectors such as
+        # node_exporter running as other users can read it.
+        os.chmod(tmp_path, 0o666 & ~current_umask())
+        os.rename(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_report(report, job, json_path=None, prom_path=None):
+    """Writes a metrics report as JSON and/or in Prometheus textfile
+    format."""
+
+    if json_path:
+        out = OrderedDict([("job", job)])
+        out.update(report)
+        write_atomic(json_path, json.dumps(out, indent=2) + "\n")
+
+    if prom_path:
+        write_atomic(prom_path, prometheus_text(report, job))
@@ -0,0 +1,191 @@
+import heapq
+import itertools
+from concurrent.futures import Future
+from threading import Condition, Lock, Thread, current_thread
+
+try:
+    from typing import Dict, Tuple
+except ImportError:  # pragma: no cover
+    # Only needed for type comments, and unavailable on Python 2.
+    pass
+
+from monotonic import monotonic
+from six.moves.urllib.parse import urljoin
+
+from ._handles import CommitTask
+
+# Pollers shared by all sessions in the process, keyed by (exodus-gw URL,
+# certificate fingerprint).
+POLLERS = {}  # type: Dict[Tuple[str, str], CommitPoller]
+POLLERS_LOCK = Lock()
+
+
+class CommitWatch(object):
+    """The state of one commit being watched by a :class:`CommitPoller`."""
+
+    def __init__(self, session, commit, url):
+        self.session = session
+        self.commit = commit
+        self.task = commit
+        self.url = url
+        self.etag = None
+        self.interval = min(session.wait_min, session.wait)
+        self.start = monotonic()
+        self.deadline = self.start + session.timeout
+        self.future = Future()
+
+
+class CommitPoller(object):
+    """Watches any number of exodus-gw commit tasks on a single thread.
+
+    Each commit is polled at its own adaptive interval, as by a session's
+    ``poll_commit_completion``, but rather than each commit blocking a
+    thread in a sleep loop, one thread polls whichever commit is due next.
+    Requests are made through 'session', so they share its connection pool.
+
+    The thread is started when a commit is watched and exits once no
+    commits remain.
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+        self._cond = Condition()
+        # Heap of (time due, sequence, watch).
+        self._queue = []
+        self._seq = itertools.count()
+        self._thread = None
+
+    def watch(self, commit, session=None):
+        """Starts watching a commit task, as returned by
+        :meth:`~pubtools.exodus.gateway.ExodusGatewaySession.start_commit`.
+
+        The commit's polling settings, metrics and hook events are those
+        of 'session', by default the poller's own session.
+
+        Returns:
+            Future: resolved with the commit's final :class:`CommitTask`,
+            or failing if the commit fails or polling times out.
+            Cancelling the future stops watching the commit.
+        """
+
+        watch = CommitWatch(
+            session or self.session,
+            commit,
+            urljoin(self.session.gw_url, commit["links"]["self"]),
+        )
+
+        with self._cond:
+            self._schedule(watch, 0)
+            if not self._thread:
+                self._start()
+            self._cond.notify()
+
+        return watch.future
+
+    def _start(self):
+        self._thread = Thread(target=self._run, name="exodus-commit-poller")
+        # As with run_in_background, an unresponsive exodus-gw mustn't keep
+        # the process alive.
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _schedule(self, watch, delay):
+        heapq.heappush(
+            self._queue, (monotonic() + delay, next(self._seq), watch)
+        )
+
+    def _run(self):
+        try:
+            self._watch_all()
+        finally:
+            with self._cond:
+                # Only reached with this thread still set if it died
+                # unexpectedly; don't leave later watches without a thread.
+                if self._thread is current_thread():
+                    self._thread = None
+                    if self._queue:
+                        self._start()
+
+    def _watch_all(self):
+        while True:
+            with self._cond:
+                watch = self._next()
+                if not watch:
+                    self._thread = None
+                    return
+
+            if watch.future.cancelled():
+                continue
+
+            try:
+                task = self._poll(watch)
+            except Exception as error:  # pylint: disable=broad-except
+                self._resolve(watch, error=error)
+            else:
+                if task:
+                    self._resolve(watch, task)
+
+    def _resolve(self, watch, task=None, error=None):
+        # The future may have been cancelled while it was being polled.
+        # Claiming it first means it can't be cancelled from now on.
+        if not watch.future.set_running_or_notify_cancel():
+            return
+        if error:
+            watch.future.set_exception(error)
+        else:
+            watch.future.set_result(task)
+
+    def _next(self):
+        """Waits for the next commit due to be polled, returning its watch,
+        or None once no commits remain."""
+
+        while self._queue:
+            delay = self._queue[0][0] - monotonic()
+            if delay <= 0:
+                return heapq.heappop(self._queue)[2]
+            # Woken early if a commit is added.
+            self._cond.wait(delay)
+        return None
+
+    def _poll(self, watch):
+        """Polls a commit, returning its final task if it has finished, or
+        scheduling its next poll and returning None."""
+
+        session = watch.session
+
+        headers = {"If-None-Match": watch.etag} if watch.etag else {}
+        session.metrics.count("commit_polls")
+        resp = self.session.do_request(
+            method="GET", url=watch.url, headers=headers
+        )
+        if resp.status_code != 304:
+            watch.task = CommitTask.from_response(resp)
+            watch.etag = resp.headers.get("ETag")
+
+        now = monotonic()
+        if (
+            watch.task["state"] in ("COMPLETE", "FAILED")
+            or now >= watch.deadline
+        ):
+            duration = now - watch.start
+            session.metrics.record("poll_commit", duration)
+            return session.finish_poll(watch.commit, watch.task, duration)
+
+        delay = session.next_poll_delay(resp, watch.interval)
+        watch.interval = min(watch.interval * 2, session.wait)
+        with self._cond:
+            self._schedule(watch, max(min(delay, watch.deadline - now), 0))
+        return None
+
+
+def shared_poller(session):
+    """Returns the poller shared by all sessions in this process using the
+    same exodus-gw URL and certificate as 'session', creating it with
+    'session' if needed."""
+
+    key = session.identity_key()
+    with POLLERS_LOCK:
+        if key not in POLLERS:
+            POLLERS[key] = CommitPoller(session)
+        return POLLERS[key]
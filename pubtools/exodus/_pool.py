@@ -0,0 +1,64 @@
+import time
+
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.connectionpool import (  # pylint: disable=import-error
+    HTTPConnectionPool,
+    HTTPSConnectionPool,
+)
+from requests.packages.urllib3.util.retry import (  # pylint: disable=import-error
+    Retry,
+)
+
+from ._metrics import PoolStats
+
+
+class GatewayRetry(Retry):
+    """A urllib3 Retry which leaves throttled responses (429, or any with
+    a Retry-After header) to the caller, so that throttling can slow down
+    every request to exodus-gw rather than just the one throttled."""
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code == 429 or has_retry_after:
+            return False
+        return super(GatewayRetry, self).is_retry(
+            method, status_code, has_retry_after
+        )
+
+
+def instrumented(pool_class, stats):
+    """Returns a subclass of a urllib3 connection pool class which records
+    its use in 'stats'."""
+
+    class InstrumentedPool(pool_class):
+        def _get_conn(self, *args, **kwargs):
+            # Each slot of the pool's queue holds an idle connection, or
+            # None for a connection not yet opened. An empty queue means
+            # every connection is checked out.
+            waited = self.pool is not None and self.pool.empty()
+            start = time.time()
+            try:
+                return super(InstrumentedPool, self)._get_conn(*args, **kwargs)
+            finally:
+                stats.checkout(waited, time.time() - start)
+
+        def _new_conn(self, *args, **kwargs):
+            stats.connected()
+            return super(InstrumentedPool, self)._new_conn(*args, **kwargs)
+
+    return InstrumentedPool
+
+
+class InstrumentedHTTPAdapter(HTTPAdapter):
+    """An HTTPAdapter whose connection pools record their use in a
+    :class:`PoolStats`."""
+
+    def __init__(self, *args, **kwargs):
+        self.stats = kwargs.pop("stats", None) or PoolStats()
+        super(InstrumentedHTTPAdapter, self).__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(InstrumentedHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": instrumented(HTTPConnectionPool, self.stats),
+            "https": instrumented(HTTPSConnectionPool, self.stats),
+        }
@@ -0,0 +1,159 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+from threading import Lock
+
+try:
+    from typing import Dict
+except ImportError:  # pragma: no cover
+    # Only needed for type comments, and unavailable on Python 2.
+    pass
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    # Not available on Windows; sharing across processes is unsupported.
+    fcntl = None  # type: ignore
+
+LOG = logging.getLogger("pubtools-exodus")
+
+# Longest single sleep while waiting for the limiter, so that changes made
+# by other processes are noticed.
+MAX_SLEEP = 1.0
+
+# After throttling, the request rate is halved, down to this fraction of
+# the configured rate, and recovers by this fraction of the configured
+# rate per second.
+MIN_RATE_FRACTION = 0.1
+RECOVERY_PER_SECOND = 0.05
+
+# Limiters shared by all sessions in the process, keyed by exodus-gw URL.
+LIMITERS = {}  # type: Dict[str, RateLimiter]
+LIMITERS_LOCK = Lock()
+
+
+class RateLimiter(object):
+    """A token bucket limiting the rate of requests to exodus-gw.
+
+    Every request first calls :meth:`acquire`. If 'rate' is set, requests
+    are limited to that many per second, with bursts of up to 'burst'.
+
+    When exodus-gw throttles any request, :meth:`throttle` pauses every
+    caller for the requested time, and halves the rate, which then
+    recovers gradually. Callers thereby slow down together, rather than
+    each backing off alone while the others keep a throttled exodus-gw
+    busy.
+
+    If 'path' is given, the limiter's state is kept in that file, locked
+    while in use, so that it's shared by every process using the same
+    path. Such processes should use the same 'rate' and 'burst'.
+
+    Instances may be shared between threads.
+    """
+
+    def __init__(self, rate=0, burst=None, path=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(self.rate, 1))
+        self.path = path
+
+        self._lock = Lock()
+        self._state = self.initial_state()
+
+    def initial_state(self):
+        return {
+            "tokens": self.burst,
+            "rate": self.rate,
+            "updated": time.time(),
+            "paused_until": 0.0,
+        }
+
+    def acquire(self):
+        """Waits until a request may be made."""
+
+        # Fast path for an unlimited, unshared limiter which isn't paused.
+        if (
+            not self.rate
+            and not self.path
+            and self._state["paused_until"] <= time.time()
+        ):
+            return
+
+        while True:
+            with self._locked() as state:
+                now = time.time()
+                delay = state["paused_until"] - now
+                if delay <= 0:
+                    if not self.rate:
+                        return
+                    self._refill(state, now)
+                    if state["tokens"] >= 1:
+                        state["tokens"] -= 1
+                        return
+                    delay = (1 - state["tokens"]) / state["rate"]
+            time.sleep(min(delay, MAX_SLEEP))
+
+    def throttle(self, delay):
+        """Pauses every caller for 'delay' seconds and reduces the rate,
+        after exodus-gw has throttled a request."""
+
+        with self._locked() as state:
+            now = time.time()
+            state["paused_until"] = max(state["paused_until"], now + delay)
+            if self.rate:
+                self._refill(state, now)
+                state["rate"] = max(
+                    state["rate"] / 2, self.rate * MIN_RATE_FRACTION
+                )
+
+        LOG.info(
+            "exodus-gw is throttling requests, pausing requests for %.1fs",
+            delay,
+        )
+
+    def _refill(self, state, now):
+        elapsed = max(now - state["updated"], 0)
+        state["rate"] = min(
+            self.rate,
+            state["rate"] + self.rate * RECOVERY_PER_SECOND * elapsed,
+        )
+        state["tokens"] = min(
+            self.burst, state["tokens"] + elapsed * state["rate"]
+        )
+        state["updated"] = now
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            if not self.path:
+                yield self._state
+                return
+
+            # The file only holds JSON, and open() has no encoding argument
+            # on Python 2.
+            # pylint: disable=unspecified-encoding
+            with open(self.path, "a+") as shared:
+                fcntl.flock(shared, fcntl.LOCK_EX)
+                shared.seek(0)
+                try:
+                    state = json.loads(shared.read())
+                except ValueError:
+                    # New or corrupt file.
+                    state = self.initial_state()
+
+                yield state
+
+                shared.seek(0)
+                shared.truncate()
+                shared.write(json.dumps(state))
+                # Lock is released when the file is closed.
+
+
+def shared_limiter(gw_url, rate=0, burst=None, path=None):
+    """Returns the limiter shared by all sessions in this process for the
+    exodus-gw at 'gw_url', creating it with the given settings if needed."""
+
+    with LIMITERS_LOCK:
+        if gw_url not in LIMITERS:
+            LIMITERS[gw_url] = RateLimiter(rate, burst, path)
+        return LIMITERS[gw_url]
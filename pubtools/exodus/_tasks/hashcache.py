@@ -0,0 +1,202 @@
+import logging
+import os
+import sqlite3
+from threading import Lock
+
+LOG = logging.getLogger("pubtools-exodus")
+
+# Number of writes buffered before they are written to the cache together,
+# in one short transaction.
+COMMIT_INTERVAL = 1000
+
+# Seconds to wait for another push writing to the same cache before
+# skipping a read or write.
+BUSY_TIMEOUT = 10
+
+
+def stat_key(st):
+    """Returns the cache key for a file's os.stat() result."""
+
+    mtime_ns = getattr(st, "st_mtime_ns", None)
+    if mtime_ns is None:  # pragma: no cover
+        # Python 2 has no st_mtime_ns.
+        mtime_ns = int(st.st_mtime * 1000000000)
+    return (st.st_dev, st.st_ino, st.st_size, mtime_ns)
+
+
+class HashCache(object):
+    """A persistent cache of file sha256 digests.
+
+    Digests are keyed by (device, inode, size, mtime_ns), so any change to
+    a file's content in the usual ways results in a cache miss. The cache
+    holds at most 'max_entries' digests; when exceeded, the least recently
+    used entries are evicted on close.
+
+    Writes are buffered and written in short transactions, so the cache
+    may be shared by concurrent pushes. If the cache can't be read or
+    written, e.g. as another push holds it locked for too long, lookups
+    miss and writes are skipped rather than failing the push.
+
+    Instances may be shared between threads.
+    """
+
+    def __init__(self, path, max_entries=1000000):
+        self.path = path
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+
+        dirname = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+
+        self._lock = Lock()
+        # Writes not yet made to the database, as {key: (sha256, used)},
+        # with sha256 None if only the entry's last use changed.
+        self._pending = {}
+        # In autocommit mode, so that lookups don't leave a transaction
+        # open.
+        self._db = sqlite3.connect(
+            path,
+            timeout=BUSY_TIMEOUT,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            "dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER, "
+            "sha256 TEXT NOT NULL, used INTEGER NOT NULL, "
+            "PRIMARY KEY (dev, ino, size, mtime_ns))"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS hashes_used ON hashes (used)"
+        )
+        row = self._db.execute("SELECT MAX(used) FROM hashes").fetchone()
+        self._clock = row[0] or 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def _tick(self):
+        self._clock += 1
+        return self._clock
+
+    def _wrote(self, key, digest):
+        self._pending[key] = (digest, self._tick())
+        if len(self._pending) >= COMMIT_INTERVAL:
+            self._flush()
+
+    def _flush(self):
+        """Writes all buffered writes in a single transaction."""
+
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        try:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO hashes "
+                    "(dev, ino, size, mtime_ns, sha256, used) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        key + (digest, used)
+                        for key, (digest, used) in pending.items()
+                        if digest
+                    ],
+                )
+                self._db.executemany(
+                    "UPDATE hashes SET used=? "
+                    "WHERE dev=? AND ino=? AND size=? AND mtime_ns=?",
+                    [
+                        (used,) + key
+                        for key, (digest, used) in pending.items()
+                        if not digest
+                    ],
+                )
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+        except sqlite3.OperationalError as error:
+            LOG.warning(
+                "Skipped %s write(s) to hash cache %s: %s",
+                len(pending),
+                self.path,
+                error,
+            )
+
+    def get(self, st):
+        """Returns the cached digest for a file's stat result, or None."""
+
+        key = stat_key(st)
+        with self._lock:
+            digest = self._pending.get(key, (None,))[0]
+            if not digest:
+                digest = self._read(key)
+            if not digest:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            # Keep any digest not yet written, along with its new use.
+            self._wrote(key, self._pending.get(key, (None,))[0])
+            return digest
+
+    def _read(self, key):
+        try:
+            row = self._db.execute(
+                "SELECT sha256 FROM hashes "
+                "WHERE dev=? AND ino=? AND size=? AND mtime_ns=?",
+                key,
+            ).fetchone()
+        except sqlite3.OperationalError as error:
+            LOG.warning("Could not read hash cache %s: %s", self.path, error)
+            return None
+        return row[0] if row else None
+
+    def put(self, st, digest):
+        """Stores the digest for a file's stat result."""
+
+        with self._lock:
+            self._wrote(stat_key(st), digest)
+
+    def evict(self):
+        """Writes any buffered writes, then removes least recently used
+        entries in excess of max_entries."""
+
+        with self._lock:
+            self._flush()
+            try:
+                (count,) = self._db.execute(
+                    "SELECT COUNT(*) FROM hashes"
+                ).fetchone()
+                excess = count - self.max_entries
+                if excess > 0:
+                    self._db.execute(
+                        "DELETE FROM hashes WHERE rowid IN "
+                        "(SELECT rowid FROM hashes ORDER BY used LIMIT ?)",
+                        (excess,),
+                    )
+                    LOG.debug("Evicted %s entries from hash cache", excess)
+            except sqlite3.OperationalError as error:
+                LOG.warning(
+                    "Could not evict from hash cache %s: %s", self.path, error
+                )
+
+    def close(self):
+        self.evict()
+        with self._lock:
+            self._db.close()
+
+        LOG.debug(
+            "Hash cache %s: %s hit(s), %s miss(es)",
+            self.path,
+            self.hits,
+            self.misses,
+        )
@@ -0,0 +1,135 @@
+import multiprocessing
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from monotonic import monotonic
+
+from .native import MMAP_THRESHOLD, sha256_file
+
+
+def hash_batch(paths):
+    """Returns the sha256 digests of files, and the seconds taken to hash
+    them. Runs in a worker process of :class:`ProcessHasher`."""
+
+    start = monotonic()
+    digests = [sha256_file(path) for path in paths]
+    return digests, monotonic() - start
+
+
+class ProcessHasher(object):
+    """Computes sha256 digests of files on a pool of processes.
+
+    Hashing in threads is limited by the GIL for small files, and by a
+    single process's reads for large ones. This spreads files across
+    'processes' worker processes instead. Small files are sent to workers
+    in batches, so a task costs one round trip per batch rather than per
+    file; large files are sent alone and hashed through a memory map.
+
+    Digests found in 'hash_cache' aren't recomputed, and computed digests
+    are added to it.
+    """
+
+    # Files are sent to workers in batches of up to this many files, or
+    # this many bytes, whichever is reached first.
+    batch_files = 64
+    batch_bytes = 64 * 1024 * 1024
+
+    # Files at least this large are sent alone, as they're hashed through
+    # a memory map, and shouldn't hold up small files batched with them.
+    alone_bytes = MMAP_THRESHOLD
+
+    def __init__(self, processes, hash_cache=None, metrics=None):
+        self.processes = max(processes, 1)
+        self.hash_cache = hash_cache
+        self.metrics = metrics
+
+        kwargs = {}
+        if sys.version_info >= (3, 7):
+            # Forking a process with running threads, as during a push,
+            # isn't safe, so start workers afresh.
+            kwargs["mp_context"] = multiprocessing.get_context("spawn")
+        self._pool = ProcessPoolExecutor(max_workers=self.processes, **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    def hash_files(self, entries):
+        """Yields (entry, stat result, digest) for each of 'entries', a
+        tuple whose first element is the path of a file.
+
+        At most two batches per process are in flight at once, so entries
+        are consumed only as fast as they can be hashed.
+        """
+
+        pending = deque()
+        batch = []
+        batch_size = 0
+
+        try:
+            for entry in entries:
+                st = os.stat(entry[0])
+                key = self.hash_cache.get(st) if self.hash_cache else None
+                if key:
+                    yield entry, st, key
+                    continue
+
+                if st.st_size >= self.alone_bytes:
+                    if batch:
+                        pending.append(self.submit(batch))
+                        batch = []
+                        batch_size = 0
+                    pending.append(self.submit([(entry, st)]))
+                else:
+                    batch.append((entry, st))
+                    batch_size += st.st_size
+                    if (
+                        len(batch) >= self.batch_files
+                        or batch_size >= self.batch_bytes
+                    ):
+                        pending.append(self.submit(batch))
+                        batch = []
+                        batch_size = 0
+
+                while len(pending) >= self.processes * 2:
+                    for result in self.collect(pending.popleft()):
+                        yield result
+
+            if batch:
+                pending.append(self.submit(batch))
+            while pending:
+                for result in self.collect(pending.popleft()):
+                    yield result
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    def submit(self, batch):
+        paths = [entry[0] for entry, _ in batch]
+        return batch, self._pool.submit(hash_batch, paths)
+
+    def collect(self, pending):
+        """Waits for a batch to be hashed, returning its results."""
+
+        batch, future = pending
+        digests, seconds = future.result()
+
+        if self.metrics:
+            self.metrics.record("hash", seconds)
+            self.metrics.count(
+                "hashed_bytes", sum(st.st_size for _, st in batch)
+            )
+
+        results = []
+        for (entry, st), key in zip(batch, digests):
+            if self.hash_cache:
+                self.hash_cache.put(st, key)
+            results.append((entry, st, key))
+        return results
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import logging
+import os
+from threading import Lock
+
+from .._handles import Publish
+from .hashcache import stat_key
+from .native import walk_item
+
+LOG = logging.getLogger("pubtools-exodus")
+
+
+def item_digest(item, excludes=(), extra=()):
+    """Returns a digest identifying a push item and the current state of
+    its content.
+
+    The digest covers the item's source and destination, the size and
+    modification time of every file it would push, and any 'extra' values
+    affecting how it's pushed (such as exodus-rsync arguments), so that it
+    changes if the item would be pushed any differently.
+    """
+
+    digest = hashlib.sha256()
+    header = [item.src, item.dest[0], getattr(item, "files", None)]
+    digest.update(json.dumps(header + list(extra)).encode("utf-8"))
+
+    for path, web_uri in walk_item(item, excludes):
+        st = os.stat(path)
+        digest.update(
+            json.dumps([web_uri, st.st_size, stat_key(st)[3]]).encode("utf-8")
+        )
+
+    return digest.hexdigest()
+
+
+class PushJournal(object):
+    """A local record of the progress of a push, allowing a failed push to
+    be resumed.
+
+    The journal is a file of JSON lines: a header identifying the push and
+    its exodus-gw publish, followed by the digest of each item pushed so
+    far. Lines are flushed to disk as they're written, and an incomplete
+    last line (e.g. from a crash mid-write) is ignored on reading.
+
+    Instances may be shared between threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.completed = set()
+
+        self._file = None
+        self._lock = Lock()
+
+    def read(self, source, gw_url, gw_env):
+        """Loads the journal of an earlier push of 'source' to the given
+        exodus-gw environment.
+
+        Returns:
+            Publish: the publish used by the earlier push, or None if there
+            is no journal to resume.
+        Raises:
+            RuntimeError: if the journal is for a different push.
+        """
+
+        if not os.path.exists(self.path):
+            LOG.warning("No push journal at %s to resume", self.path)
+            return None
+
+        # Read as bytes, which json accepts, as open() takes no encoding
+        # on Python 2.
+        with open(self.path, "rb") as journal:
+            records = []
+            for line in journal:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    LOG.debug("Ignoring incomplete line in %s", self.path)
+
+        if not records:
+            return None
+
+        header = records[0]
+        pushed = (header.get("source"), header.get("url"), header.get("env"))
+        if pushed != (source, gw_url, gw_env):
+            raise RuntimeError(
+                "Journal %s is for a push of %s to %s, cannot resume"
+                % (self.path, header.get("source"), header.get("env"))
+            )
+
+        self.completed = set(r["done"] for r in records[1:] if "done" in r)
+        return Publish.from_json(header["publish"])
+
+    def start(self, publish, source, gw_url, gw_env):
+        """Starts a new journal for a push to 'publish', replacing any
+        existing journal."""
+
+        self.completed = set()
+        self._open("w")
+        self._write(
+            {
+                "source": source,
+                "url": gw_url,
+                "env": gw_env,
+                "publish": {
+                    "id": publish["id"],
+                    "links": publish["links"],
+                },
+            }
+        )
+
+    def reopen(self):
+        """Continues writing to a journal loaded by :meth:`read`."""
+
+        self._open("a")
+
+        # Don't append to an incomplete last line.
+        with open(self.path, "rb") as journal:
+            journal.seek(0, os.SEEK_END)
+            if journal.tell():
+                journal.seek(-1, os.SEEK_END)
+                if journal.read(1) != b"\n":
+                    with self._lock:
+                        self._file.write("\n")
+
+    def is_done(self, digest):
+        return digest in self.completed
+
+    def done(self, digest):
+        """Records an item as pushed."""
+
+        with self._lock:
+            self.completed.add(digest)
+        self._write({"done": digest})
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        """Removes the journal, once the push it describes has completed."""
+
+        self.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _open(self, mode):
+        self.close()
+        self._file = open(self.path, mode)
+
+    def _write(self, record):
+        with self._lock:
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
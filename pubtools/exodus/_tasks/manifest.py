@@ -0,0 +1,195 @@
+import logging
+import os
+import sqlite3
+from threading import Lock
+
+from .native import walk_item
+from .planner import Transfer
+
+LOG = logging.getLogger("pubtools-exodus")
+
+
+# Seconds to wait for another push holding a lock on the same manifest.
+BUSY_TIMEOUT = 60
+
+
+class PushManifest(object):
+    """A persistent record of the files published by earlier pushes.
+
+    Each entry is a published path (web_uri) with the size and sha256
+    digest of its content. Entries are grouped by 'scope', identifying the
+    source and exodus-gw environment pushed, so one manifest may serve
+    several kinds of push, including concurrently.
+
+    The manifest is an indexed SQLite database, so lookups don't require
+    loading it into memory. Entries recorded during a push are staged in a
+    private temporary database, and only become visible to later pushes
+    once :meth:`commit` is called, which should be done only after the
+    push's publish has been committed. The manifest itself is therefore
+    only locked for the short transaction writing them.
+
+    Instances may be shared between threads.
+    """
+
+    def __init__(self, path, scope):
+        self.path = path
+        self.scope = scope
+
+        self.added = 0
+        self.changed = 0
+        self.unchanged = 0
+
+        dirname = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+
+        self._lock = Lock()
+        # In autocommit mode, so that lookups don't leave a transaction
+        # open.
+        self._db = sqlite3.connect(
+            path,
+            timeout=BUSY_TIMEOUT,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "scope TEXT NOT NULL, web_uri TEXT NOT NULL, "
+            "size INTEGER NOT NULL, sha256 TEXT NOT NULL, "
+            "PRIMARY KEY (scope, web_uri))"
+        )
+
+        # An empty path gives a temporary database on disk, removed when
+        # closed.
+        self._pending = sqlite3.connect("", check_same_thread=False)
+        self._pending.execute(
+            "CREATE TABLE pending ("
+            "web_uri TEXT PRIMARY KEY, "
+            "size INTEGER NOT NULL, sha256 TEXT NOT NULL)"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def is_current(self, web_uri, size, sha256):
+        """Returns True if the manifest records 'web_uri' as published with
+        the given size and digest, including by this push."""
+
+        with self._lock:
+            row = self._pending.execute(
+                "SELECT size, sha256 FROM pending WHERE web_uri=?",
+                (web_uri,),
+            ).fetchone()
+            if row is None:
+                row = self._db.execute(
+                    "SELECT size, sha256 FROM entries "
+                    "WHERE scope=? AND web_uri=?",
+                    (self.scope, web_uri),
+                ).fetchone()
+
+            if row is None:
+                self.added += 1
+                return False
+            if tuple(row) != (size, sha256):
+                self.changed += 1
+                return False
+            self.unchanged += 1
+            return True
+
+    def record(self, web_uri, size, sha256):
+        """Records 'web_uri' as published with the given size and digest,
+        pending :meth:`commit`."""
+
+        with self._lock:
+            self._pending.execute(
+                "INSERT OR REPLACE INTO pending "
+                "(web_uri, size, sha256) VALUES (?, ?, ?)",
+                (web_uri, size, sha256),
+            )
+
+    def commit(self):
+        """Makes all recorded entries permanent, in a single transaction."""
+
+        with self._lock:
+            rows = self._pending.execute(
+                "SELECT web_uri, size, sha256 FROM pending"
+            )
+
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO entries "
+                    "(scope, web_uri, size, sha256) VALUES (?, ?, ?, ?)",
+                    ((self.scope,) + tuple(row) for row in rows),
+                )
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+            self._pending.execute("DELETE FROM pending")
+            self._pending.commit()
+
+    def close(self):
+        """Closes the manifest, discarding any uncommitted entries."""
+
+        with self._lock:
+            self._pending.close()
+            self._db.close()
+
+        LOG.info(
+            "Push manifest %s: %s file(s) added, %s changed, %s unchanged",
+            self.path,
+            self.added,
+            self.changed,
+            self.unchanged,
+        )
+
+
+def delta_transfer(item, manifest, digest, excludes=()):
+    """Returns a transfer of only those files of a push item which are
+    added or changed relative to a manifest, or None if there are none.
+
+    Changed files are recorded in the manifest.
+
+    Args:
+        item:
+            A push item or :class:`~.planner.Transfer`.
+        manifest (PushManifest):
+            Manifest of earlier pushes.
+        digest (callable):
+            Called with (path, stat result) to get a file's sha256 digest.
+        excludes (list[str]):
+            Patterns of file names to exclude.
+    """
+
+    total = 0
+    changed = []
+    for path, web_uri in walk_item(item, excludes):
+        total += 1
+        st = os.stat(path)
+        key = digest(path, st)
+        if not manifest.is_current(web_uri, st.st_size, key):
+            changed.append((path, web_uri))
+            manifest.record(web_uri, st.st_size, key)
+
+    if not changed:
+        LOG.debug("Skipping %s, unchanged since last push", item.src)
+        return None
+
+    if len(changed) == total or not os.path.isdir(item.src):
+        return item
+
+    # Push just the changed files, by their paths relative to the item's
+    # directory; the destination is where that directory is published.
+    base = item.src.rstrip("/")
+    files = [
+        os.path.relpath(path, base).replace(os.sep, "/") for path, _ in changed
+    ]
+    dest = changed[0][1][: -len(files[0])].rstrip("/") or "/"
+
+    LOG.debug("Pushing %s of %s file(s) from %s", len(files), total, item.src)
+    return Transfer(base + "/", (dest,), tuple(files))
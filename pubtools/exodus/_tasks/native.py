@@ -0,0 +1,321 @@
+import fnmatch
+import hashlib
+import logging
+import mimetypes
+import mmap
+import os
+from collections import OrderedDict
+from functools import partial
+from threading import Lock
+
+from .pipeline import broadcast, threaded_map
+
+LOG = logging.getLogger("pubtools-exodus")
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Files at least this large are hashed through a memory map rather than
+# read into buffers, avoiding a copy of their content.
+MMAP_THRESHOLD = 4 * HASH_CHUNK_SIZE
+
+# Maximum number of files waiting between each stage of a push.
+QUEUE_SIZE = 1000
+
+
+def sha256_file(path):
+    """Returns the hex sha256 digest of a local file."""
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as fileobj:
+        if os.fstat(fileobj.fileno()).st_size >= MMAP_THRESHOLD:
+            mapped = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                # Not available before Python 3.8.
+                if hasattr(mapped, "madvise"):
+                    mapped.madvise(mmap.MADV_SEQUENTIAL)
+                digest.update(mapped)
+            finally:
+                mapped.close()
+            return digest.hexdigest()
+
+        chunk = fileobj.read(HASH_CHUNK_SIZE)
+        while chunk:
+            digest.update(chunk)
+            chunk = fileobj.read(HASH_CHUNK_SIZE)
+    return digest.hexdigest()
+
+
+def file_digest(path, st, hash_cache=None, metrics=None):
+    """Returns the sha256 digest of a file with the given stat result,
+    hashing it only if the digest is not in 'hash_cache'."""
+
+    if hash_cache:
+        key = hash_cache.get(st)
+        if key:
+            return key
+
+    if metrics:
+        with metrics.timer("hash"):
+            key = sha256_file(path)
+        metrics.count("hashed_bytes", st.st_size)
+    else:
+        key = sha256_file(path)
+
+    if hash_cache:
+        hash_cache.put(st, key)
+    return key
+
+
+def excluded(name, excludes):
+    return any(fnmatch.fnmatch(name, pattern) for pattern in excludes)
+
+
+def walk_item(item, excludes=()):
+    """Yields (path, web_uri) for every regular file in a push item.
+
+    Destination paths follow rsync semantics: if the item's src is a
+    directory without a trailing slash, the directory itself is placed
+    under dest; with a trailing slash, only its contents are. A file src
+    is placed under dest if dest ends with a slash, otherwise dest is
+    the full path of the file.
+
+    If the item has a 'files' attribute, as for planned transfers, only
+    those files within src are included, as with rsync --files-from.
+    """
+
+    src = item.src
+    dest = "/" + item.dest[0].strip("/")
+
+    files = getattr(item, "files", None)
+    if files:
+        for name in files:
+            yield os.path.join(src, name), "%s/%s" % (dest.rstrip("/"), name)
+        return
+
+    if not os.path.isdir(src):
+        if item.dest[0].endswith("/"):
+            yield src, "%s/%s" % (dest.rstrip("/"), os.path.basename(src))
+        else:
+            yield src, dest
+        return
+
+    if not src.endswith("/"):
+        dest = "%s/%s" % (dest.rstrip("/"), os.path.basename(src))
+
+    for dirpath, dirnames, filenames in os.walk(src):
+        dirnames[:] = sorted(
+            name for name in dirnames if not excluded(name, excludes)
+        )
+        relpath = os.path.relpath(dirpath, src)
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            if excluded(name, excludes):
+                continue
+            if os.path.islink(path) or not os.path.isfile(path):
+                LOG.debug("Skipping non-regular file %s", path)
+                continue
+            parts = [dest.rstrip("/")]
+            if relpath != os.curdir:
+                parts.append(relpath.replace(os.sep, "/"))
+            parts.append(name)
+            yield path, "/".join(parts)
+
+
+class PushTarget(object):
+    """A publish in one exodus-gw environment to which content is pushed.
+
+    Attributes:
+        gateway (ExodusGatewaySession):
+            Session for the target's exodus-gw environment.
+        publish (dict):
+            The publish to which content is added.
+        error (Exception):
+            The error which stopped the push to this target, if any.
+    """
+
+    def __init__(self, gateway, publish):
+        self.gateway = gateway
+        self.publish = publish
+        self.error = None
+
+    @property
+    def env(self):
+        return self.gateway.gw_env
+
+
+class NativeUploader(object):
+    """Pushes content to exodus-gw in-process.
+
+    This is an alternative to exodus-rsync which uploads content and adds
+    it to a publish using a single exodus-gw session, avoiding the cost of
+    spawning a process and authenticating per push item.
+
+    The push runs as a pipeline of concurrent stages connected by bounded
+    queues: files are enumerated, then hashed, then uploaded, then added
+    to the publish.
+
+    If a :class:`~.hasher.ProcessHasher` is given as 'hasher', files are
+    hashed on its pool of processes rather than in the pushing threads.
+
+    Content may be pushed to several targets (publishes in different
+    exodus-gw environments) at once, in which case each file is hashed
+    once but uploaded to and added to every target. A failure in one
+    target then stops the push to that target only, recorded in its
+    'error' attribute.
+    """
+
+    # Number of recently uploaded keys remembered to skip repeated
+    # existence checks for duplicate content.
+    uploaded_cache_size = 10000
+
+    def __init__(
+        self,
+        targets,
+        workers=1,
+        excludes=(),
+        hash_cache=None,
+        manifest=None,
+        hasher=None,
+    ):  # pylint: disable=too-many-arguments
+        self.targets = targets
+        self.workers = max(workers, 1)
+        self.excludes = excludes
+        self.hash_cache = hash_cache
+        self.manifest = manifest
+        self.hasher = hasher
+        self.queue_size = QUEUE_SIZE
+        self.metrics = targets[0].gateway.metrics
+
+        self._uploaded = OrderedDict()
+        self._uploaded_lock = Lock()
+
+    def digest(self, path, st):
+        """Returns the sha256 digest of a file, hashing it only if the
+        digest is not already cached."""
+
+        return file_digest(path, st, self.hash_cache, self.metrics)
+
+    def files(self, items):
+        """Enumeration stage: yields (path, web_uri) for every file of the
+        given push items."""
+
+        for item in items:
+            LOG.debug("Processing %s", item)
+            for path, web_uri in walk_item(item, self.excludes):
+                self.metrics.count("files")
+                yield path, web_uri
+
+    def hash_file(self, entry):
+        """Hashing stage: returns (path, web_uri, size, key) for a file."""
+
+        path, web_uri = entry
+        st = os.stat(path)
+        return path, web_uri, st.st_size, self.digest(path, st)
+
+    def hash_files(self, entries):
+        """Hashing stage using the process pool of 'hasher'."""
+
+        for (path, web_uri), st, key in self.hasher.hash_files(entries):
+            yield path, web_uri, st.st_size, key
+
+    def fail(self, target, error):
+        if not target.error:
+            LOG.error(
+                "Push to exodus-gw environment %s failed: %s",
+                target.env,
+                error,
+            )
+            target.error = error
+
+    def upload_to(self, target, path, size, key):
+        """Uploads a file to one target, if not already present."""
+
+        gateway = target.gateway
+        cache_key = (target.env, key)
+
+        with self._uploaded_lock:
+            known = cache_key in self._uploaded
+
+        if not known and not gateway.blob_exists(key):
+            LOG.debug("Uploading %s (%s bytes) as %s", path, size, key)
+            gateway.upload_blob(key, path, size)
+
+        with self._uploaded_lock:
+            self._uploaded[cache_key] = True
+            while len(self._uploaded) > self.uploaded_cache_size:
+                self._uploaded.popitem(last=False)
+
+    def upload_file(self, entry):
+        """Upload stage: uploads a hashed file to every target.
+
+        Returns:
+            tuple: (web_uri, object_key, content_type) for the file, or
+            None if the file is unchanged since it was last pushed.
+        """
+
+        path, web_uri, size, key = entry
+
+        if self.manifest:
+            if self.manifest.is_current(web_uri, size, key):
+                return None
+            self.manifest.record(web_uri, size, key)
+
+        for target in self.targets:
+            if target.error:
+                continue
+            try:
+                self.upload_to(target, path, size, key)
+            except Exception as error:  # pylint: disable=broad-except
+                if len(self.targets) == 1:
+                    raise
+                self.fail(target, error)
+
+        return web_uri, key, mimetypes.guess_type(web_uri)[0]
+
+    def add_items(self, target, records):
+        """Adds uploaded files to a target's publish, until the push to
+        that target fails."""
+
+        def healthy():
+            for record in records:
+                if target.error:
+                    return
+                yield record
+
+        target.gateway.add_publish_items(target.publish, healthy())
+
+    def push(self, items):
+        """Uploads every file of the given push items and adds them to
+        the publish of each target."""
+
+        if self.hasher:
+            hashed = self.hash_files(self.files(items))
+        else:
+            hashed = threaded_map(
+                self.hash_file,
+                self.files(items),
+                workers=self.workers,
+                maxsize=self.queue_size,
+            )
+        uploaded = threaded_map(
+            self.upload_file,
+            hashed,
+            workers=self.workers,
+            maxsize=self.queue_size,
+        )
+        records = (entry for entry in uploaded if entry)
+        try:
+            if len(self.targets) == 1:
+                self.add_items(self.targets[0], records)
+                return
+
+            errors = broadcast(
+                records,
+                [partial(self.add_items, target) for target in self.targets],
+                maxsize=self.queue_size,
+            )
+            for target, exc_info in zip(self.targets, errors):
+                if exc_info:
+                    self.fail(target, exc_info[1])
+        finally:
+            uploaded.close()
@@ -0,0 +1,171 @@
+import sys
+import threading
+
+import six
+from six.moves import queue
+
+# How long blocked threads wait before checking whether the pipeline has
+# been stopped.
+POLL_INTERVAL = 0.1
+
+_DONE = object()
+
+
+class _Failure(object):
+    def __init__(self, exc_info):
+        self.exc_info = exc_info
+
+
+class _Stop(object):
+    def __init__(self):
+        self.event = threading.Event()
+
+    def __bool__(self):
+        return self.event.is_set()
+
+    __nonzero__ = __bool__
+
+    def set(self):
+        self.event.set()
+
+
+def _put(q, value, stop):
+    """Puts to a queue, blocking until there's room or the pipeline has
+    been stopped. Returns False if the value was dropped."""
+
+    while not stop:
+        try:
+            q.put(value, timeout=POLL_INTERVAL)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _thread(target, *args):
+    thread = threading.Thread(target=target, args=args)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def threaded_map(fn, items, workers=1, maxsize=1000):
+    """Applies a function to items on a pool of threads, as one stage of a
+    pipeline.
+
+    Items are pulled from the input on a dedicated thread into a bounded
+    queue, processed by 'workers' threads, and results are passed back
+    through another bounded queue. When a stage can't keep up, the queues
+    fill up and earlier stages block, so memory use stays bounded however
+    many items there are. Stages are chained by passing the output of one
+    threaded_map as the input of another, in which case each stage runs
+    concurrently with the others.
+
+    Results are yielded in the order they complete. The first exception
+    raised by 'fn' or by the input iterable stops the stage and is
+    re-raised to the consumer.
+    """
+
+    workers = max(workers, 1)
+    inputs = queue.Queue(maxsize)
+    outputs = queue.Queue(maxsize)
+    stop = _Stop()
+
+    def feed():
+        try:
+            for item in items:
+                if not _put(inputs, item, stop):
+                    break
+        except Exception:  # pylint: disable=broad-except
+            _put(outputs, _Failure(sys.exc_info()), stop)
+            stop.set()
+        finally:
+            for _ in range(workers):
+                _put(inputs, _DONE, stop)
+            # If the input is an earlier stage, this stops it too.
+            close = getattr(items, "close", None)
+            if close:
+                close()
+
+    def work():
+        while not stop:
+            try:
+                item = inputs.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                break
+            try:
+                result = fn(item)
+            except Exception:  # pylint: disable=broad-except
+                _put(outputs, _Failure(sys.exc_info()), stop)
+                stop.set()
+                break
+            _put(outputs, result, stop)
+        _put(outputs, _DONE, stop)
+
+    _thread(feed)
+    for _ in range(workers):
+        _thread(work)
+
+    try:
+        running = workers
+        while running:
+            result = outputs.get()
+            if result is _DONE:
+                running -= 1
+            elif isinstance(result, _Failure):
+                six.reraise(*result.exc_info)
+            else:
+                yield result
+    finally:
+        stop.set()
+
+
+class _Channel(object):
+    """Feeds items to one consumer of :func:`broadcast`."""
+
+    def __init__(self, consumer, maxsize):
+        self.consumer = consumer
+        self.queue = queue.Queue(maxsize)
+        self.stop = _Stop()
+        self.exc_info = None
+        self.thread = _thread(self.consume)
+
+    def consume(self):
+        try:
+            self.consumer(iter(self.queue.get, _DONE))
+        except Exception:  # pylint: disable=broad-except
+            self.exc_info = sys.exc_info()
+        finally:
+            self.stop.set()
+
+
+def broadcast(items, consumers, maxsize=1000):
+    """Passes every item to each of several consumers, as the last stage
+    of a pipeline.
+
+    Each consumer is called on its own thread with an iterable of the
+    items, fed through a bounded queue. A consumer which raises or returns
+    early stops receiving items, without affecting the others.
+
+    Returns:
+        list: for each consumer, the exc_info of the exception it raised,
+        or None.
+    """
+
+    channels = [_Channel(consumer, maxsize) for consumer in consumers]
+
+    try:
+        for item in items:
+            live = [channel for channel in channels if not channel.stop]
+            if not live:
+                break
+            for channel in live:
+                _put(channel.queue, item, channel.stop)
+    finally:
+        for channel in channels:
+            _put(channel.queue, _DONE, channel.stop)
+            channel.thread.join()
+
+    return [channel.exc_info for channel in channels]
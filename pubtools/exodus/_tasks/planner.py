@@ -0,0 +1,199 @@
+import logging
+import os
+import posixpath
+from collections import OrderedDict, namedtuple
+
+from .native import excluded
+
+LOG = logging.getLogger("pubtools-exodus")
+
+# Most files merged into one transfer, and most files held back from any
+# transfer while waiting to be merged, so that planning needs bounded
+# memory however many items are pushed.
+MAX_MERGED_FILES = 1000
+MAX_HELD_FILES = 10000
+
+
+class Transfer(namedtuple("Transfer", ["src", "dest", "files"])):
+    """A single transfer of content to exodus, as planned from push items.
+
+    'src' and 'dest' have the same meaning as on a push item, with 'dest'
+    holding exactly one path. If 'files' is set, only the named files
+    within the 'src' directory are transferred.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_item(cls, item):
+        return cls(item.src, (item.dest[0],), None)
+
+
+def norm_dest(dest):
+    return (
+        posixpath.normpath("/" + dest.strip("/")) if dest.strip("/") else "/"
+    )
+
+
+def covered(src, dest, dirs, excludes):
+    """Returns True if the file or directory at 'src' would be placed at
+    'dest' by transferring one of the directories in 'dirs'."""
+
+    rel = []
+    path = src
+    while True:
+        parent = os.path.dirname(path)
+        if parent == path:
+            return False
+
+        rel.insert(0, os.path.basename(path))
+        if excluded(rel[0], excludes):
+            # A transfer of any parent wouldn't include this path.
+            return False
+
+        for dest_root in dirs.get(parent, ()):
+            if posixpath.join(dest_root, *rel) == dest:
+                return True
+
+        path = parent
+
+
+def plan(items, excludes=(), drop_nested=True):
+    """Plans the transfers needed to push the given items, consuming them
+    lazily.
+
+    Paths are normalized and then:
+
+    - items mapping the same source to the same destination are pushed once
+    - items whose source is nested within a directory pushed by an earlier
+      item, at the same relative destination, are dropped, unless
+      'drop_nested' is False; this relies on 'excludes' being the only
+      paths a transfer of a directory leaves out
+    - file items in the same source directory, pushed under their own names
+      to the same destination directory, are merged into transfers of lists
+      of up to MAX_MERGED_FILES files
+
+    Transfers are yielded as they're planned, so that pushing them overlaps
+    reading the items. Besides directory and renamed file items, only up to
+    MAX_HELD_FILES files waiting to be merged are held in memory; duplicate
+    or nested items which aren't found within them, such as those read
+    before the directory containing them, are pushed anyway, which is
+    harmless.
+
+    Yields:
+        Transfer: the planned transfers.
+    """
+
+    # Destinations of each directory item, and renamed file items, seen.
+    dirs = {}
+    renamed = set()
+    # Files waiting to be merged, as {(src dir, dest dir): {name: item}},
+    # oldest first.
+    groups = OrderedDict()
+    counts = dict.fromkeys(
+        ("items", "transfers", "held", "duplicates", "nested", "merged"), 0
+    )
+
+    def is_nested(src, dest):
+        if drop_nested and covered(src, dest, dirs, excludes):
+            counts["nested"] += 1
+            return True
+        return False
+
+    def planned(transfer):
+        counts["transfers"] += 1
+        LOG.debug(
+            "Transfer %s -> %s%s",
+            transfer.src,
+            transfer.dest[0],
+            " (%s files)" % len(transfer.files) if transfer.files else "",
+        )
+        return transfer
+
+    def merge(key):
+        """Returns the transfer of the files waiting in a group, or None if
+        all turned out to be nested."""
+
+        src_dir, dest_dir = key
+        group = groups.pop(key)
+        counts["held"] -= len(group)
+
+        # A directory containing them may have been seen since they were.
+        names = [
+            name
+            for name in group
+            if not is_nested(
+                os.path.join(src_dir, name), posixpath.join(dest_dir, name)
+            )
+        ]
+        if not names:
+            return None
+        if len(names) == 1:
+            return planned(Transfer.from_item(group[names[0]]))
+
+        counts["merged"] += len(names)
+        files = tuple(sorted(names))
+        return planned(Transfer(src_dir.rstrip("/") + "/", (dest_dir,), files))
+
+    for item in items:
+        counts["items"] += 1
+        src = os.path.normpath(item.src)
+        dest = norm_dest(item.dest[0])
+
+        if os.path.isdir(item.src):
+            if not item.src.endswith("/"):
+                dest = posixpath.join(dest, os.path.basename(src))
+            if dest in dirs.get(src, ()):
+                counts["duplicates"] += 1
+                continue
+            dirs.setdefault(src, set()).add(dest)
+            if not is_nested(src, dest):
+                yield planned(Transfer.from_item(item))
+            continue
+
+        if item.dest[0].endswith("/"):
+            dest = posixpath.join(dest, os.path.basename(src))
+        name = os.path.basename(src)
+
+        if name != posixpath.basename(dest):
+            # Renamed on push, so can't be merged.
+            if (src, dest) in renamed:
+                counts["duplicates"] += 1
+            elif not is_nested(src, dest):
+                renamed.add((src, dest))
+                yield planned(Transfer.from_item(item))
+            continue
+
+        key = (os.path.dirname(src), posixpath.dirname(dest))
+        group = groups.setdefault(key, OrderedDict())
+        if name in group:
+            counts["duplicates"] += 1
+            continue
+        if is_nested(src, dest):
+            continue
+        group[name] = item
+        counts["held"] += 1
+
+        transfer = None
+        if len(group) >= MAX_MERGED_FILES:
+            transfer = merge(key)
+        elif counts["held"] > MAX_HELD_FILES:
+            transfer = merge(next(iter(groups)))
+        if transfer:
+            yield transfer
+
+    for key in list(groups):
+        transfer = merge(key)
+        if transfer:
+            yield transfer
+
+    LOG.info(
+        "Planned %s transfer(s) for %s push item(s): "
+        "%s duplicate(s) removed, %s nested item(s) removed, "
+        "%s file(s) merged",
+        counts["transfers"],
+        counts["items"],
+        counts["duplicates"],
+        counts["nested"],
+        counts["merged"],
+    )
@@ -1,20 +1,217 @@
+import heapq
 import logging
+import os
+import random
+import shutil
 import subprocess
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from threading import Event, Lock
 
-from pushsource import Source
+from monotonic import monotonic
 
+from pubtools.exodus.gateway import ExodusGatewaySession
 from pubtools.exodus.task import ExodusTask
 
+from .._hooks.specs import notify
+from .hashcache import HashCache
+from .hasher import ProcessHasher
+from .journal import PushJournal, item_digest
+from .manifest import PushManifest, delta_transfer
+from .native import NativeUploader, PushTarget, file_digest, walk_item
+from .pipeline import threaded_map
+from .planner import plan
+from .rsyncout import BUFFER_SIZE, RsyncOutput
+
 LOG = logging.getLogger("pubtools-exodus")
 LOG_FORMAT = "%(asctime)s [%(levelname)-8s] %(message)s"
 
+RSYNC_EXCLUDES = [".nfs*", ".latest_rsync", ".lock"]
+
+# exodus-rsync options which may leave out of a directory's transfer files
+# other than RSYNC_EXCLUDES, as long and short names.
+RSYNC_FILTER_OPTIONS = (
+    "--exclude",
+    "--exclude-from",
+    "--include",
+    "--include-from",
+    "--filter",
+    "--cvs-exclude",
+    "--max-size",
+    "--min-size",
+)
+RSYNC_FILTER_SHORT_OPTIONS = "fFC"
+
+
+def filters_files(args):
+    """Returns True if exodus-rsync arguments 'args' include any option
+    filtering which files are transferred."""
+
+    for arg in args:
+        if arg.startswith("--"):
+            if arg.split("=", 1)[0] in RSYNC_FILTER_OPTIONS:
+                return True
+        elif arg.startswith("-"):
+            # Short options may be combined, e.g. -avC. Any option taking a
+            # value ends the group.
+            for char in arg[1:]:
+                if char in RSYNC_FILTER_SHORT_OPTIONS:
+                    return True
+                if not char.isalpha():
+                    break
+    return False
+
+
+class RsyncRun(object):
+    """The exodus-rsync command pushing one item, and how many times it
+    has been attempted."""
+
+    def __init__(self, cmd, item, digest):
+        self.cmd = cmd
+        self.item = item
+        self.digest = digest
+        self.attempts = 0
+
 
 class ExodusPushTask(ExodusTask):
     """Push a directory to the Exodus CDN"""
 
+    # Seconds to wait before the first retry of a failed item, doubling
+    # for each later retry up to retry_wait_max.
+    retry_wait = 5.0
+    retry_wait_max = 120.0
+
+    def __init__(self, args=None):
+        super(ExodusPushTask, self).__init__(args)
+
+        self._procs = set()
+        self._procs_lock = Lock()
+        self._abort = Event()
+        self._retry_budget = 0
+        self._files_dir = None
+        self._journal = None
+        self._hash_cache = None
+        self._hasher = None
+        self._manifest = None
+
     def add_args(self):
         super(ExodusPushTask, self).add_args()
 
+        self.parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help=("Number of items or files to push concurrently"),
+        )
+
+        self.parser.add_argument(
+            "--item-retries",
+            type=int,
+            default=3,
+            metavar="N",
+            help=(
+                "Maximum number of times to retry pushing an item after "
+                "exodus-rsync fails in a way which may be temporary"
+            ),
+        )
+
+        self.parser.add_argument(
+            "--retry-budget",
+            type=int,
+            default=10,
+            metavar="N",
+            help=("Maximum number of item retries for the whole push"),
+        )
+
+        self.parser.add_argument(
+            "--engine",
+            choices=["rsync", "native"],
+            default="rsync",
+            help=(
+                "Push content by running exodus-rsync per item (rsync), "
+                "or by uploading directly to exodus-gw (native)"
+            ),
+        )
+
+        self.parser.add_argument(
+            "--env",
+            dest="envs",
+            action="append",
+            metavar="ENV",
+            help=(
+                "exodus-gw environment to push to, in place of "
+                "EXODUS_GW_ENV; may be given several times to push to "
+                "several environments at once (native engine only)"
+            ),
+        )
+
+        self.parser.add_argument(
+            "--hash-cache",
+            metavar="PATH",
+            help=(
+                "Path to a local database of file checksums, used to avoid "
+                "rehashing unchanged files (native engine or --manifest only)"
+            ),
+        )
+
+        self.parser.add_argument(
+            "--hash-cache-size",
+            type=int,
+            default=1000000,
+            metavar="N",
+            help=("Maximum number of checksums kept in --hash-cache"),
+        )
+
+        self.parser.add_argument(
+            "--hash-processes",
+            type=int,
+            default=0,
+            metavar="N",
+            help=(
+                "Number of processes used to checksum files (native engine "
+                "or --manifest only); by default, files are checksummed "
+                "by the pushing threads"
+            ),
+        )
+
+        self.parser.add_argument(
+            "--no-coalesce",
+            dest="coalesce",
+            action="store_false",
+            help=(
+                "Push every item separately, rather than first removing "
+                "duplicate items and merging items where possible"
+            ),
+        )
+
+        self.parser.add_argument(
+            "--manifest",
+            metavar="PATH",
+            help=(
+                "Path to a local database of files pushed from this source; "
+                "only files added or changed since the last push are pushed"
+            ),
+        )
+
+        self.parser.add_argument(
+            "--journal",
+            metavar="PATH",
+            help=(
+                "Path of a file recording the progress of the push, "
+                "removed once the push completes"
+            ),
+        )
+
+        self.parser.add_argument(
+            "--resume",
+            action="store_true",
+            help=(
+                "Resume a failed push recorded in --journal, reusing its "
+                "publish and skipping items already pushed (rsync engine)"
+            ),
+        )
+
         self.parser.add_argument(
             "source",
             help=(
@@ -24,6 +221,10 @@ class ExodusPushTask(ExodusTask):
 
     @property
     def push_items(self):
+        # pushsource is slow to import, so is only imported when needed
+        # rather than, e.g., for --help.
+        from pushsource import Source
+
         with Source.get(self.args.source) as source:
             for item in source:
                 if item.src and len(item.dest) == 1:
@@ -31,51 +232,520 @@ class ExodusPushTask(ExodusTask):
                 else:
                     LOG.warning("Unexpected push item type: %s", item)
 
+    @property
+    def transfers(self):
+        """Items to be pushed, planned into as few transfers as possible
+        unless --no-coalesce was given. Planned lazily, so items are read
+        from the source as they're pushed."""
+
+        if not self.args.coalesce:
+            return self.push_items
+
+        drop_nested = not filters_files(self.extra_args)
+        if not drop_nested:
+            # Nested items may hold files which the user's filters leave out
+            # of their parent's transfer.
+            LOG.info("Not removing nested push items, as filters are in use")
+        return plan(self.push_items, RSYNC_EXCLUDES, drop_nested)
+
+    def files_from(self, files):
+        """Writes a list of files for use with exodus-rsync --files-from,
+        returning its path."""
+
+        if not self._files_dir:
+            self._files_dir = tempfile.mkdtemp(prefix="pubtools-exodus-")
+
+        fd, path = tempfile.mkstemp(dir=self._files_dir, suffix=".txt")
+        with os.fdopen(fd, "w") as out:
+            for name in files:
+                out.write(name + "\n")
+        return path
+
+    def rsync_cmd(self, item, publish_id):
+        """Returns the exodus-rsync command used to push a single item."""
+
+        cmd = ["exodus-rsync", "--exodus-publish", publish_id]
+        for exclude in RSYNC_EXCLUDES:
+            cmd.extend(["--exclude", exclude])
+        if getattr(item, "files", None):
+            cmd.append("--files-from=%s" % self.files_from(item.files))
+        cmd.extend([item.src, "exodus:%s" % item.dest[0]])
+
+        if self.args.verbose:
+            cmd.append("-" + "v" * self.args.verbose)
+        if self.extra_args:
+            cmd.extend(self.extra_args)
+
+        return cmd
+
+    def rsync(self, cmd, item=None):
+        """Runs a single exodus-rsync command to completion.
+
+        Output is streamed through :class:`~.rsyncout.RsyncOutput`, and
+        so logged in full only at debug level.
+
+        Returns:
+            tuple: the process exit code and its
+            :class:`~.rsyncout.RsyncOutput`, or (None, None) if the push
+            was aborted before the process started.
+        """
+
+        if self._abort.is_set():
+            return None, None
+
+        notify("exodus_push_item_start", item=item)
+        start = monotonic()
+
+        proc = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+            bufsize=BUFFER_SIZE,
+        )
+        with self._procs_lock:
+            self._procs.add(proc)
+
+        output = RsyncOutput(
+            "exodus:%s" % item.dest[0] if item else "exodus-rsync",
+            self.metrics,
+        )
+        try:
+            with self.metrics.timer("rsync"):
+                output.consume(proc.stdout)
+                ret = proc.wait()
+            self.metrics.count("rsync_processes")
+            if ret:
+                self.metrics.count("rsync_failures")
+            output.finish(ret)
+            notify(
+                "exodus_push_item_finish",
+                item=item,
+                duration=monotonic() - start,
+                exit_code=ret,
+            )
+            return ret, output
+        finally:
+            with self._procs_lock:
+                self._procs.discard(proc)
+
+    def stop_rsync(self, pending):
+        """Cancels queued exodus-rsync runs and terminates running ones."""
+
+        self._abort.set()
+
+        for future in pending:
+            future.cancel()
+
+        with self._procs_lock:
+            for proc in self._procs:
+                try:
+                    proc.terminate()
+                except OSError:  # pragma: no cover
+                    # Process has already exited.
+                    pass
+
+    def collect_rsync(self, executor, pending, retries, limit):
+        """Waits until no more than 'limit' exodus-rsync runs are pending
+        or awaiting retry.
+
+        Runs which failed in a way which may be temporary are retried
+        after a backoff, while other runs continue. Raises as soon as any
+        run has failed and can't be retried.
+        """
+
+        while len(pending) + len(retries) > limit:
+            now = monotonic()
+            while retries and retries[0][0] <= now:
+                run = heapq.heappop(retries)[-1]
+                pending[executor.submit(self.rsync_item, run)] = run
+
+            timeout = max(retries[0][0] - now, 0) if retries else None
+            if not pending:
+                time.sleep(timeout)
+                continue
+
+            done, _ = wait(
+                pending, timeout=timeout, return_when=FIRST_COMPLETED
+            )
+            for future in done:
+                run = pending.pop(future)
+                ret, retryable = future.result()
+                if not ret:
+                    continue
+                if not (retryable and self.can_retry(run)):
+                    raise RuntimeError("Exodus push failed")
+
+                delay = self.retry_delay(run)
+                LOG.warning(
+                    "Retrying %s in %.1fs (attempt %s of %s)",
+                    run.item.src,
+                    delay,
+                    run.attempts + 1,
+                    self.args.item_retries + 1,
+                )
+                self.metrics.count("rsync_retries")
+                heapq.heappush(retries, (monotonic() + delay, id(run), run))
+
+    def can_retry(self, run):
+        if run.attempts > self.args.item_retries:
+            LOG.error(
+                "Giving up on %s after %s attempts", run.item.src, run.attempts
+            )
+            return False
+        if self._retry_budget <= 0:
+            LOG.error("Retry budget of %s exhausted", self.args.retry_budget)
+            return False
+        self._retry_budget -= 1
+        return True
+
+    def retry_delay(self, run):
+        """Returns how long to wait before retrying a run: exponential
+        backoff with jitter, up to retry_wait_max seconds."""
+
+        delay = min(
+            self.retry_wait * 2 ** (run.attempts - 1), self.retry_wait_max
+        )
+        return delay * random.uniform(0.5, 1.0)
+
+    def rsync_item(self, run):
+        """Runs exodus-rsync for an item, recording it in the journal if
+        successful.
+
+        Returns:
+            tuple: the exit code, and whether a failure may succeed if
+            retried.
+        """
+
+        run.attempts += 1
+        ret, output = self.rsync(run.cmd, run.item)
+        if ret == 0 and run.digest:
+            self._journal.done(run.digest)
+        return ret, bool(output and output.retryable(ret))
+
+    def journal_digest(self, item):
+        """Returns the digest under which an item is journaled, or None if
+        not journaling."""
+
+        if not self._journal:
+            return None
+        return item_digest(item, RSYNC_EXCLUDES, self.extra_args)
+
+    def delta(self, item):
+        """Returns a transfer of the files of 'item' which have changed
+        since they were last pushed, or None."""
+
+        if not self._hasher:
+            return delta_transfer(
+                item,
+                self._manifest,
+                lambda path, st: file_digest(
+                    path, st, self._hash_cache, self.metrics
+                ),
+                RSYNC_EXCLUDES,
+            )
+
+        # Hash all of the item's files on the process pool up front.
+        digests = {}
+        for entry, _, key in self._hasher.hash_files(
+            walk_item(item, RSYNC_EXCLUDES)
+        ):
+            digests[entry[0]] = key
+        return delta_transfer(
+            item,
+            self._manifest,
+            lambda path, _: digests[path],
+            RSYNC_EXCLUDES,
+        )
+
+    def rsync_transfers(self):
+        """Transfers to be pushed by exodus-rsync, reduced to only changed
+        files if a manifest is in use."""
+
+        if not self._manifest:
+            return self.transfers
+
+        # Files must be hashed to find changes, so do that concurrently.
+        deltas = threaded_map(
+            self.delta, self.transfers, workers=self.args.workers
+        )
+        return (item for item in deltas if item)
+
+    def push_rsync(self, publish_id):
+        workers = max(self.args.workers, 1)
+        pending = {}
+        retries = []
+        self._retry_budget = self.args.retry_budget
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            try:
+                for item in self.rsync_transfers():
+                    LOG.debug("Processing %s", item)
+                    digest = self.journal_digest(item)
+                    if digest and self._journal.is_done(digest):
+                        LOG.info("Skipping %s, already pushed", item.src)
+                        self.metrics.count("skipped_transfers")
+                        continue
+
+                    self.metrics.count("transfers")
+                    cmd = self.rsync_cmd(item, publish_id)
+                    LOG.info(" ".join(cmd))
+
+                    run = RsyncRun(cmd, item, digest)
+                    pending[executor.submit(self.rsync_item, run)] = run
+                    # Keep a bounded window of runs in flight so that
+                    # items aren't planned far ahead of their push.
+                    self.collect_rsync(executor, pending, retries, workers * 2)
+
+                self.collect_rsync(executor, pending, retries, 0)
+            except BaseException:
+                self.stop_rsync(pending)
+                raise
+
+    def check_native_args(self):
+        if self.extra_args:
+            self.parser.error(
+                "unrecognized arguments for native engine: %s"
+                % " ".join(self.extra_args)
+            )
+
+    def push_native(self, publish):
+        self.check_native_args()
+
+        uploader = NativeUploader(
+            [PushTarget(self, publish)],
+            workers=self.args.workers,
+            excludes=RSYNC_EXCLUDES,
+            hash_cache=self._hash_cache,
+            manifest=self._manifest,
+            hasher=self._hasher,
+        )
+        uploader.push(self.transfers)
+
+    def open_hashing(self):
+        if self.args.hash_cache:
+            self._hash_cache = HashCache(
+                self.args.hash_cache, max_entries=self.args.hash_cache_size
+            )
+        if self.args.hash_processes > 0:
+            self._hasher = ProcessHasher(
+                self.args.hash_processes,
+                hash_cache=self._hash_cache,
+                metrics=self.metrics,
+            )
+
+    def close_hashing(self):
+        if self._hasher:
+            self._hasher.close()
+        if self._hash_cache:
+            self._hash_cache.close()
+
+    def push_fanout(self, envs):
+        """Pushes content to several exodus-gw environments at once.
+
+        Content is read and hashed once, then uploaded to and published in
+        every environment. A failure in one environment doesn't stop the
+        push to the others; the push fails once all environments are done
+        if any of them failed.
+        """
+
+        if self.args.engine != "native":
+            self.parser.error("--env may be given only once with rsync engine")
+        if self.args.journal or self.args.manifest:
+            self.parser.error(
+                "--journal and --manifest may not be used with several --env"
+            )
+        self.check_native_args()
+
+        sessions = []
+        for env in envs:
+            session = ExodusGatewaySession(exodus_enabled=True, gw_env=env)
+            session.metrics = self.metrics
+            sessions.append(session)
+
+        failed = []
+        targets = []
+        with ThreadPoolExecutor(max_workers=len(sessions)) as executor:
+            publishes = [executor.submit(s.new_publish) for s in sessions]
+        for env, session, future in zip(envs, sessions, publishes):
+            if future.exception():
+                LOG.error(
+                    "Push to exodus-gw environment %s failed: %s",
+                    env,
+                    future.exception(),
+                )
+                failed.append(env)
+            else:
+                targets.append(PushTarget(session, future.result()))
+
+        if targets:
+            self.open_hashing()
+            try:
+                with self.metrics.timer("push_native"):
+                    NativeUploader(
+                        targets,
+                        workers=self.args.workers,
+                        excludes=RSYNC_EXCLUDES,
+                        hash_cache=self._hash_cache,
+                        hasher=self._hasher,
+                    ).push(self.transfers)
+            finally:
+                self.close_hashing()
+
+            healthy = [target for target in targets if not target.error]
+            failed.extend(target.env for target in targets if target.error)
+            failed.extend(self.commit_targets(healthy))
+
+        if failed:
+            raise RuntimeError(
+                "Exodus push failed for environment(s): %s"
+                % ", ".join(sorted(failed))
+            )
+
+    def commit_targets(self, targets):
+        """Commits the publish of each target, returning the environments
+        whose commits failed.
+
+        Commits are started concurrently, then watched together by a single
+        poller thread rather than each blocking a thread of its own.
+        """
+
+        if not targets:
+            return []
+
+        with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+            started = [
+                executor.submit(target.gateway.start_commit, target.publish)
+                for target in targets
+            ]
+
+        commits = []
+        for target, future in zip(targets, started):
+            if not future.exception():
+                future = target.gateway.watch_commit(future.result())
+            commits.append(future)
+
+        failed = []
+        for target, future in zip(targets, commits):
+            if future.exception():
+                LOG.error(
+                    "Commit in exodus-gw environment %s failed: %s",
+                    target.env,
+                    future.exception(),
+                )
+                failed.append(target.env)
+            else:
+                LOG.info(
+                    "Committed exodus-gw publish %s", target.publish["id"]
+                )
+        return failed
+
     def run(self):
         LOG.debug("Exodus push begins")
 
+        try:
+            self.push()
+        finally:
+            self.report_metrics("push")
+
+        LOG.info("Exodus push is complete")
+
+    def start_publish(self):
+        """Returns the publish for this push: a new publish, or, if
+        resuming, the publish of the journaled push."""
+
+        if self.args.resume and not self.args.journal:
+            self.parser.error("--resume requires --journal")
+
+        if not self.args.journal:
+            return self.new_publish()
+
+        self._journal = PushJournal(self.args.journal)
+        self._populate_exodus_gw_vars()
+        push_id = [self.args.source, self.gw_url, self.gw_env]
+
+        if self.args.resume:
+            publish = self._journal.read(*push_id)
+            if publish:
+                self.check_cert()
+                publish = self.resumable_publish(publish)
+            if publish:
+                LOG.info(
+                    "Resuming exodus-gw publish %s, %s item(s) already pushed",
+                    publish["id"],
+                    len(self._journal.completed),
+                )
+                self._journal.reopen()
+                return publish
+
         publish = self.new_publish()
+        self._journal.start(publish, *push_id)
+        return publish
+
+    def resumable_publish(self, publish):
+        """Returns the journaled 'publish' as exodus-gw now reports it, or
+        None if it can no longer be resumed, e.g. because it was committed
+        or has expired since the journal was written."""
+
+        current = self.get_publish(publish)
+        state = current["state"] if current else "missing"
+        if state != "PENDING":
+            LOG.warning(
+                "Journaled exodus-gw publish %s is %s, starting a new push",
+                publish["id"],
+                state,
+            )
+            return None
+        return current
+
+    def push(self):
+        envs = self.args.envs or []
+        if len(envs) > 1:
+            self.push_fanout(envs)
+            return
+        if envs:
+            self._gw_env = envs[0]
+
+        publish = self.start_publish()
         publish_id = str(publish.get("id"))
         LOG.info("Publish ID: %s", publish_id)
 
-        for item in self.push_items:
-            LOG.debug("Processing %s", item)
-            cmd = [
-                "exodus-rsync",
-                "--exodus-publish",
-                publish_id,
-                "--exclude",
-                ".nfs*",
-                "--exclude",
-                ".latest_rsync",
-                "--exclude",
-                ".lock",
-                item.src,
-                "exodus:%s" % item.dest[0],
-            ]
-            if self.args.verbose:
-                cmd.append("-" + "v" * self.args.verbose)
-            if self.extra_args:
-                cmd.extend(self.extra_args)
-
-            LOG.info(" ".join(cmd))
-
-            proc = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                universal_newlines=True,
+        self.open_hashing()
+        if self.args.manifest:
+            # As for the journal, exodus-rsync arguments are part of the
+            # scope, so that e.g. a --dry-run push can't mark files as
+            # published for later pushes without it.
+            self._manifest = PushManifest(
+                self.args.manifest,
+                " ".join(
+                    [self.args.source, self.gw_url, self.gw_env]
+                    + self.extra_args
+                ),
             )
-            for line in proc.stdout:
-                LOG.info(line.strip())
 
-            ret = proc.wait()
-            if ret != 0:
-                raise RuntimeError("Exodus push failed")
+        try:
+            with self.metrics.timer("push_%s" % self.args.engine):
+                if self.args.engine == "native":
+                    self.push_native(publish)
+                else:
+                    self.push_rsync(publish_id)
 
-        self.commit_publish(publish)
+            self.commit_publish(publish)
 
-        LOG.info("Exodus push is complete")
+            # Only now is the pushed content known to be published.
+            if self._manifest:
+                self._manifest.commit()
+        finally:
+            if self._files_dir:
+                shutil.rmtree(self._files_dir, ignore_errors=True)
+            if self._journal:
+                self._journal.close()
+            if self._manifest:
+                self._manifest.close()
+            self.close_hashing()
+
+        if self._journal:
+            self._journal.remove()
 
 
 def entry_point(args=None):
@@ -0,0 +1,168 @@
+import logging
+import re
+from collections import deque
+
+from monotonic import monotonic
+
+LOG = logging.getLogger("pubtools-exodus")
+
+# Size of the buffer used to read exodus-rsync output, large enough to
+# drain a full pipe in one read.
+BUFFER_SIZE = 64 * 1024
+
+# Number of trailing lines of output kept to be logged if exodus-rsync
+# fails.
+TAIL_LINES = 50
+
+# Minimum seconds between progress messages for a single exodus-rsync
+# process.
+PROGRESS_INTERVAL = 30.0
+
+# Lines of rsync --stats output which are recorded as counters, and the
+# first words of those lines, so other lines can be skipped cheaply.
+STATS = [
+    ("rsync_files", re.compile(r"Number of files: ([\d,]+)")),
+    (
+        "rsync_files_transferred",
+        re.compile(r"Number of (?:regular )?files transferred: ([\d,]+)"),
+    ),
+    ("rsync_total_bytes", re.compile(r"Total file size: ([\d,]+) bytes")),
+    (
+        "rsync_transferred_bytes",
+        re.compile(r"Total transferred file size: ([\d,]+) bytes"),
+    ),
+]
+STATS_PREFIXES = ("Number of ", "Total ", "sent ")
+
+# Summary line of rsync -v output, e.g.
+# "sent 1,024 bytes  received 35 bytes  2,118.00 bytes/sec"
+SUMMARY = re.compile(
+    r"sent ([\d,]+) bytes\s+received ([\d,]+) bytes\s+([\d,.]+) bytes/sec"
+)
+
+# Exit codes of rsync for failures which may succeed if retried: errors
+# starting the protocol (5), socket I/O (10), the protocol data stream
+# (12), and timeouts (30, 35).
+RETRYABLE_EXIT_CODES = (5, 10, 12, 30, 35)
+
+# Context in which exodus-rsync reports an HTTP status, e.g.
+# "Error: 503 Service Unavailable" or "status code: 503". Statuses are only
+# matched here, so numbers in file names or stats aren't mistaken for them.
+HTTP_STATUS = r"(?:\berror|\bstatus(?: code)?|\bhttp(?:/[\d.]+)?):? ?%s\b"
+
+# Output indicating a failure which may, or won't, succeed if retried.
+# Fatal output takes precedence.
+RETRYABLE_OUTPUT = re.compile(
+    r"timed? ?out|connection (?:reset|refused)|temporarily unavailable|"
+    r"too many requests|unexpected eof|bad gateway|service unavailable|"
+    + HTTP_STATUS % "(?:429|50[234])",
+    re.IGNORECASE,
+)
+FATAL_OUTPUT = re.compile(
+    r"forbidden|unauthori[sz]ed|certificate|no such file|"
+    + HTTP_STATUS % "40[13]",
+    re.IGNORECASE,
+)
+
+
+def number(text):
+    return float(text.replace(",", ""))
+
+
+class RsyncOutput(object):
+    """Consumes the output of an exodus-rsync process.
+
+    Output is logged in full only at debug level. Otherwise the latest line
+    is logged at most every PROGRESS_INTERVAL seconds, and the last
+    TAIL_LINES lines are logged only if the process fails, so verbose
+    output costs little however large the push.
+
+    Transfer stats found in the output are collected in 'stats' and added
+    to the push's metrics as counters.
+    """
+
+    def __init__(self, name, metrics=None):
+        self.name = name
+        self.metrics = metrics
+        self.lines = 0
+        self.stats = {}
+        self.tail = deque(maxlen=TAIL_LINES)
+
+        self._debug = LOG.isEnabledFor(logging.DEBUG)
+        self._next_progress = monotonic() + PROGRESS_INTERVAL
+
+    def consume(self, stream):
+        """Reads output from 'stream' until the end."""
+
+        for line in stream:
+            self.feed(line.strip())
+
+    def feed(self, line):
+        self.lines += 1
+        self.tail.append(line)
+
+        if self._debug:
+            LOG.debug("%s: %s", self.name, line)
+        elif monotonic() >= self._next_progress:
+            LOG.info("%s: %s", self.name, line)
+            self._next_progress = monotonic() + PROGRESS_INTERVAL
+
+        if line.startswith(STATS_PREFIXES):
+            self.parse(line)
+
+    def parse(self, line):
+        for name, pattern in STATS:
+            match = pattern.match(line)
+            if match:
+                self.stats[name] = int(number(match.group(1)))
+                return
+
+        match = SUMMARY.match(line)
+        if match:
+            self.stats["rsync_sent_bytes"] = int(number(match.group(1)))
+            self.stats["rsync_received_bytes"] = int(number(match.group(2)))
+            self.stats["rsync_speed"] = number(match.group(3))
+
+    def retryable(self, returncode):
+        """Returns True if a process which exited with 'returncode' and
+        this output failed in a way which may succeed if retried."""
+
+        if not returncode or returncode < 0:
+            # Succeeded, or was killed, e.g. as the push was aborted.
+            return False
+
+        text = "\n".join(self.tail)
+        if FATAL_OUTPUT.search(text):
+            return False
+        return returncode in RETRYABLE_EXIT_CODES or bool(
+            RETRYABLE_OUTPUT.search(text)
+        )
+
+    def finish(self, returncode):
+        """Records the stats of the finished process, logging the tail of
+        its output if it failed."""
+
+        if self.metrics:
+            for name, value in self.stats.items():
+                # Speeds can't be summed across processes.
+                if name != "rsync_speed":
+                    self.metrics.count(name, value)
+
+        if "rsync_speed" in self.stats:
+            LOG.info(
+                "%s: sent %s bytes at %.2f bytes/sec",
+                self.name,
+                self.stats["rsync_sent_bytes"],
+                self.stats["rsync_speed"],
+            )
+
+        if returncode and self.tail:
+            LOG.error(
+                "%s: exodus-rsync failed with exit code %s, "
+                "last %s of %s line(s) of output:\n%s",
+                self.name,
+                returncode,
+                len(self.tail),
+                self.lines,
+                "\n".join(self.tail),
+            )
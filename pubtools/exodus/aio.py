@@ -0,0 +1,203 @@
+"""asyncio support for exodus-gw operations.
+
+This module requires Python 3 and the httpx library, available by
+installing pubtools-exodus with the "async" extra.
+"""
+
+import asyncio
+import logging
+import ssl
+
+import httpx
+from monotonic import monotonic
+from six.moves.urllib.parse import urljoin
+
+from ._handles import CommitTask, Publish
+from .gateway import RETRY_STATUSES, GatewaySessionBase, retry_after
+
+LOG = logging.getLogger("pubtools-exodus")
+
+# Methods which are retried after any response in RETRY_STATUSES, as by
+# urllib3 for the synchronous session. Other requests, such as creating a
+# publish or starting a commit, may have taken effect despite an error, so
+# are only retried when exodus-gw asks for it.
+IDEMPOTENT_METHODS = frozenset(
+    ["HEAD", "GET", "PUT", "DELETE", "OPTIONS", "TRACE"]
+)
+
+
+class AsyncExodusGatewaySession(GatewaySessionBase):
+    """asyncio variant of :class:`~pubtools.exodus.gateway.ExodusGatewaySession`.
+
+    All requests made through an instance share one connection pool, so a
+    single event loop can drive many publishes and commits concurrently.
+    Instances should be closed when no longer needed, e.g. by using them
+    as an async context manager.
+    """
+
+    def __init__(
+        self, exodus_enabled=None, max_connections=100, transport=None
+    ):
+        super(AsyncExodusGatewaySession, self).__init__(exodus_enabled)
+
+        self.max_connections = max_connections
+        self.client = None
+        self._transport = transport
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        await self.close()
+
+    def new_client(self):
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+        )
+        if self._transport:
+            return httpx.AsyncClient(transport=self._transport, limits=limits)
+
+        context = ssl.create_default_context()
+        context.load_cert_chain(self.gw_crt, self.gw_key)
+        return httpx.AsyncClient(verify=context, limits=limits)
+
+    async def close(self):
+        if self.client:
+            await self.client.aclose()
+            self.client = None
+
+    async def do_request(self, method, url, **kwargs):
+        """Makes a request, retrying in the same cases and with the same
+        backoff as the synchronous session."""
+
+        if not self.client:
+            self.client = self.new_client()
+
+        self.metrics.count("requests")
+        attempt = 0
+        while True:
+            resp = await self.client.request(method, url, **kwargs)
+            if not self.should_retry(method, resp, attempt):
+                break
+
+            delay = retry_after(resp)
+            if delay is None:
+                delay = 2**attempt if attempt else 0
+            attempt += 1
+            self.metrics.count("retries")
+            LOG.debug(
+                "Retrying %s %s after %s (attempt %s)",
+                method,
+                url,
+                resp.status_code,
+                attempt,
+            )
+            await asyncio.sleep(delay)
+
+        if resp.status_code >= 400:
+            self.metrics.count("http_errors")
+
+        self.unpack_response(resp)
+        return resp
+
+    def should_retry(self, method, resp, attempt):
+        if attempt >= self.retries or resp.status_code not in RETRY_STATUSES:
+            return False
+        if method.upper() in IDEMPOTENT_METHODS:
+            return True
+        return resp.status_code == 429 or retry_after(resp) is not None
+
+    async def check_cert(self):
+        """Issue request to exodus-gw to identify permissions, using the
+        same process-wide cache as the synchronous session."""
+
+        context = self.cached_identity()
+        if context is None:
+            auth_url = urljoin(self.gw_url, "/whoami")
+            resp = await self.do_request("GET", auth_url)
+            context = resp.json()
+            self.cache_identity(context)
+
+        self.log_identity(context)
+
+    async def new_publish(self):
+        """Issue request to exodus-gw to create a new publish."""
+
+        if not self.exodus_enabled:
+            return None
+
+        self._populate_exodus_gw_vars()
+
+        if not self.whoami_background:
+            await self.check_cert()
+            whoami = None
+        else:
+            whoami = asyncio.ensure_future(self.check_cert())
+            whoami.add_done_callback(log_whoami_error)
+
+        try:
+            resp = await self.do_request("POST", self.publish_url())
+        except Exception:
+            if whoami:
+                await asyncio.wait([whoami])
+            raise
+
+        publish = Publish.from_response(resp)
+
+        LOG.info("Created exodus-gw publish %s", publish["id"])
+
+        return publish
+
+    async def poll_commit_completion(self, commit):
+        """Issues request(s) to exodus-gw for the commit's state, returning
+        if/when the state is either "COMPLETE" or "FAILED".
+
+        Polling behaves as in the synchronous session, but waits without
+        blocking the event loop.
+        """
+
+        timelimit = monotonic() + self.timeout
+
+        task_url = urljoin(self.gw_url, commit["links"]["self"])
+
+        interval = min(self.wait_min, self.wait)
+        task = commit
+        etag = None
+
+        while monotonic() < timelimit:
+            headers = {"If-None-Match": etag} if etag else {}
+            resp = await self.do_request("GET", task_url, headers=headers)
+            if resp.status_code != 304:
+                task = CommitTask.from_response(resp)
+                etag = resp.headers.get("ETag")
+
+            if self.commit_done(commit, task):
+                return task
+
+            delay = self.next_poll_delay(resp, interval)
+            await asyncio.sleep(max(min(delay, timelimit - monotonic()), 0))
+
+            interval = min(interval * 2, self.wait)
+
+        raise RuntimeError(
+            "Polling for %s timed out" % self.commit_msg(commit)
+        )
+
+    async def commit_publish(self, publish):
+        """Commits an exodus-gw publish and waits for the commit to
+        complete."""
+
+        LOG.info("Committing exodus-gw publish %s", publish["id"])
+
+        commit_url = urljoin(self.gw_url, publish["links"]["commit"])
+        resp = await self.do_request("POST", commit_url)
+
+        await self.poll_commit_completion(CommitTask.from_response(resp))
+
+        LOG.info("Committed exodus-gw publish %s", publish["id"])
+
+
+def log_whoami_error(task):
+    if not task.cancelled() and task.exception():
+        LOG.debug("exodus-gw identity check failed: %s", task.exception())
@@ -1,55 +1,93 @@
+import hashlib
 import logging
 import os
+import random
 import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from email.utils import mktime_tz, parsedate_tz
+from itertools import islice
+from threading import Lock, Thread
+from xml.etree import ElementTree
+
+try:
+    from typing import Any, Dict, Tuple
+except ImportError:  # pragma: no cover
+    # Only needed for type comments, and unavailable on Python 2.
+    pass
 
-import requests
 from monotonic import monotonic
-from requests.packages.urllib3.util.retry import (  # pylint: disable=import-error
-    Retry,
-)
 from six.moves.urllib.parse import urljoin
 
+from ._env import env_flag
+from ._handles import CommitTask, Publish
+from ._hooks.specs import hook_active, notify
+from ._metrics import Metrics, PoolStats, write_report
+from ._poller import shared_poller
+from ._ratelimit import shared_limiter
+
 LOG = logging.getLogger("pubtools-exodus")
 LOG_FORMAT = "%(asctime)s [%(levelname)-8s] %(message)s"
 
+# Response statuses for which requests are retried.
+RETRY_STATUSES = [429, 500, 502, 503, 504]
 
-class ExodusGatewaySession(
+# Objects larger than this are uploaded in parts of this size.
+UPLOAD_CHUNK_SIZE = 10 * 1024 * 1024
+
+# Responses from /whoami, shared by all sessions in the process, keyed by
+# (gateway URL, certificate fingerprint). Values are (expiry, context).
+IDENTITY_CACHE = {}  # type: Dict[Tuple[str, str], Tuple[float, Any]]
+IDENTITY_CACHE_LOCK = Lock()
+
+
+class GatewaySessionBase(
     object
 ):  # pylint: disable=too-many-instance-attributes
-    """Base class for operations passing through exodus-gateway."""
+    """Configuration and helpers shared by exodus-gw sessions, independent
+    of the HTTP client in use."""
 
-    def __init__(self, exodus_enabled=None):
-        super(ExodusGatewaySession, self).__init__()
+    def __init__(self, exodus_enabled=None, gw_env=None):
+        super(GatewaySessionBase, self).__init__()
+
+        # If set, used in place of EXODUS_GW_ENV.
+        self._gw_env = gw_env
 
         self.gw_env = None
         self.gw_url = None
         self.gw_crt = None
         self.gw_key = None
 
-        self.session = None
-        self.publish = None
-
         self._exodus_enabled = exodus_enabled
 
         # These defaults are not advertised or expected but can be controlled
         # by environment variables when needed (e.g., testing).
         self.retries = int(os.getenv("EXODUS_GW_RETRIES") or "5")
         self.timeout = int(os.getenv("EXODUS_GW_TIMEOUT") or "900")
-        self.wait = int(os.getenv("EXODUS_GW_WAIT") or "5")
-
-    def new_session(self):
-        retry_strategy = Retry(
-            total=int(self.retries),
-            backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504],
+        self.wait = float(os.getenv("EXODUS_GW_WAIT") or "5")
+        self.wait_min = float(os.getenv("EXODUS_GW_WAIT_MIN") or "0.25")
+        self.batch_size = int(os.getenv("EXODUS_GW_BATCH_SIZE") or "1000")
+        self.batch_workers = int(os.getenv("EXODUS_GW_BATCH_WORKERS") or "4")
+        self.pool_connections = int(
+            os.getenv("EXODUS_GW_POOL_CONNECTIONS") or "10"
         )
-        adapter = requests.adapters.HTTPAdapter(max_retries=retry_strategy)
-
-        out = requests.Session()
-        out.cert = (self.gw_crt, self.gw_key)
-        out.mount(self.gw_url, adapter)
-
-        return out
+        self.pool_maxsize = int(os.getenv("EXODUS_GW_POOL_MAXSIZE") or "32")
+        self.pool_block = env_flag("EXODUS_GW_POOL_BLOCK")
+        self.whoami_ttl = float(os.getenv("EXODUS_GW_WHOAMI_TTL") or "300")
+        self.whoami_background = env_flag("EXODUS_GW_WHOAMI_BACKGROUND")
+        self.rate_limit = float(os.getenv("EXODUS_GW_RATE_LIMIT") or "0")
+        self.rate_burst = float(os.getenv("EXODUS_GW_RATE_BURST") or "0")
+        self.rate_file = os.getenv("EXODUS_GW_RATE_FILE")
+
+        # Timings and counters for this session, reported at the end of a
+        # task and optionally written to these files.
+        self.metrics = Metrics()
+        self.metrics_file = os.getenv("EXODUS_METRICS_FILE")
+        self.metrics_prom = os.getenv("EXODUS_METRICS_PROM")
 
     def unpack_response(self, response):
         """Raise if response was not successful.
@@ -72,20 +110,8 @@ class ExodusGatewaySession(
             )
             raise
 
-    def do_request(self, **kwargs):
-        if not self.session:
-            self.session = self.new_session()
-
-        resp = self.session.request(**kwargs)
-        self.unpack_response(resp)
-        return resp
-
-    def check_cert(self):
-        """Issue request to exodus-gw to identify permissions."""
-
-        auth_url = urljoin(self.gw_url, "/whoami")
-        resp = self.do_request(method="GET", url=auth_url)
-        context = resp.json()
+    def log_identity(self, context):
+        """Logs the identity from an exodus-gw /whoami response."""
 
         for user_type, ident in (
             ("client", "serviceAccountId"),
@@ -105,75 +131,117 @@ class ExodusGatewaySession(
         else:
             LOG.debug("Not authenticated with exodus-gw at %s", self.gw_url)
 
-    def new_publish(self):
-        """Issue request to exodus-gw to create a new publish."""
-
-        if not self.exodus_enabled:
-            return None
-
-        self._populate_exodus_gw_vars()
-        self.check_cert()
-
-        publish_url = os.path.join(self.gw_url, self.gw_env, "publish")
-        resp_json = self.do_request(method="POST", url=publish_url).json()
+    def identity_key(self):
+        """Returns the key under which this session's identity is cached."""
 
-        LOG.info("Created exodus-gw publish %s", resp_json["id"])
-
-        return resp_json
-
-    def poll_commit_completion(self, commit):
-        """Issues request(s) to exodus-gw for the commit's state, returning
-        if/when the state is either "COMPLETE" or "FAILED".
-        """
+        try:
+            with open(self.gw_crt, "rb") as cert:
+                fingerprint = hashlib.sha256(cert.read()).hexdigest()
+        except (IOError, OSError):
+            # Unreadable here, but the HTTP client will complain if it
+            # matters; the path is the best identifier we have.
+            fingerprint = self.gw_crt
+        return (self.gw_url, fingerprint)
+
+    def cached_identity(self):
+        """Returns a cached /whoami response for this session's URL and
+        certificate, or None."""
+
+        key = self.identity_key()
+        with IDENTITY_CACHE_LOCK:
+            cached = IDENTITY_CACHE.get(key)
+            if cached and cached[0] > monotonic():
+                return cached[1]
+            IDENTITY_CACHE.pop(key, None)
+        return None
+
+    def cache_identity(self, context):
+        if self.whoami_ttl > 0:
+            with IDENTITY_CACHE_LOCK:
+                IDENTITY_CACHE[self.identity_key()] = (
+                    monotonic() + self.whoami_ttl,
+                    context,
+                )
 
-        timelimit = monotonic() + self.timeout
+    def publish_url(self):
+        return os.path.join(self.gw_url, self.gw_env, "publish")
+
+    def commit_msg(self, commit):
+        return "exodus-gw commit %s to %s" % (commit["id"], self.gw_url)
+
+    def commit_done(self, commit, task):
+        """Returns True if a commit's task has completed, or raises if it
+        has failed."""
+
+        if task["state"] == "COMPLETE":
+            LOG.debug("%s complete", self.commit_msg(commit))
+            return True
+        if task["state"] == "FAILED":
+            raise RuntimeError("%s failed" % self.commit_msg(commit))
+        return False
+
+    def finish_poll(self, commit, task, duration):
+        """Reports the outcome of polling a commit whose last known state
+        is 'task', returning the task if the commit completed, or raising
+        if it failed or polling timed out."""
+
+        notify(
+            "exodus_publish_committed",
+            publish_id=commit.get("publish_id"),
+            commit_id=commit["id"],
+            state=task["state"],
+            duration=duration,
+        )
 
-        msg = "exodus-gw commit %s to %s" % (commit["id"], self.gw_url)
+        if not self.commit_done(commit, task):
+            raise RuntimeError(
+                "Polling for %s timed out" % self.commit_msg(commit)
+            )
+        return task
 
-        while monotonic() < timelimit:
-            task_url = urljoin(self.gw_url, commit["links"]["self"])
-            resp = self.do_request(method="GET", url=task_url)
-            task = resp.json()
+    def next_poll_delay(self, response, interval):
+        """Returns how long to wait before polling again, given the last
+        response and current backoff interval."""
 
-            if task["state"] == "COMPLETE":
-                LOG.debug("%s complete", msg)
-                return task
-            if task["state"] == "FAILED":
-                raise RuntimeError("%s failed" % msg)
+        delay = retry_after(response)
+        if delay is None:
+            delay = interval * random.uniform(0.5, 1.0)
+        return delay
 
-            time.sleep(self.wait)
+    def metrics_report(self):
+        return self.metrics.report()
 
-        raise RuntimeError("Polling for %s timed out" % msg)
+    def report_metrics(self, job):
+        """Logs a summary of this session's metrics, and writes them to
+        EXODUS_METRICS_FILE (as JSON) and EXODUS_METRICS_PROM (in Prometheus
+        textfile format) if set.
 
-    def commit_publish(self, publish):
-        """Commits an exodus-gw publish, e.g.,
-        https://exodus-gw.example.com/prod/publish/4e59c1a0/commit
+        Failing to write metrics is logged, but doesn't fail the task.
         """
 
-        LOG.info("Committing exodus-gw publish %s", publish["id"])
-
-        commit_url = urljoin(self.gw_url, publish["links"]["commit"])
-        resp = self.do_request(method="POST", url=commit_url)
-        commit = resp.json()
-
-        self.poll_commit_completion(commit)
+        LOG.info("exodus metrics: %s", self.metrics)
 
-        LOG.info("Committed exodus-gw publish %s", publish["id"])
+        try:
+            write_report(
+                self.metrics_report(),
+                job,
+                json_path=self.metrics_file,
+                prom_path=self.metrics_prom,
+            )
+        except (IOError, OSError) as error:
+            LOG.warning("Could not write exodus metrics: %s", error)
 
     @property
     def exodus_enabled(self):
         if self._exodus_enabled is None:
-            enable_vals = ["true", "t", "1", "yes", "y"]
-            self._exodus_enabled = (
-                os.getenv("EXODUS_ENABLED", "False").lower() in enable_vals
-            )
+            self._exodus_enabled = env_flag("EXODUS_ENABLED")
         return self._exodus_enabled
 
     def _populate_exodus_gw_vars(self):
         """Populate exodus gateway details from environment variables. All exodus CDN transactions
         go through exodus gateway."""
 
-        self.gw_env = os.getenv("EXODUS_GW_ENV")
+        self.gw_env = self._gw_env or os.getenv("EXODUS_GW_ENV")
         if not self.gw_env:
             raise RuntimeError(
                 "Environment variable '%s' is not set" % "EXODUS_GW_ENV"
@@ -196,3 +264,548 @@ class ExodusGatewaySession(
             raise RuntimeError(
                 "Environment variable '%s' is not set" % "EXODUS_GW_KEY"
             )
+
+
+class ExodusGatewaySession(GatewaySessionBase):
+    """Base class for operations passing through exodus-gateway."""
+
+    def __init__(self, exodus_enabled=None, gw_env=None):
+        super(ExodusGatewaySession, self).__init__(exodus_enabled, gw_env)
+
+        self.session = None
+        self.limiter = None
+        self.publish = None
+        self.pool_stats = PoolStats()
+
+        self._session_lock = Lock()
+
+    def new_session(self):
+        # requests is imported only once a session is needed, as importing
+        # it takes longer than many tasks otherwise spend in this module.
+        import requests
+
+        from ._pool import GatewayRetry, InstrumentedHTTPAdapter
+
+        retry_strategy = GatewayRetry(
+            total=int(self.retries),
+            backoff_factor=1,
+            status_forcelist=RETRY_STATUSES,
+        )
+        adapter = InstrumentedHTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+            max_retries=retry_strategy,
+            stats=self.pool_stats,
+        )
+
+        out = requests.Session()
+        out.cert = (self.gw_crt, self.gw_key)
+        out.mount(self.gw_url, adapter)
+
+        return out
+
+    def do_request(self, **kwargs):
+        # The session, and so its connection pool, is shared by every
+        # thread using this object.
+        if not self.session:
+            with self._session_lock:
+                if not self.session:
+                    self.limiter = shared_limiter(
+                        self.gw_url,
+                        self.rate_limit,
+                        self.rate_burst,
+                        self.rate_file,
+                    )
+                    self.session = self.new_session()
+
+        # Throttled requests are retried here rather than by urllib3, so
+        # that throttling slows down every request through the limiter.
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            resp = self.send_request(kwargs)
+
+            delay = self.throttle_delay(resp, attempt)
+            if delay is None:
+                break
+            self.metrics.count("throttled")
+            self.limiter.throttle(delay)
+            resp.close()
+            attempt += 1
+
+        retries = response_retries(resp)
+        if retries:
+            self.metrics.count("retries", retries)
+        if resp.status_code >= 400:
+            self.metrics.count("http_errors")
+
+        self.unpack_response(resp)
+        return resp
+
+    def send_request(self, kwargs):
+        self.metrics.count("requests")
+        start = monotonic()
+        resp = None
+        try:
+            resp = self.session.request(**kwargs)
+        finally:
+            if hook_active("exodus_gw_request"):
+                self.request_event(kwargs, resp, monotonic() - start)
+        return resp
+
+    def throttle_delay(self, response, attempt):
+        """Returns how long every request should pause before retrying a
+        throttled response, or None if the response wasn't throttled or
+        'attempt' was the last."""
+
+        if attempt >= self.retries:
+            return None
+
+        delay = retry_after(response)
+        if response.status_code == 429 or (
+            delay is not None and response.status_code in RETRY_STATUSES
+        ):
+            return delay if delay is not None else 2.0**attempt
+        return None
+
+    def request_event(self, kwargs, resp, duration):
+        data = kwargs.get("data")
+        request_size = len(data) if isinstance(data, (bytes, str)) else None
+
+        if resp is None:
+            status_code, response_size, retries = None, None, 0
+        else:
+            status_code = resp.status_code
+            response_size = len(resp.content)
+            retries = response_retries(resp)
+
+        notify(
+            "exodus_gw_request",
+            method=kwargs.get("method"),
+            url=kwargs.get("url"),
+            status_code=status_code,
+            duration=duration,
+            retries=retries,
+            sizes=(request_size, response_size),
+        )
+
+    def metrics_report(self):
+        report = super(ExodusGatewaySession, self).metrics_report()
+        report["pool"] = {
+            "checkouts": self.pool_stats.checkouts,
+            "waits": self.pool_stats.waits,
+            "wait_seconds": self.pool_stats.wait_time,
+            "new_connections": self.pool_stats.new_connections,
+        }
+        return report
+
+    def check_cert(self):
+        """Issue request to exodus-gw to identify permissions.
+
+        The identity is cached for EXODUS_GW_WHOAMI_TTL seconds (default
+        300) across all sessions in the process using the same exodus-gw
+        URL and certificate.
+        """
+
+        context = self.cached_identity()
+        if context is None:
+            auth_url = urljoin(self.gw_url, "/whoami")
+            with self.metrics.timer("whoami"):
+                resp = self.do_request(method="GET", url=auth_url)
+            context = resp.json()
+            self.cache_identity(context)
+
+        self.log_identity(context)
+
+    def new_publish(self):
+        """Issue request to exodus-gw to create a new publish.
+
+        If EXODUS_GW_WHOAMI_BACKGROUND is enabled, the identity check runs
+        concurrently with publish creation rather than before it, and is
+        only waited for if publish creation fails.
+
+        Returns:
+            Publish: a handle for the new publish, or None if Exodus is
+            disabled.
+        """
+
+        if not self.exodus_enabled:
+            return None
+
+        self._populate_exodus_gw_vars()
+
+        if not self.whoami_background:
+            self.check_cert()
+            whoami = None
+        else:
+            whoami = run_in_background("exodus-whoami", self.check_cert)
+
+        start = monotonic()
+        try:
+            with self.metrics.timer("create_publish"):
+                publish = Publish.from_response(
+                    self.do_request(method="POST", url=self.publish_url())
+                )
+        except Exception:
+            if whoami:
+                # Identity is most useful when something went wrong.
+                wait([whoami], timeout=self.timeout)
+            raise
+
+        LOG.info("Created exodus-gw publish %s", publish["id"])
+        notify(
+            "exodus_publish_created",
+            publish=publish,
+            duration=monotonic() - start,
+        )
+
+        return publish
+
+    def poll_commit_completion(self, commit):
+        """Issues request(s) to exodus-gw for the commit's state, returning
+        if/when the state is either "COMPLETE" or "FAILED".
+
+        Polling starts at short intervals, which grow exponentially (with
+        jitter) up to EXODUS_GW_WAIT seconds, so quick commits are noticed
+        quickly while long ones are not polled excessively. A Retry-After
+        header from exodus-gw overrides the interval, and the task is
+        requested conditionally so an unchanged task may cost only a 304.
+        """
+
+        start = monotonic()
+        with self.metrics.timer("poll_commit"):
+            task = self._poll_commit_completion(commit)
+
+        return self.finish_poll(commit, task, monotonic() - start)
+
+    def watch_commit(self, commit):
+        """Starts watching a commit, as returned by :meth:`start_commit`,
+        without blocking a thread until it completes.
+
+        Commits are polled as by :meth:`poll_commit_completion`, but all
+        commits watched by sessions using the same exodus-gw URL and
+        certificate are polled by a single thread of the process, through
+        one connection pool.
+
+        Returns:
+            Future: resolved with the commit's final task, or failing if
+            the commit fails or polling times out.
+        """
+
+        return shared_poller(self).watch(commit, self)
+
+    def _poll_commit_completion(self, commit):
+        """Polls a commit until it finishes or polling times out, returning
+        the last known state of its task."""
+
+        timelimit = monotonic() + self.timeout
+
+        task_url = urljoin(self.gw_url, commit["links"]["self"])
+
+        interval = min(self.wait_min, self.wait)
+        task = commit
+        etag = None
+
+        while monotonic() < timelimit:
+            headers = {"If-None-Match": etag} if etag else {}
+            self.metrics.count("commit_polls")
+            resp = self.do_request(method="GET", url=task_url, headers=headers)
+            if resp.status_code != 304:
+                task = CommitTask.from_response(resp)
+                etag = resp.headers.get("ETag")
+
+            if task["state"] in ("COMPLETE", "FAILED"):
+                return task
+
+            delay = self.next_poll_delay(resp, interval)
+            time.sleep(max(min(delay, timelimit - monotonic()), 0))
+
+            interval = min(interval * 2, self.wait)
+
+        return task
+
+    def start_commit(self, publish):
+        """Starts committing an exodus-gw publish, e.g.,
+        https://exodus-gw.example.com/prod/publish/4e59c1a0/commit
+
+        Returns:
+            CommitTask: the commit task, which may be passed to
+            :meth:`poll_commit_completion`.
+        """
+
+        LOG.info("Committing exodus-gw publish %s", publish["id"])
+
+        commit_url = urljoin(self.gw_url, publish["links"]["commit"])
+        with self.metrics.timer("start_commit"):
+            resp = self.do_request(method="POST", url=commit_url)
+        return CommitTask.from_response(resp)
+
+    def commit_publish(self, publish):
+        """Commits an exodus-gw publish and waits for the commit to
+        complete."""
+
+        commit = self.start_commit(publish)
+
+        self.poll_commit_completion(commit)
+
+        LOG.info("Committed exodus-gw publish %s", publish["id"])
+
+    def update_publish(self, publish, items):
+        """Adds items to an exodus-gw publish.
+
+        Args:
+            publish (Publish):
+                The publish, as returned by :meth:`new_publish`.
+            items (list[dict]):
+                Items to add, each with "web_uri", "object_key" and
+                optionally "content_type" keys.
+        """
+
+        publish_url = urljoin(self.gw_url, publish["links"]["self"])
+        with self.metrics.timer("update_publish"):
+            self.do_request(method="PUT", url=publish_url, json=items)
+        self.metrics.count("items", len(items))
+
+        LOG.debug(
+            "Added %s item(s) to exodus-gw publish %s",
+            len(items),
+            publish["id"],
+        )
+
+    def get_publish(self, publish):
+        """Fetches the current state of an exodus-gw publish.
+
+        Returns:
+            Publish: the publish as exodus-gw now reports it, or None if it
+            no longer exists.
+        """
+
+        import requests
+
+        publish_url = urljoin(self.gw_url, publish["links"]["self"])
+        try:
+            resp = self.do_request(method="GET", url=publish_url)
+        except requests.HTTPError as error:
+            if error.response.status_code == 404:
+                return None
+            raise
+        return Publish.from_response(resp)
+
+    def add_publish_items(self, publish, items, batch_size=None, workers=None):
+        """Adds any number of items to an exodus-gw publish.
+
+        Items are consumed lazily and sent in batches of up to 'batch_size'
+        items, with up to 'workers' batches in flight at once, so only a
+        bounded number of items are held in memory regardless of the total.
+
+        Args:
+            publish (Publish):
+                The publish, as returned by :meth:`new_publish`.
+            items (iterable):
+                (web_uri, object_key, content_type) tuples. content_type
+                may be None or omitted.
+            batch_size (int):
+                Maximum number of items per request.
+            workers (int):
+                Maximum number of concurrent requests.
+        Returns:
+            int: the number of items added.
+        """
+
+        batch_size = batch_size or self.batch_size
+        workers = workers or self.batch_workers
+
+        records = iter(items)
+        pending = set()
+        count = 0
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            try:
+                while True:
+                    batch = [
+                        publish_item(*record)
+                        for record in islice(records, batch_size)
+                    ]
+                    if not batch:
+                        break
+
+                    while len(pending) >= workers:
+                        done, pending = wait(
+                            pending, return_when=FIRST_COMPLETED
+                        )
+                        for future in done:
+                            future.result()
+
+                    pending.add(
+                        executor.submit(self.update_publish, publish, batch)
+                    )
+                    count += len(batch)
+
+                for future in wait(pending).done:
+                    future.result()
+            except BaseException:
+                for future in pending:
+                    future.cancel()
+                raise
+
+        LOG.info(
+            "Added %s item(s) to exodus-gw publish %s", count, publish["id"]
+        )
+        return count
+
+    def upload_url(self, key):
+        return urljoin(self.gw_url, "/upload/%s/%s" % (self.gw_env, key))
+
+    def blob_exists(self, key):
+        """Returns True if an object with the given key has already been
+        uploaded to exodus-gw."""
+
+        import requests
+
+        try:
+            self.do_request(method="HEAD", url=self.upload_url(key))
+        except requests.HTTPError as error:
+            if error.response.status_code == 404:
+                return False
+            raise
+        return True
+
+    def upload_blob(self, key, path, size):
+        """Uploads a local file to exodus-gw under the given key.
+
+        exodus-gw implements a subset of the S3 API for uploads. Small files
+        are uploaded in a single request, larger ones as a multipart upload
+        so that only one part needs to be held in memory at a time.
+        """
+
+        start = monotonic()
+        with self.metrics.timer("upload"):
+            self._upload_blob(key, path, size)
+        self.metrics.count("uploaded_bytes", size)
+
+        notify(
+            "exodus_upload", key=key, size=size, duration=monotonic() - start
+        )
+
+    def _upload_blob(self, key, path, size):
+        url = self.upload_url(key)
+
+        with open(path, "rb") as fileobj:
+            if size <= UPLOAD_CHUNK_SIZE:
+                self.do_request(method="PUT", url=url, data=fileobj.read())
+                return
+
+            resp = self.do_request(
+                method="POST", url=url, params={"uploads": ""}
+            )
+            upload_id = xml_text(resp.content, "UploadId")
+
+            try:
+                parts = []
+                chunk = fileobj.read(UPLOAD_CHUNK_SIZE)
+                while chunk:
+                    part_number = len(parts) + 1
+                    resp = self.do_request(
+                        method="PUT",
+                        url=url,
+                        params={
+                            "uploadId": upload_id,
+                            "partNumber": part_number,
+                        },
+                        data=chunk,
+                    )
+                    parts.append((part_number, resp.headers["ETag"]))
+                    chunk = fileobj.read(UPLOAD_CHUNK_SIZE)
+
+                self.do_request(
+                    method="POST",
+                    url=url,
+                    params={"uploadId": upload_id},
+                    data=complete_multipart_xml(parts),
+                )
+            except Exception:
+                LOG.warning("Aborting multipart upload of %s", path)
+                self.do_request(
+                    method="DELETE", url=url, params={"uploadId": upload_id}
+                )
+                raise
+
+
+def run_in_background(name, fn, *args):
+    """Calls a function on a daemon thread.
+
+    Returns:
+        Future: resolved with the function's result or exception.
+    """
+
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(fn(*args))
+        except Exception as error:  # pylint: disable=broad-except
+            future.set_exception(error)
+
+    # Daemon thread, so an unresponsive exodus-gw can't keep the process
+    # alive once the caller has given up on the result.
+    thread = Thread(target=run, name=name)
+    thread.daemon = True
+    thread.start()
+
+    return future
+
+
+def response_retries(response):
+    """Returns the number of times urllib3 retried a request before
+    receiving 'response'."""
+
+    retries = getattr(response.raw, "retries", None)
+    return len(retries.history) if retries is not None else 0
+
+
+def retry_after(response):
+    """Returns the delay in seconds requested by a response's Retry-After
+    header, or None."""
+
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+
+    parsed = parsedate_tz(value)
+    if parsed:
+        return max(mktime_tz(parsed) - time.time(), 0)
+    return None
+
+
+def publish_item(web_uri, object_key, content_type=None):
+    """Returns the exodus-gw representation of a publish item."""
+
+    out = {"web_uri": web_uri, "object_key": object_key}
+    if content_type:
+        out["content_type"] = content_type
+    return out
+
+
+def xml_text(content, tag):
+    """Returns text of the first element named 'tag' in an S3 XML response,
+    ignoring namespaces."""
+
+    for elem in ElementTree.fromstring(content).iter():
+        if elem.tag == tag or elem.tag.endswith("}" + tag):
+            return elem.text
+    raise RuntimeError("Missing %s in exodus-gw response" % tag)
+
+
+def complete_multipart_xml(parts):
+    root = ElementTree.Element("CompleteMultipartUpload")
+    for part_number, etag in parts:
+        part = ElementTree.SubElement(root, "Part")
+        ElementTree.SubElement(part, "PartNumber").text = str(part_number)
+        ElementTree.SubElement(part, "ETag").text = etag
+    return ElementTree.tostring(root)
@@ -3,6 +3,7 @@ from argparse import ArgumentParser, RawDescriptionHelpFormatter
 
 from pubtools.pluggy import task_context
 
+from ._hooks import pulp as pulp_hooks
 from .gateway import ExodusGatewaySession
 
 LOG = logging.getLogger("pubtools-exodus")
@@ -95,9 +96,15 @@ class ExodusTask(ExodusGatewaySession):
     def main(self):
         """Main method called by the entrypoint of the task."""
 
-        with task_context():
-            # setup the logging as required
-            self._setup_logging()
-
-            self.run()
-            return 0
+        # Args are parsed (by setting up logging) before entering the task
+        # context, which loads every installed pubtools hook, so that e.g.
+        # --help doesn't wait for them.
+        self._setup_logging()
+
+        pulp_hooks.IN_EXODUS_TASK = True
+        try:
+            with task_context():
+                self.run()
+                return 0
+        finally:
+            pulp_hooks.IN_EXODUS_TASK = False
@@ -22,7 +22,7 @@ def get_requirements():
 setup(
     name="pubtools-exodus",
     version="1.1.0",
-    packages=find_packages(exclude=["tests"]),
+    packages=find_packages(exclude=["tests", "benchmarks"]),
     include_package_data=True,
     url="https://github.com/release-engineering/pubtools-exodus",
     license="GNU General Public License",
@@ -40,6 +40,7 @@ setup(
         "Topic :: Software Development :: Libraries :: Python Modules",
     ],
     install_requires=get_requirements(),
+    extras_require={"async": ["httpx"]},
     python_requires=">=2.6",
     entry_points={
         "pubtools.hooks": [
@@ -1,10 +1,24 @@
 import os
+import sys
 
 import attr
 import pytest
 from frozenlist2 import frozenlist
 from six.moves.urllib.parse import urljoin
 
+from pubtools.exodus import _poller, _ratelimit, gateway
+
+try:
+    from typing import List
+except ImportError:  # pragma: no cover
+    # Only needed for type comments, and unavailable on Python 2.
+    pass
+
+# asyncio support is only available on Python 3.
+collect_ignore = []  # type: List[str]
+if sys.version_info < (3,):
+    collect_ignore.append("test_exodus_gateway_async.py")
+
 
 def frozenlist_or_none_converter(obj, map_fn=(lambda x: x)):
     if obj is not None:
@@ -21,6 +35,27 @@ class FakePublishOptions(object):
     )
 
 
+@pytest.fixture(autouse=True)
+def clear_identity_cache():
+    gateway.IDENTITY_CACHE.clear()
+    yield
+    gateway.IDENTITY_CACHE.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_rate_limiters():
+    _ratelimit.LIMITERS.clear()
+    yield
+    _ratelimit.LIMITERS.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_commit_pollers():
+    _poller.POLLERS.clear()
+    yield
+    _poller.POLLERS.clear()
+
+
 @pytest.fixture
 def patch_env_vars(monkeypatch, env_map=None):
     if not env_map:
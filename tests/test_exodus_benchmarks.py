@@ -0,0 +1,83 @@
+import json
+
+import requests
+
+from benchmarks import hashing, importtime, run
+from benchmarks.fakegw import FakeGateway
+
+
+def test_fake_gateway_errors():
+    with FakeGateway(error_rate=1.0) as gateway:
+        # Retryable requests fail...
+        assert requests.get(gateway.url + "/whoami").status_code == 503
+        # ...but others don't, as clients wouldn't retry them.
+        resp = requests.post(gateway.url + "/bench/publish")
+        assert resp.status_code == 200
+        assert resp.json()["env"] == "bench"
+
+    assert gateway.stats()["errors_injected"] == 1
+    assert gateway.stats()["requests"] == {
+        "GET /whoami": 1,
+        "POST /{env}/publish": 1,
+    }
+
+
+def test_benchmark_smoke(tmpdir):
+    output = str(tmpdir.join("results.json"))
+
+    result = run.main(
+        [
+            "--items=2",
+            "--files-per-item=3",
+            "--file-size=10",
+            "--workers=2",
+            "--repeat=1",
+            "--output",
+            output,
+        ]
+    )
+
+    with open(output) as f:
+        assert json.load(f) == result
+
+    by_scenario = {r["scenario"]: r for r in result["results"]}
+    assert sorted(by_scenario) == ["pulp", "push-native", "push-rsync"]
+
+    # Every file should have been added to the publish by each engine
+    for scenario in ("push-native", "push-rsync"):
+        assert by_scenario[scenario]["gateway"]["items"] == 6
+        assert by_scenario[scenario]["files_per_sec"] > 0
+
+    requests_made = by_scenario["pulp"]["gateway"]["requests"]
+    assert requests_made["POST /{env}/publish"] == 1
+    assert requests_made["POST /{env}/publish/{id}/commit"] == 1
+
+    # Comparing with itself should show no change
+    lines = run.compare(result, result)
+    assert len(lines) == 4
+    assert all(line.endswith("(+0.0%)") for line in lines[1:])
+
+
+def test_import_time():
+    # Disabled hooks and --help must not import slow modules; this guards
+    # against regressing their startup time.
+    result = importtime.main(["--repeat=1", "--check"])
+
+    assert [r["case"] for r in result["results"]] == [
+        "pulp-hooks-disabled",
+        "push-help",
+    ]
+    assert all(r["elapsed_median"] > 0 for r in result["results"])
+
+
+def test_hashing_benchmark():
+    result = hashing.main(
+        ["--files=3", "--file-size=10", "--workers=2", "--repeat=1"]
+    )
+
+    assert [r["method"] for r in result["results"]] == [
+        "serial",
+        "threads",
+        "processes",
+    ]
+    assert all(r["files_per_sec"] > 0 for r in result["results"])
@@ -0,0 +1,224 @@
+import asyncio
+import logging
+
+import httpx
+import mock
+import pytest
+
+from pubtools.exodus.aio import AsyncExodusGatewaySession
+
+PUBLISH_ID = "497f6eca-6276-4993-bfeb-53cbbbba6f08"
+
+
+class FakeGateway(object):
+    """Minimal exodus-gw stand-in served through an httpx.MockTransport."""
+
+    def __init__(self):
+        self.requests = []
+        self.publishes = 0
+        self.polls = {}
+        self.errors = []
+        self.handle_error = httpx.Response
+
+    def handle(self, request):
+        self.requests.append(request)
+        path = request.url.path
+
+        if self.errors:
+            return self.handle_error(self.errors.pop(0))
+
+        if path == "/whoami":
+            return httpx.Response(
+                200,
+                json={
+                    "client": {
+                        "roles": ["pusher"],
+                        "authenticated": True,
+                        "serviceAccountId": "testapp",
+                    },
+                    "user": {
+                        "roles": [],
+                        "authenticated": False,
+                        "internalUsername": None,
+                    },
+                },
+            )
+
+        if path == "/test/publish":
+            self.publishes += 1
+            publish_id = "%s-%s" % (PUBLISH_ID, self.publishes)
+            return httpx.Response(
+                200,
+                json={
+                    "id": publish_id,
+                    "env": "test",
+                    "links": {
+                        "self": "/test/publish/%s" % publish_id,
+                        "commit": "/test/publish/%s/commit" % publish_id,
+                    },
+                    "items": [],
+                },
+            )
+
+        if path.endswith("/commit"):
+            publish_id = path.split("/")[3]
+            return httpx.Response(
+                200,
+                json={
+                    "id": "task-%s" % publish_id,
+                    "publish_id": publish_id,
+                    "state": "NOT_STARTED",
+                    "links": {"self": "/task/task-%s" % publish_id},
+                },
+            )
+
+        if path.startswith("/task/"):
+            task_id = path.split("/")[2]
+            self.polls[task_id] = self.polls.get(task_id, 0) + 1
+            state = "COMPLETE" if self.polls[task_id] > 1 else "IN_PROGRESS"
+            if "fail" in task_id:
+                state = "FAILED"
+            return httpx.Response(
+                200, json={"id": task_id, "state": state, "links": {}}
+            )
+
+        return httpx.Response(404, json={"detail": "Not Found"})
+
+
+@pytest.fixture
+def fake_gw():
+    return FakeGateway()
+
+
+@pytest.fixture
+def session(patch_env_vars, fake_gw, monkeypatch):
+    monkeypatch.setenv("EXODUS_GW_WAIT", "0.01")
+    monkeypatch.setenv("EXODUS_GW_WAIT_MIN", "0.01")
+    return AsyncExodusGatewaySession(
+        transport=httpx.MockTransport(fake_gw.handle)
+    )
+
+
+def test_async_publish_and_commit(session, fake_gw, caplog):
+    caplog.set_level(logging.DEBUG, "pubtools-exodus")
+
+    async def run():
+        async with session:
+            publish = await session.new_publish()
+            await session.commit_publish(publish)
+            return publish
+
+    publish = asyncio.run(run())
+
+    assert publish["id"] == "%s-1" % PUBLISH_ID
+    assert (
+        "Authenticated with exodus-gw at https://exodus-gw.test.redhat.com "
+        "as client testapp (roles: ['pusher'])" in caplog.text
+    )
+    assert "Committed exodus-gw publish %s" % publish["id"] in caplog.text
+    assert session.client is None
+
+
+def test_async_concurrent_publishes(session, fake_gw):
+    async def one():
+        publish = await session.new_publish()
+        await session.commit_publish(publish)
+        return publish["id"]
+
+    async def run():
+        async with session:
+            return await asyncio.gather(*[one() for _ in range(20)])
+
+    ids = asyncio.run(run())
+
+    assert len(set(ids)) == 20
+    commits = [r for r in fake_gw.requests if r.url.path.endswith("/commit")]
+    assert len(commits) == 20
+
+
+def test_async_commit_failed(session, fake_gw):
+    publish = {
+        "id": "fail",
+        "links": {"commit": "/test/publish/fail/commit"},
+    }
+
+    async def run():
+        async with session:
+            session._populate_exodus_gw_vars()
+            await session.commit_publish(publish)
+
+    with pytest.raises(RuntimeError) as exc_info:
+        asyncio.run(run())
+
+    assert str(exc_info.value) == (
+        "exodus-gw commit task-fail to https://exodus-gw.test.redhat.com failed"
+    )
+
+
+@mock.patch("pubtools.exodus.aio.asyncio.sleep", new_callable=mock.AsyncMock)
+def test_async_retries(mock_sleep, session, fake_gw):
+    fake_gw.errors = [503, 429]
+
+    async def run():
+        async with session:
+            return await session.new_publish()
+
+    assert asyncio.run(run())["id"] == "%s-1" % PUBLISH_ID
+    assert [call.args[0] for call in mock_sleep.mock_calls] == [0, 2]
+
+
+@pytest.mark.parametrize(
+    "status,retried", [(502, False), (503, False), (429, True)]
+)
+@mock.patch("pubtools.exodus.aio.asyncio.sleep", new_callable=mock.AsyncMock)
+def test_async_post_retries(mock_sleep, session, fake_gw, status, retried):
+    fake_gw.errors = [status]
+    url = "https://exodus-gw.test.redhat.com/test/publish"
+
+    async def run():
+        async with session:
+            return await session.do_request("POST", url)
+
+    # A publish may have been created despite a server error, so POST is
+    # only retried if exodus-gw throttled it.
+    if retried:
+        assert asyncio.run(run()).status_code == 200
+    else:
+        with pytest.raises(httpx.HTTPStatusError):
+            asyncio.run(run())
+
+    assert len(fake_gw.requests) == (2 if retried else 1)
+
+
+@mock.patch("pubtools.exodus.aio.asyncio.sleep", new_callable=mock.AsyncMock)
+def test_async_post_retry_after(mock_sleep, session, fake_gw):
+    fake_gw.errors = [503]
+    fake_gw.handle_error = lambda status: httpx.Response(
+        status, headers={"Retry-After": "3"}
+    )
+    url = "https://exodus-gw.test.redhat.com/test/publish"
+
+    async def run():
+        async with session:
+            return await session.do_request("POST", url)
+
+    assert asyncio.run(run()).status_code == 200
+    assert [call.args[0] for call in mock_sleep.mock_calls] == [3]
+
+
+def test_async_error_response(session, fake_gw):
+    session.retries = 0
+    fake_gw.errors = [500]
+
+    async def run():
+        async with session:
+            return await session.new_publish()
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(run())
+
+
+def test_async_disabled(monkeypatch):
+    monkeypatch.setenv("EXODUS_ENABLED", "false")
+
+    assert asyncio.run(AsyncExodusGatewaySession().new_publish()) is None
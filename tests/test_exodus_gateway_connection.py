@@ -1,12 +1,25 @@
 import logging
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import mock
 import pytest
 from requests.exceptions import HTTPError
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler
 from six.moves.urllib.parse import urljoin
 
-from pubtools.exodus.gateway import ExodusGatewaySession
+from pubtools.exodus.gateway import ExodusGatewaySession, retry_after
+
+try:
+    from http.server import ThreadingHTTPServer
+except ImportError:  # pragma: no cover
+    # Python 2
+    from BaseHTTPServer import HTTPServer
+    from SocketServer import ThreadingMixIn
+
+    class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):  # type: ignore
+        pass
 
 
 @pytest.mark.parametrize(
@@ -260,3 +273,243 @@ def test_exodus_pulp_no_auth(requests_mock, caplog, patch_env_vars):
         str(exc_info.value)
         == "404 Client Error: None for url: https://exodus-gw.test.redhat.com/test/publish"
     )
+
+
+def test_add_publish_items_batches(successful_gw_task, requests_mock):
+    publish_url = os.path.join(
+        os.getenv("EXODUS_GW_URL"),
+        successful_gw_task["publish"]["response"]["links"]["self"],
+    )
+    requests_mock.put(publish_url, status_code=200)
+
+    gw_conn = ExodusGatewaySession()
+    publish = gw_conn.new_publish()
+
+    items = (
+        ("/content/file-%s" % i, "key-%s" % i, "text/plain" if i else None)
+        for i in range(5)
+    )
+    assert (
+        gw_conn.add_publish_items(publish, items, batch_size=2, workers=2) == 5
+    )
+
+    batches = [
+        req.json()
+        for req in requests_mock.request_history
+        if req.method == "PUT"
+    ]
+    assert len(batches) == 3
+    assert sorted(len(batch) for batch in batches) == [1, 2, 2]
+
+    added = sorted(
+        (item for batch in batches for item in batch),
+        key=lambda item: item["web_uri"],
+    )
+    assert added[0] == {"web_uri": "/content/file-0", "object_key": "key-0"}
+    assert added[4] == {
+        "web_uri": "/content/file-4",
+        "object_key": "key-4",
+        "content_type": "text/plain",
+    }
+
+
+def test_add_publish_items_error(successful_gw_task, requests_mock):
+    publish_url = os.path.join(
+        os.getenv("EXODUS_GW_URL"),
+        successful_gw_task["publish"]["response"]["links"]["self"],
+    )
+    requests_mock.put(
+        publish_url, json={"detail": "Invalid item"}, status_code=400
+    )
+
+    gw_conn = ExodusGatewaySession()
+    publish = gw_conn.new_publish()
+
+    consumed = []
+
+    def items():
+        for i in range(100):
+            consumed.append(i)
+            yield ("/content/file-%s" % i, "key-%s" % i)
+
+    with pytest.raises(HTTPError):
+        gw_conn.add_publish_items(publish, items(), batch_size=1, workers=1)
+
+    # Items should've stopped being consumed soon after the failure.
+    assert len(consumed) < 100
+
+
+@mock.patch("pubtools.exodus.gateway.time.sleep")
+def test_poll_commit_adaptive(mock_sleep, successful_gw_task, requests_mock):
+    task = dict(successful_gw_task["task"]["response"])
+    in_progress = dict(task, state="IN_PROGRESS")
+    requests_mock.get(
+        successful_gw_task["task"]["url"],
+        [
+            {"json": in_progress, "headers": {"ETag": '"v1"'}},
+            {"status_code": 304, "headers": {"ETag": '"v1"'}},
+            {"status_code": 304, "headers": {"Retry-After": "3"}},
+            {"json": in_progress, "headers": {"ETag": '"v2"'}},
+            {"json": task},
+        ],
+    )
+
+    gw_conn = ExodusGatewaySession()
+    gw_conn.commit_publish(gw_conn.new_publish())
+
+    gets = [
+        req
+        for req in requests_mock.request_history
+        if req.method == "GET" and "/task/" in req.url
+    ]
+    assert [req.headers.get("If-None-Match") for req in gets] == [
+        None,
+        '"v1"',
+        '"v1"',
+        '"v1"',
+        '"v2"',
+    ]
+
+    delays = [call.args[0] for call in mock_sleep.mock_calls]
+    assert len(delays) == 4
+    # Polling should start quickly and back off, except when told by
+    # exodus-gw how long to wait.
+    assert 0.125 <= delays[0] <= 0.25
+    assert 0.25 <= delays[1] <= 0.5
+    assert delays[2] == 3
+    assert 1 <= delays[3] <= 2
+
+
+def test_retry_after_date():
+    response = mock.Mock(
+        headers={"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}
+    )
+    assert retry_after(response) == 0
+
+    response.headers = {"Retry-After": "invalid"}
+    assert retry_after(response) is None
+
+
+class WhoamiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        body = b'{"detail": "ok"}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_):  # pylint: disable=arguments-differ
+        pass
+
+
+@pytest.fixture
+def local_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), WhoamiHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield "http://127.0.0.1:%s" % server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+def test_connection_pool_shared(local_server, monkeypatch):
+    monkeypatch.setenv("EXODUS_GW_POOL_MAXSIZE", "4")
+    monkeypatch.setenv("EXODUS_GW_POOL_BLOCK", "true")
+
+    gw_conn = ExodusGatewaySession()
+    gw_conn.gw_url = local_server
+    assert gw_conn.pool_maxsize == 4
+    assert gw_conn.pool_block
+
+    def get(_):
+        return gw_conn.do_request(
+            method="GET", url=local_server + "/whoami"
+        ).json()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(get, range(40)))
+
+    assert results == [{"detail": "ok"}] * 40
+
+    # All threads should've used a single pool, with connections reused
+    # rather than opened per request.
+    stats = gw_conn.pool_stats
+    assert stats.checkouts == 40
+    assert 1 <= stats.new_connections <= 4
+    assert "40 checkout(s)" in str(stats)
+
+
+def test_check_cert_cached(successful_gw_task, requests_mock, monkeypatch):
+    auth_url = successful_gw_task["auth"]["url"]
+
+    ExodusGatewaySession().new_publish()
+    ExodusGatewaySession().new_publish()
+
+    # Identity should be checked once per process, not per session.
+    whoamis = [r for r in requests_mock.request_history if r.url == auth_url]
+    assert len(whoamis) == 1
+
+    # A different certificate is a different identity.
+    monkeypatch.setenv("EXODUS_GW_CERT", "/path/other.crt")
+    ExodusGatewaySession().new_publish()
+
+    whoamis = [r for r in requests_mock.request_history if r.url == auth_url]
+    assert len(whoamis) == 2
+
+
+@mock.patch("pubtools.exodus.gateway.monotonic")
+def test_check_cert_cache_expiry(
+    mock_monotonic, successful_gw_task, requests_mock, tmpdir, monkeypatch
+):
+    mock_monotonic.return_value = 1000
+    auth_url = successful_gw_task["auth"]["url"]
+    cert = tmpdir.join("test.crt")
+    cert.write("cert 1")
+    monkeypatch.setenv("EXODUS_GW_CERT", str(cert))
+    monkeypatch.setenv("EXODUS_GW_WHOAMI_TTL", "60")
+
+    def count():
+        return len(
+            [r for r in requests_mock.request_history if r.url == auth_url]
+        )
+
+    ExodusGatewaySession().new_publish()
+    mock_monotonic.return_value = 1059
+    ExodusGatewaySession().new_publish()
+    assert count() == 1
+
+    # Cache is keyed by certificate content, not just its path.
+    cert.write("cert 2")
+    ExodusGatewaySession().new_publish()
+    assert count() == 2
+
+    mock_monotonic.return_value = 1200
+    ExodusGatewaySession().new_publish()
+    assert count() == 3
+
+
+def test_check_cert_background(
+    successful_gw_task, requests_mock, monkeypatch, caplog
+):
+    monkeypatch.setenv("EXODUS_GW_WHOAMI_BACKGROUND", "true")
+    caplog.set_level(logging.DEBUG, "pubtools-exodus")
+    requests_mock.post(
+        successful_gw_task["publish"]["url"],
+        json={"detail": "Forbidden"},
+        status_code=403,
+    )
+
+    with pytest.raises(HTTPError):
+        ExodusGatewaySession().new_publish()
+
+    # Although identity was checked concurrently, it should have been
+    # logged before the error was raised.
+    assert (
+        "Authenticated with exodus-gw at https://exodus-gw.test.redhat.com "
+        "as user tester" in caplog.text
+    )
@@ -0,0 +1,91 @@
+import json
+import os
+
+import pytest
+
+from pubtools.exodus._handles import CommitTask, Publish, json_fields
+from pubtools.exodus.gateway import ExodusGatewaySession
+
+PUBLISH_ID = "497f6eca-6276-4993-bfeb-53cbbbba6f08"
+
+
+def test_json_fields_skips_others():
+    text = json.dumps(
+        {
+            "items": [
+                {"web_uri": '/a/"quoted"/{braces}]', "object_key": "abc"},
+                [[], {}, "\\"],
+            ],
+            "id": "abc",
+            "count": 3,
+            "links": {"self": "/publish/abc"},
+        }
+    )
+
+    assert json_fields(text, ("id", "links", "state")) == {
+        "id": "abc",
+        "links": {"self": "/publish/abc"},
+    }
+
+
+def test_json_fields_stops_when_found():
+    # Nothing after the wanted fields is looked at, even if invalid.
+    text = '{"id": "abc", "links": {}, "items": [!'
+
+    assert json_fields(text, ("id", "links")) == {"id": "abc", "links": {}}
+
+
+@pytest.mark.parametrize(
+    "text",
+    ["", "[]", '{"id" "abc"}', '{"id": "abc" "x": 1}', '{"items": [1, 2'],
+)
+def test_json_fields_invalid(text):
+    with pytest.raises(ValueError):
+        json_fields(text, ("id", "links"))
+
+
+def test_handle_dict_access():
+    publish = Publish(id="abc", links={"self": "/publish/abc"})
+
+    assert publish["id"] == "abc"
+    assert publish["links"]["self"] == "/publish/abc"
+    assert publish.get("state") is None
+    assert publish.get("state", "PENDING") == "PENDING"
+    assert publish.get("items", []) == []
+    with pytest.raises(KeyError):
+        publish["items"]
+
+    # Only the named fields are kept.
+    with pytest.raises(AttributeError):
+        publish.items = []
+
+    assert publish == Publish.from_json(
+        {"id": "abc", "links": {"self": "/publish/abc"}, "items": [{}]}
+    )
+    assert publish != CommitTask(id="abc", links=publish.links)
+    assert "id='abc'" in repr(publish)
+
+
+def test_new_publish_drops_items(successful_gw_task, requests_mock):
+    url = successful_gw_task["publish"]["url"]
+    items = [
+        {"web_uri": "/content/%s" % i, "object_key": "%064x" % i}
+        for i in range(1000)
+    ]
+    body = dict(successful_gw_task["publish"]["response"], items=items)
+    requests_mock.post(url, json=body)
+
+    session = ExodusGatewaySession()
+    publish = session.new_publish()
+
+    assert isinstance(publish, Publish)
+    assert publish.id == PUBLISH_ID
+    assert publish.env == "test"
+    assert publish.links["commit"] == os.path.join(
+        "/test/publish", PUBLISH_ID, "commit"
+    )
+
+    commit = session.start_commit(publish)
+    assert isinstance(commit, CommitTask)
+    assert commit.publish_id == PUBLISH_ID
+    assert commit.state == "COMPLETE"
@@ -0,0 +1,141 @@
+import os
+import re
+import sqlite3
+
+import mock
+
+from pubtools.exodus._tasks.hashcache import HashCache
+from pubtools.exodus._tasks.push import entry_point
+
+from .test_exodus_push_native import TEST_DATA, sha256
+
+
+def test_hash_cache_get_put(tmpdir):
+    path = tmpdir.join("file")
+    path.write("some content")
+    db = str(tmpdir.join("cache", "hashes.db"))
+
+    with HashCache(db) as cache:
+        assert cache.get(os.stat(str(path))) is None
+        cache.put(os.stat(str(path)), "abc123")
+        assert cache.get(os.stat(str(path))) == "abc123"
+
+    # Cache should persist between instances.
+    with HashCache(db) as cache:
+        assert cache.get(os.stat(str(path))) == "abc123"
+
+        # Modifying the file should result in a miss.
+        path.write("other content!")
+        assert cache.get(os.stat(str(path))) is None
+
+        assert cache.hits == 1
+        assert cache.misses == 1
+
+
+def test_hash_cache_evict(tmpdir):
+    db = str(tmpdir.join("hashes.db"))
+    files = []
+    for i in range(5):
+        path = tmpdir.join("file-%s" % i)
+        path.write(str(i))
+        files.append(os.stat(str(path)))
+
+    with HashCache(db, max_entries=3) as cache:
+        for i, st in enumerate(files):
+            cache.put(st, "digest-%s" % i)
+        # Use the oldest entry so that it's not evicted.
+        assert cache.get(files[0]) == "digest-0"
+
+    with HashCache(db, max_entries=3) as cache:
+        assert [cache.get(st) for st in files] == [
+            "digest-0",
+            None,
+            None,
+            "digest-3",
+            "digest-4",
+        ]
+
+
+def test_hash_cache_shared(tmpdir):
+    db = str(tmpdir.join("hashes.db"))
+    files = []
+    for i in range(2):
+        path = tmpdir.join("file-%s" % i)
+        path.write(str(i))
+        files.append(os.stat(str(path)))
+
+    # Caches used by concurrent pushes don't lock each other out.
+    first = HashCache(db)
+    second = HashCache(db)
+    first.put(files[0], "digest-0")
+    assert first.get(files[0]) == "digest-0"
+    second.put(files[1], "digest-1")
+    second.close()
+    assert first.get(files[1]) == "digest-1"
+    first.close()
+
+    with HashCache(db) as cache:
+        assert [cache.get(st) for st in files] == ["digest-0", "digest-1"]
+
+
+@mock.patch("pubtools.exodus._tasks.hashcache.BUSY_TIMEOUT", 0.1)
+def test_hash_cache_locked(tmpdir, caplog):
+    db = str(tmpdir.join("hashes.db"))
+    path = tmpdir.join("file")
+    path.write("some content")
+    st = os.stat(str(path))
+
+    with HashCache(db) as cache:
+        cache.put(st, "abc123")
+
+    cache = HashCache(db)
+
+    # Another process holds the cache locked...
+    other = sqlite3.connect(db, isolation_level=None)
+    other.execute("BEGIN EXCLUSIVE")
+
+    # ...so lookups miss and writes are skipped, without failing.
+    assert cache.get(st) is None
+    cache.put(st, "def456")
+    cache.close()
+    other.execute("ROLLBACK")
+    other.close()
+
+    assert "Could not read hash cache" in caplog.text
+    assert "Skipped 1 write(s) to hash cache" in caplog.text
+
+    with HashCache(db) as cache:
+        assert cache.get(st) == "abc123"
+
+
+@mock.patch(
+    "pubtools.exodus._tasks.native.sha256_file",
+    side_effect=lambda path: sha256(path),
+)
+def test_exodus_push_native_hash_cache(
+    mock_sha256, successful_gw_task, requests_mock, tmpdir
+):
+    requests_mock.head(re.compile("/upload/test/"), status_code=200)
+    requests_mock.put("/test/publish/497f6eca-6276-4993-bfeb-53cbbbba6f08")
+
+    args = [
+        "--engine",
+        "native",
+        "--hash-cache",
+        str(tmpdir.join("hashes.db")),
+        "staged:%s" % os.path.join(TEST_DATA, "source-2"),
+    ]
+
+    entry_point(args)
+    assert mock_sha256.call_count == 2
+
+    # Second push should take all digests from the cache.
+    entry_point(args)
+    assert mock_sha256.call_count == 2
+
+    published = [
+        req.json()
+        for req in requests_mock.request_history
+        if req.method == "PUT"
+    ]
+    assert published[0] == published[1]
@@ -0,0 +1,81 @@
+import hashlib
+import os
+
+import mock
+
+from pubtools.exodus._metrics import Metrics
+from pubtools.exodus._tasks import native
+from pubtools.exodus._tasks.hashcache import HashCache
+from pubtools.exodus._tasks.hasher import ProcessHasher
+from pubtools.exodus._tasks.native import sha256_file
+
+
+def sha256(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def test_sha256_file_mmap(tmpdir):
+    content = os.urandom(100000)
+    path = str(tmpdir.join("large"))
+    with open(path, "wb") as f:
+        f.write(content)
+
+    # Large files are hashed through a memory map, small ones by reading.
+    with mock.patch.object(native, "MMAP_THRESHOLD", 1000):
+        assert sha256_file(path) == sha256(content)
+    assert sha256_file(path) == sha256(content)
+
+
+def test_process_hasher(tmpdir):
+    files = {}
+    for i in range(10):
+        content = ("file %s" % i).encode("utf-8") * (i + 1)
+        path = tmpdir.join("f%s" % i)
+        path.write_binary(content)
+        files[str(path)] = sha256(content)
+
+    metrics = Metrics()
+    cache = HashCache(str(tmpdir.join("cache.db")))
+    entries = [(path, "extra") for path in sorted(files)]
+
+    with ProcessHasher(2, hash_cache=cache, metrics=metrics) as hasher:
+        # Batch small files several at a time.
+        hasher.batch_files = 3
+        results = list(hasher.hash_files(entries))
+
+        assert [entry for entry, _, _ in results] == entries
+        assert {entry[0]: key for entry, _, key in results} == files
+        assert metrics.phases["hash"][0] == 4
+        assert metrics.counters["hashed_bytes"] == sum(
+            st.st_size for _, st, _ in results
+        )
+
+        # A second pass finds every digest in the cache.
+        again = list(hasher.hash_files(entries))
+        assert sorted(key for _, _, key in again) == sorted(files.values())
+        assert metrics.phases["hash"][0] == 4
+
+    cache.close()
+
+
+def test_process_hasher_large_files(tmpdir):
+    entries = []
+    for i, size in enumerate([10, 10, 5000, 10, 5000, 5000, 10]):
+        path = tmpdir.join("f%s" % i)
+        path.write_binary(b"x" * size)
+        entries.append((str(path),))
+
+    with ProcessHasher(2) as hasher:
+        hasher.alone_bytes = 1000
+        with mock.patch.object(
+            hasher, "submit", wraps=hasher.submit
+        ) as submit:
+            results = list(hasher.hash_files(entries))
+
+    assert [entry for entry, _, _ in results] == entries
+    # Large files are sent alone, after any small files batched before
+    # them; small files are batched around them.
+    assert [
+        [os.path.basename(entry[0]) for entry, _ in call[0][0]]
+        for call in submit.call_args_list
+    ] == [["f0", "f1"], ["f2"], ["f3"], ["f4"], ["f5"], ["f6"]]
@@ -0,0 +1,133 @@
+import io
+import logging
+import os
+
+import mock
+import pytest
+from pubtools.pluggy import hookimpl, pm
+from six import u
+
+from pubtools.exodus._hooks.specs import hook_active
+from pubtools.exodus._tasks.push import ExodusPushTask
+from pubtools.exodus.gateway import ExodusGatewaySession
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data", "exodus_push")
+
+# pylint: disable=unused-argument
+
+
+class Recorder(object):
+    def __init__(self):
+        self.events = []
+
+    @hookimpl
+    def exodus_gw_request(self, method, url, status_code, duration, sizes):
+        self.events.append(("request", method, url, status_code, sizes))
+
+    @hookimpl
+    def exodus_publish_created(self, publish, duration):
+        self.events.append(("created", publish["id"]))
+
+    @hookimpl
+    def exodus_publish_committed(self, publish_id, commit_id, state):
+        self.events.append(("committed", publish_id, commit_id, state))
+
+    @hookimpl
+    def exodus_push_item_start(self, item):
+        self.events.append(
+            ("start", os.path.basename(os.path.dirname(item.src)))
+        )
+
+    @hookimpl
+    def exodus_push_item_finish(self, item, duration, exit_code):
+        self.events.append(
+            ("finish", os.path.basename(os.path.dirname(item.src)), exit_code)
+        )
+
+
+@pytest.fixture
+def recorder():
+    plugin = Recorder()
+    pm.register(plugin)
+    yield plugin
+    pm.unregister(plugin)
+
+
+def test_no_handlers():
+    assert not hook_active("exodus_gw_request")
+
+
+@mock.patch("pubtools.exodus._tasks.push.subprocess.Popen")
+def test_push_events(mock_popen, successful_gw_task, recorder):
+    mock_popen.return_value.stdout = io.StringIO(u("output\n"))
+    mock_popen.return_value.wait.return_value = 0
+
+    src = os.path.join(TEST_DATA, "source-1")
+    ExodusPushTask(args=["staged:%s" % src]).run()
+
+    publish_id = "497f6eca-6276-4993-bfeb-53cbbbba6f08"
+    commit_id = "9187ec3d-ba51-4a3b-9298-e534b0869350"
+    url = "https://exodus-gw.test.redhat.com"
+
+    requests_events = [e for e in recorder.events if e[0] == "request"]
+    assert [e[1:4] for e in requests_events] == [
+        ("GET", url + "/whoami", 200),
+        ("POST", url + "/test/publish", 200),
+        ("POST", url + "/test/publish/%s/commit" % publish_id, 200),
+        ("GET", url + "/task/%s" % commit_id, 200),
+    ]
+    # Request bodies here are JSON or empty, so have no known size
+    assert requests_events[0][4][0] is None
+    assert requests_events[0][4][1] > 0
+
+    others = [e for e in recorder.events if e[0] != "request"]
+    assert others[0] == ("created", publish_id)
+    assert others[-1] == ("committed", publish_id, commit_id, "COMPLETE")
+
+    # Items may be pushed in any order, but one at a time by default.
+    items = others[1:-1]
+    assert [e[0] for e in items] == ["start", "finish"] * 2
+    assert [e[1] for e in items[::2]] == [e[1] for e in items[1::2]]
+    assert sorted(items) == [
+        ("finish", "kickstart-repo-s390x", 0),
+        ("finish", "kickstart-repo-x86_64", 0),
+        ("start", "kickstart-repo-s390x"),
+        ("start", "kickstart-repo-x86_64"),
+    ]
+
+
+def test_commit_failed_event(successful_gw_task, requests_mock, recorder):
+    task = successful_gw_task["task"]
+    requests_mock.get(task["url"], json=dict(task["response"], state="FAILED"))
+
+    gw = ExodusGatewaySession()
+    gw.gw_url = "https://exodus-gw.test.redhat.com"
+    with pytest.raises(RuntimeError):
+        gw.poll_commit_completion(task["response"])
+
+    assert recorder.events[-1] == (
+        "committed",
+        "497f6eca-6276-4993-bfeb-53cbbbba6f08",
+        "9187ec3d-ba51-4a3b-9298-e534b0869350",
+        "FAILED",
+    )
+
+
+def test_handler_error(successful_gw_task, caplog):
+    class Broken(object):
+        @hookimpl
+        def exodus_gw_request(self):
+            raise ValueError("oops")
+
+    plugin = Broken()
+    pm.register(plugin)
+    try:
+        gw = ExodusGatewaySession()
+        gw._populate_exodus_gw_vars()
+        gw.check_cert()
+    finally:
+        pm.unregister(plugin)
+
+    # Request should still have succeeded, with the error logged
+    assert "Error in exodus_gw_request hook" in caplog.text
+    assert "ValueError: oops" in caplog.text
@@ -0,0 +1,135 @@
+import io
+import json
+import logging
+import os
+
+import mock
+from pubtools.pluggy import pm, task_context
+from six import u
+
+from pubtools.exodus._metrics import Metrics, prometheus_text, write_atomic
+from pubtools.exodus._tasks.push import ExodusPushTask
+
+from .conftest import FakePublishOptions
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data", "exodus_push")
+
+
+def test_metrics_report():
+    metrics = Metrics()
+
+    with metrics.timer("phase"):
+        metrics.count("items", 3)
+    metrics.record("phase", 1.5)
+    metrics.count("items")
+
+    report = metrics.report()
+    assert report["phases"]["phase"]["count"] == 2
+    assert report["phases"]["phase"]["seconds"] >= 1.5
+    assert report["counters"] == {"items": 4}
+    assert "phase 1.5" in str(metrics)
+    assert str(metrics).endswith("items 4")
+
+
+def test_metrics_prometheus():
+    report = {
+        "elapsed": 2.0,
+        "phases": {"rsync": {"count": 3, "seconds": 1.25}},
+        "counters": {"uploaded_bytes": 100},
+    }
+
+    text = prometheus_text(report, "push")
+
+    assert 'pubtools_exodus_elapsed_seconds{job="push"} 2.0\n' in text
+    assert (
+        'pubtools_exodus_phase_seconds{job="push",phase="rsync"} 1.25\n'
+        in text
+    )
+    assert 'pubtools_exodus_phase_count{job="push",phase="rsync"} 3\n' in text
+    assert "# TYPE pubtools_exodus_uploaded_bytes gauge\n" in text
+    assert 'pubtools_exodus_uploaded_bytes{job="push"} 100\n' in text
+
+
+@mock.patch("pubtools.exodus._tasks.push.subprocess.Popen")
+def test_push_metrics(
+    mock_popen, successful_gw_task, monkeypatch, tmpdir, caplog
+):
+    caplog.set_level(logging.INFO, "pubtools-exodus")
+
+    json_path = str(tmpdir.join("metrics.json"))
+    prom_path = str(tmpdir.join("metrics.prom"))
+    monkeypatch.setenv("EXODUS_METRICS_FILE", json_path)
+    monkeypatch.setenv("EXODUS_METRICS_PROM", prom_path)
+
+    mock_popen.return_value.stdout = io.StringIO(u("output\n"))
+    mock_popen.return_value.wait.return_value = 0
+
+    src = os.path.join(TEST_DATA, "source-1")
+    ExodusPushTask(args=["staged:%s" % src]).run()
+
+    with open(json_path) as f:
+        report = json.load(f)
+
+    assert report["job"] == "push"
+    assert sorted(report["phases"]) == [
+        "create_publish",
+        "poll_commit",
+        "push_rsync",
+        "rsync",
+        "start_commit",
+        "whoami",
+    ]
+    assert report["phases"]["rsync"]["count"] == 2
+    assert report["counters"]["transfers"] == 2
+    assert report["counters"]["rsync_processes"] == 2
+    # whoami, publish, commit, poll
+    assert report["counters"]["requests"] == 4
+    assert "checkouts" in report["pool"]
+
+    with open(prom_path) as f:
+        assert 'pubtools_exodus_rsync_processes{job="push"} 2' in f.read()
+
+    assert "exodus metrics: " in caplog.text
+
+
+def test_push_metrics_write_failure(successful_gw_task, monkeypatch, caplog):
+    monkeypatch.setenv("EXODUS_METRICS_FILE", "/nonexistent/metrics.json")
+
+    task = ExodusPushTask(args=["staged:/some/path"])
+    task.report_metrics("push")
+
+    assert "Could not write exodus metrics" in caplog.text
+
+
+def test_write_atomic_mode(tmpdir):
+    path = str(tmpdir.join("metrics.prom"))
+
+    old_umask = os.umask(0o027)
+    try:
+        write_atomic(path, "exodus_push_items 1\n")
+    finally:
+        os.umask(old_umask)
+
+    # Written with the permissions of any new file, not mkstemp's 0600.
+    assert os.stat(path).st_mode & 0o777 == 0o640
+    assert os.listdir(str(tmpdir)) == ["metrics.prom"]
+
+
+def test_pulp_metrics(successful_gw_task, monkeypatch, tmpdir):
+    json_path = str(tmpdir.join("metrics.json"))
+    monkeypatch.setenv("EXODUS_METRICS_FILE", json_path)
+
+    with task_context():
+        for _ in range(3):
+            pm.hook.pulp_repository_pre_publish(
+                repository=None, options=FakePublishOptions()
+            )
+        pm.hook.task_pulp_flush()
+
+    with open(json_path) as f:
+        report = json.load(f)
+
+    assert report["job"] == "pulp"
+    assert report["counters"]["repositories"] == 3
+    assert report["phases"]["create_publish"]["count"] == 1
+    assert report["phases"]["poll_commit"]["count"] == 1
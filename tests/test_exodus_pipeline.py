@@ -0,0 +1,103 @@
+import threading
+import time
+
+import pytest
+
+from pubtools.exodus._tasks.pipeline import broadcast, threaded_map
+
+
+def test_threaded_map_chained():
+    squared = threaded_map(lambda x: x * x, range(100), workers=4, maxsize=5)
+    plus_one = threaded_map(lambda x: x + 1, squared, workers=2, maxsize=5)
+
+    assert sorted(plus_one) == [x * x + 1 for x in range(100)]
+
+
+def test_threaded_map_backpressure():
+    consumed = []
+
+    def source():
+        for i in range(1000):
+            consumed.append(i)
+            yield i
+
+    results = threaded_map(lambda x: x, source(), workers=1, maxsize=2)
+    assert next(results) == 0
+
+    # Consumer is not reading, so the source should've stopped being
+    # iterated once the queues were full.
+    time.sleep(0.3)
+    assert len(consumed) < 10
+
+    results.close()
+
+
+def test_threaded_map_error():
+    def fn(x):
+        if x == 5:
+            raise ValueError("bad item %s" % x)
+        return x
+
+    with pytest.raises(ValueError) as exc_info:
+        list(threaded_map(fn, range(1000), workers=3, maxsize=2))
+
+    assert str(exc_info.value) == "bad item 5"
+
+
+def test_threaded_map_source_error():
+    def source():
+        yield 1
+        raise IOError("can't enumerate")
+
+    hashed = threaded_map(lambda x: x, source())
+    uploaded = threaded_map(lambda x: x, hashed)
+
+    with pytest.raises(IOError) as exc_info:
+        list(uploaded)
+
+    assert str(exc_info.value) == "can't enumerate"
+
+
+def test_threaded_map_stops_upstream():
+    stopped = threading.Event()
+
+    def source():
+        try:
+            for i in range(1000):
+                yield i
+        finally:
+            stopped.set()
+
+    first = threaded_map(lambda x: x, source(), maxsize=1)
+    second = threaded_map(lambda x: x, first, maxsize=1)
+
+    assert next(second) == 0
+    second.close()
+
+    # Closing the last stage should've stopped every earlier stage.
+    assert stopped.wait(5)
+
+
+def test_broadcast():
+    received = [[], []]
+
+    errors = broadcast(range(100), [received[0].extend, received[1].extend])
+
+    assert errors == [None, None]
+    assert received == [list(range(100)), list(range(100))]
+
+
+def test_broadcast_consumer_error():
+    received = []
+
+    def failing(items):
+        for item in items:
+            if item == 5:
+                raise ValueError("bad item 5")
+
+    errors = broadcast(range(100), [failing, received.extend], maxsize=2)
+
+    # The failing consumer doesn't stop the other.
+    assert errors[0][0] is ValueError
+    assert errors[1] is None
+    assert received == list(range(100))
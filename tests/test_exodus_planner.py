@@ -0,0 +1,231 @@
+import logging
+import os
+import shutil
+
+import mock
+import pytest
+from pushsource import PushItem
+
+from pubtools.exodus._tasks import planner
+from pubtools.exodus._tasks.native import walk_item
+from pubtools.exodus._tasks.planner import Transfer, plan
+from pubtools.exodus._tasks.push import (
+    RSYNC_EXCLUDES,
+    ExodusPushTask,
+    filters_files,
+)
+
+
+def make_tree(tmpdir):
+    top = tmpdir.mkdir("top")
+    sub = top.mkdir("sub")
+    top.join("a.txt").write("a")
+    top.join("b.txt").write("b")
+    sub.join("c.txt").write("c")
+    return str(top)
+
+
+def test_plan_duplicates(tmpdir):
+    top = make_tree(tmpdir)
+    items = [
+        PushItem(name="a", src=top, dest=["/dest"]),
+        PushItem(name="b", src=top + "//", dest=["/dest/top/"]),
+        PushItem(name="c", src=top, dest=["dest/"]),
+    ]
+
+    assert list(plan(items)) == [Transfer(top, ("/dest",), None)]
+
+
+def test_plan_nested(tmpdir):
+    top = make_tree(tmpdir)
+    items = [
+        PushItem(name="top", src=top + "/", dest=["/dest"]),
+        PushItem(name="sub", src=os.path.join(top, "sub"), dest=["/dest"]),
+        PushItem(
+            name="c",
+            src=os.path.join(top, "sub", "c.txt"),
+            dest=["/dest/sub/"],
+        ),
+        # Same source, different destination: must be kept
+        PushItem(name="other", src=os.path.join(top, "sub"), dest=["/other"]),
+    ]
+
+    assert list(plan(items)) == [
+        Transfer(top + "/", ("/dest",), None),
+        Transfer(os.path.join(top, "sub"), ("/other",), None),
+    ]
+
+
+def test_plan_nested_excluded(tmpdir):
+    top = make_tree(tmpdir)
+    top_dir = tmpdir.join("top")
+    top_dir.join(".lock").write("lock")
+    items = [
+        PushItem(name="top", src=top + "/", dest=["/dest"]),
+        PushItem(name="lock", src=os.path.join(top, ".lock"), dest=["/dest/"]),
+    ]
+
+    # The directory transfer would exclude .lock, so the explicit item for
+    # it can't be dropped.
+    assert len(list(plan(items, RSYNC_EXCLUDES))) == 2
+
+
+def test_plan_keep_nested(tmpdir):
+    top = make_tree(tmpdir)
+    items = [
+        PushItem(name="top", src=top + "/", dest=["/dest"]),
+        PushItem(name="sub", src=os.path.join(top, "sub"), dest=["/dest"]),
+        PushItem(name="a", src=os.path.join(top, "a.txt"), dest=["/dest/"]),
+    ]
+
+    assert list(plan(items, drop_nested=False)) == [
+        Transfer(top + "/", ("/dest",), None),
+        Transfer(os.path.join(top, "sub"), ("/dest",), None),
+        Transfer(os.path.join(top, "a.txt"), ("/dest/",), None),
+    ]
+
+
+@pytest.mark.parametrize(
+    "args,expected",
+    [
+        ([], False),
+        (["-vvv", "--dry-run", "--exodus-conf", "/conf"], False),
+        (["--exclude", "skip"], True),
+        (["--exclude=skip"], True),
+        (["--filter", "- skip"], True),
+        (["--include-from", "/list"], True),
+        (["--max-size=1M"], True),
+        (["-avC"], True),
+        (["-f", "- skip"], True),
+    ],
+)
+def test_filters_files(args, expected):
+    assert filters_files(args) is expected
+
+
+def test_transfers_with_user_excludes(tmpdir):
+    root = tmpdir.mkdir("root")
+    a = root.mkdir("a")
+    a.join("file").write("file")
+    a.mkdir("skip").join("file").write("file")
+    items = [
+        PushItem(name="a", src=str(a), dest=["/d"]),
+        PushItem(name="skip", src=str(a.join("skip")), dest=["/d/a"]),
+    ]
+
+    with mock.patch.object(
+        ExodusPushTask, "push_items", new_callable=mock.PropertyMock
+    ) as push_items:
+        push_items.return_value = items
+
+        task = ExodusPushTask(args=["staged:/some/path"])
+        assert len(list(task.transfers)) == 1
+
+        # The transfer of 'a' leaves out 'skip', which must then be pushed
+        # by its own item.
+        task = ExodusPushTask(args=["staged:/some/path", "--exclude", "skip"])
+        assert list(task.transfers) == [
+            Transfer(str(a), ("/d",), None),
+            Transfer(str(a.join("skip")), ("/d/a",), None),
+        ]
+
+
+def test_plan_merge_files(tmpdir, caplog):
+    caplog.set_level(logging.INFO, "pubtools-exodus")
+
+    top = make_tree(tmpdir)
+    items = [
+        PushItem(name="b", src=os.path.join(top, "b.txt"), dest=["/dest/"]),
+        PushItem(
+            name="a", src=os.path.join(top, "a.txt"), dest=["/dest/a.txt"]
+        ),
+        PushItem(name="a2", src=os.path.join(top, "a.txt"), dest=["/dest/"]),
+        # Renamed on push, so can't be merged
+        PushItem(
+            name="c", src=os.path.join(top, "b.txt"), dest=["/dest/c.txt"]
+        ),
+    ]
+
+    transfers = list(plan(items))
+
+    assert transfers == [
+        Transfer(os.path.join(top, "b.txt"), ("/dest/c.txt",), None),
+        Transfer(top + "/", ("/dest",), ("a.txt", "b.txt")),
+    ]
+    assert (
+        "Planned 2 transfer(s) for 4 push item(s): 1 duplicate(s) removed, "
+        "0 nested item(s) removed, 2 file(s) merged" in caplog.text
+    )
+
+    # Native engine should push exactly the merged files
+    assert sorted(walk_item(transfers[1])) == [
+        (os.path.join(top, "a.txt"), "/dest/a.txt"),
+        (os.path.join(top, "b.txt"), "/dest/b.txt"),
+    ]
+
+
+def test_plan_streams(tmpdir):
+    src = tmpdir.mkdir("src")
+    for i in range(7):
+        src.join("f%s" % i).write(str(i))
+    read = []
+
+    def items():
+        for i in range(7):
+            read.append(i)
+            yield PushItem(
+                name=str(i), src=str(src.join("f%s" % i)), dest=["/dest/"]
+            )
+
+    with mock.patch.object(planner, "MAX_MERGED_FILES", 3):
+        transfers = plan(items())
+
+        # Each transfer is planned once enough files are read to fill it,
+        # without reading further.
+        assert next(transfers).files == ("f0", "f1", "f2")
+        assert read == [0, 1, 2]
+        assert next(transfers).files == ("f3", "f4", "f5")
+        assert read == [0, 1, 2, 3, 4, 5]
+        assert list(transfers) == [
+            Transfer(str(src.join("f6")), ("/dest/",), None)
+        ]
+
+
+def test_plan_held_files(tmpdir):
+    items = []
+    for i in range(6):
+        subdir = "d%s" % (i % 2)
+        path = tmpdir.join(subdir).ensure("f%s" % i)
+        items.append(
+            PushItem(name=str(i), src=str(path), dest=["/%s/" % subdir])
+        )
+    top = tmpdir.join("d1")
+    # A directory containing files held back, seen before they're merged.
+    items.append(PushItem(name="d1", src=str(top) + "/", dest=["/d1"]))
+
+    with mock.patch.object(planner, "MAX_HELD_FILES", 4):
+        transfers = list(plan(items))
+
+    # Once too many files are held, the oldest group is planned. The files
+    # held for d1 are then found to be covered by d1.
+    assert transfers == [
+        Transfer(str(tmpdir.join("d0")) + "/", ("/d0",), ("f0", "f2", "f4")),
+        Transfer(str(top) + "/", ("/d1",), None),
+    ]
+
+
+def test_rsync_cmd_files_from(tmpdir):
+    top = make_tree(tmpdir)
+    task = ExodusPushTask(args=["staged:/some/path"])
+    transfer = Transfer(top + "/", ("/dest",), ("a.txt", "b.txt"))
+
+    cmd = task.rsync_cmd(transfer, "some-publish")
+
+    files_from = [arg for arg in cmd if arg.startswith("--files-from=")]
+    assert len(files_from) == 1
+    path = files_from[0].split("=", 1)[1]
+    with open(path) as f:
+        assert f.read() == "a.txt\nb.txt\n"
+    assert cmd[-2:] == [top + "/", "exodus:/dest"]
+
+    shutil.rmtree(task._files_dir)
@@ -0,0 +1,164 @@
+import threading
+
+import pytest
+from six.moves.urllib.parse import urljoin
+
+from pubtools.exodus._handles import CommitTask
+from pubtools.exodus._poller import shared_poller
+from pubtools.exodus.gateway import ExodusGatewaySession
+
+
+@pytest.fixture
+def session(patch_env_vars, monkeypatch):
+    monkeypatch.setenv("EXODUS_GW_WAIT_MIN", "0.01")
+    monkeypatch.setenv("EXODUS_GW_WAIT", "0.05")
+    out = ExodusGatewaySession()
+    out._populate_exodus_gw_vars()
+    return out
+
+
+def mock_task(requests_mock, session, task_id, states, headers=None):
+    """Mocks a commit task reporting each of 'states' in turn, returning
+    the commit."""
+
+    task = {
+        "id": task_id,
+        "publish_id": "publish-%s" % task_id,
+        "links": {"self": "/task/%s" % task_id},
+    }
+    requests_mock.get(
+        urljoin(session.gw_url, task["links"]["self"]),
+        [
+            {
+                "json": dict(task, state=state),
+                "headers": headers or {},
+            }
+            for state in states
+        ],
+    )
+    return CommitTask.from_json(dict(task, state="PENDING"))
+
+
+def test_poller_many_commits(session, requests_mock):
+    commits = [
+        mock_task(
+            requests_mock,
+            session,
+            "task-%s" % i,
+            ["PENDING"] * (i % 4) + ["COMPLETE"],
+        )
+        for i in range(50)
+    ]
+
+    polled_by = set()
+    requests_mock.add_matcher(
+        lambda request: polled_by.add(threading.current_thread().name)
+    )
+
+    futures = [session.watch_commit(commit) for commit in commits]
+
+    for commit, future in zip(commits, futures):
+        task = future.result(10)
+        assert task.id == commit.id
+        assert task.state == "COMPLETE"
+
+    # Every commit was polled by the one poller thread...
+    assert polled_by == set(["exodus-commit-poller"])
+    # ...each as often as its state required.
+    assert session.metrics.counters["commit_polls"] == sum(
+        i % 4 + 1 for i in range(50)
+    )
+    assert session.metrics.phases["poll_commit"][0] == 50
+
+
+def test_poller_shared(session, patch_env_vars):
+    poller = shared_poller(session)
+
+    other = ExodusGatewaySession(gw_env="other")
+    other._populate_exodus_gw_vars()
+
+    # Sessions for different environments of the same exodus-gw share a
+    # poller, using the first session's connection pool.
+    assert shared_poller(other) is poller
+    assert poller.session is session
+
+
+def test_poller_failures(session, requests_mock):
+    failed = mock_task(requests_mock, session, "failed", ["FAILED"])
+    ok = mock_task(requests_mock, session, "ok", ["PENDING", "COMPLETE"])
+    broken = mock_task(requests_mock, session, "broken", ["PENDING"])
+    requests_mock.get(
+        urljoin(session.gw_url, broken.links["self"]), status_code=404
+    )
+
+    futures = [session.watch_commit(c) for c in (failed, ok, broken)]
+
+    with pytest.raises(RuntimeError) as exc_info:
+        futures[0].result(10)
+    assert "commit failed to" in str(exc_info.value)
+    assert str(exc_info.value).endswith("failed")
+
+    # Other commits are unaffected by failures.
+    assert futures[1].result(10).state == "COMPLETE"
+    assert "404" in str(futures[2].exception(10))
+
+
+def test_poller_timeout(session, requests_mock):
+    session.timeout = 0.1
+    commit = mock_task(requests_mock, session, "slow", ["IN_PROGRESS"])
+
+    with pytest.raises(RuntimeError) as exc_info:
+        session.watch_commit(commit).result(10)
+
+    assert "Polling for exodus-gw commit slow" in str(exc_info.value)
+    assert "timed out" in str(exc_info.value)
+
+
+def test_poller_independent_intervals(session, requests_mock):
+    # A commit which asks to be polled again much later...
+    slow = mock_task(
+        requests_mock,
+        session,
+        "slow",
+        ["IN_PROGRESS"],
+        headers={"Retry-After": "60"},
+    )
+    quick = mock_task(
+        requests_mock, session, "quick", ["PENDING", "PENDING", "COMPLETE"]
+    )
+
+    slow_future = session.watch_commit(slow)
+    quick_future = session.watch_commit(quick)
+
+    # ...doesn't hold up polling of others.
+    assert quick_future.result(10).state == "COMPLETE"
+    assert not slow_future.done()
+
+    assert slow_future.cancel()
+
+
+def test_poller_cancel_during_poll(session, requests_mock):
+    commit = mock_task(requests_mock, session, "cancelled", ["COMPLETE"])
+    polling = threading.Event()
+    release = threading.Event()
+
+    def task_callback(request, context):
+        polling.set()
+        assert release.wait(10)
+        return {"id": "cancelled", "state": "COMPLETE", "links": {}}
+
+    requests_mock.get(
+        urljoin(session.gw_url, commit.links["self"]), json=task_callback
+    )
+
+    future = session.watch_commit(commit)
+    assert polling.wait(10)
+
+    # Cancelled while its task is being requested...
+    assert future.cancel()
+    release.set()
+
+    # ...the poller carries on watching other commits.
+    other = mock_task(requests_mock, session, "other", ["COMPLETE"])
+    assert session.watch_commit(other).result(10).state == "COMPLETE"
+    assert future.cancelled()
@@ -1,10 +1,19 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
 
+import pytest
 from pubtools.pluggy import pm, task_context
+from requests.exceptions import HTTPError
 
 from .conftest import FakePublishOptions
 
 
+@pytest.fixture
+def eager_publish(monkeypatch):
+    monkeypatch.setenv("EXODUS_PULP_EAGER_PUBLISH", "true")
+
+
 def test_exodus_pulp_typical(successful_gw_task, caplog):
     caplog.set_level(logging.DEBUG, "pubtools-exodus")
 
@@ -47,7 +56,7 @@ def test_exodus_pulp_typical(successful_gw_task, caplog):
         )
 
 
-def test_exodus_pulp_no_publish(patch_env_vars, caplog):
+def test_exodus_pulp_no_publish(successful_gw_task, requests_mock, caplog):
     caplog.set_level(logging.DEBUG, "pubtools-exodus")
 
     with task_context():
@@ -55,6 +64,10 @@ def test_exodus_pulp_no_publish(patch_env_vars, caplog):
 
         assert "No exodus-gw publish to commit" in caplog.text
 
+    # Unless created eagerly, no publish is created until a repository
+    # needs one.
+    assert not requests_mock.request_history
+
 
 def test_exodus_pulp_disabled(monkeypatch, caplog):
     monkeypatch.setenv("EXODUS_ENABLED", "False")
@@ -65,3 +78,127 @@ def test_exodus_pulp_disabled(monkeypatch, caplog):
         pm.hook.pulp_repository_pre_publish(repository=None, options={})
 
     assert caplog.text == ""
+
+
+def test_exodus_pulp_eager_publish(
+    successful_gw_task, requests_mock, eager_publish
+):
+    with task_context():
+        # Publish should be created at task start, without waiting for a
+        # repository to be published.
+        handler = [
+            plugin
+            for plugin in pm.get_plugins()
+            if getattr(plugin, "publish_future", None)
+        ][0]
+        publish = handler.publish_future.result(timeout=10)
+        assert publish["id"] == "497f6eca-6276-4993-bfeb-53cbbbba6f08"
+
+        def pre_publish(_):
+            return [
+                ret
+                for ret in pm.hook.pulp_repository_pre_publish(
+                    repository=None, options=FakePublishOptions()
+                )
+                if ret is not None
+            ][0]
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(pre_publish, range(16)))
+
+        assert (
+            results
+            == [
+                FakePublishOptions(
+                    rsync_extra_args=[
+                        "--exodus-publish=497f6eca-6276-4993-bfeb-53cbbbba6f08"
+                    ]
+                )
+            ]
+            * 16
+        )
+
+        # Many repositories, but only one publish.
+        posts = [
+            req
+            for req in requests_mock.request_history
+            if req.url == successful_gw_task["publish"]["url"]
+        ]
+        assert len(posts) == 1
+
+
+def test_exodus_pulp_eager_publish_failed(
+    patch_env_vars, requests_mock, eager_publish
+):
+    requests_mock.get(
+        "https://exodus-gw.test.redhat.com/whoami", status_code=401
+    )
+
+    with task_context():
+        # The error from creating the publish should be raised from the
+        # hook which needs it.
+        with pytest.raises(HTTPError) as exc_info:
+            pm.hook.pulp_repository_pre_publish(
+                repository=None, options=FakePublishOptions()
+            )
+
+        assert "401" in str(exc_info.value)
+
+
+def test_exodus_pulp_background_commit(
+    successful_gw_task, requests_mock, monkeypatch, caplog
+):
+    monkeypatch.setenv("EXODUS_PULP_BACKGROUND_COMMIT", "true")
+    caplog.set_level(logging.DEBUG, "pubtools-exodus")
+
+    task_url = successful_gw_task["task"]["url"]
+    in_progress = dict(successful_gw_task["task"]["response"])
+    in_progress["state"] = "IN_PROGRESS"
+    polled = Event()
+    release = Event()
+
+    def task_callback(request, context):
+        polled.set()
+        # Hold the commit in progress until the task has moved on.
+        assert release.wait(10)
+        return successful_gw_task["task"]["response"]
+
+    requests_mock.get(task_url, json=task_callback)
+
+    with task_context():
+        pm.hook.pulp_repository_pre_publish(
+            repository=None, options=FakePublishOptions()
+        )
+
+        # Flush should return while the commit is still being polled.
+        pm.hook.task_pulp_flush()
+
+        assert "Committing exodus-gw publish" in caplog.text
+        assert polled.wait(10)
+        assert "Committed exodus-gw publish" not in caplog.text
+
+        release.set()
+
+    # Commit completion is awaited when the task stops.
+    assert (
+        "Committed exodus-gw publish 497f6eca-6276-4993-bfeb-53cbbbba6f08"
+        in caplog.text
+    )
+
+
+def test_exodus_pulp_background_commit_failed(
+    successful_gw_task, requests_mock, monkeypatch
+):
+    monkeypatch.setenv("EXODUS_PULP_BACKGROUND_COMMIT", "1")
+
+    failed = dict(successful_gw_task["task"]["response"], state="FAILED")
+    requests_mock.get(successful_gw_task["task"]["url"], json=failed)
+
+    with pytest.raises(RuntimeError) as exc_info:
+        with task_context():
+            pm.hook.pulp_repository_pre_publish(
+                repository=None, options=FakePublishOptions()
+            )
+            pm.hook.task_pulp_flush()
+
+    assert "failed" in str(exc_info.value)
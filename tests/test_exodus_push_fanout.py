@@ -0,0 +1,133 @@
+import logging
+import os
+import re
+
+import pytest
+
+from pubtools.exodus._tasks.push import entry_point
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data", "exodus_push")
+GW_URL = "https://exodus-gw.test.redhat.com"
+
+
+@pytest.fixture
+def stage_gw(successful_gw_task, requests_mock):
+    # Mock a second environment alongside the "test" environment.
+    publish = {
+        "id": "5c2f4b64-35f6-4a0c-a4c7-5f4d0d5c7c3b",
+        "env": "stage",
+        "links": {
+            "self": "/stage/publish/5c2f4b64-35f6-4a0c-a4c7-5f4d0d5c7c3b",
+            "commit": "/stage/publish/5c2f4b64-35f6-4a0c-a4c7-5f4d0d5c7c3b"
+            "/commit",
+        },
+    }
+    commit = {
+        "id": "0d1c4a3e-8f3f-4b71-8a58-46e3c4f0cb6f",
+        "publish_id": publish["id"],
+        "state": "COMPLETE",
+        "links": {"self": "/task/0d1c4a3e-8f3f-4b71-8a58-46e3c4f0cb6f"},
+    }
+    requests_mock.post(GW_URL + "/stage/publish", json=publish)
+    requests_mock.post(GW_URL + publish["links"]["commit"], json=commit)
+    requests_mock.get(GW_URL + commit["links"]["self"], json=commit)
+
+    for env in ("test", "stage"):
+        upload = re.compile(GW_URL + "/upload/%s/" % env)
+        requests_mock.head(upload, status_code=404)
+        requests_mock.put(upload, status_code=200)
+
+    for link in (
+        publish["links"]["self"],
+        successful_gw_task["publish"]["response"]["links"]["self"],
+    ):
+        requests_mock.put(GW_URL + link, status_code=200)
+
+    yield publish
+
+
+def requests_to(requests_mock, method, prefix):
+    return [
+        req
+        for req in requests_mock.request_history
+        if req.method == method and req.path.startswith(prefix)
+    ]
+
+
+def test_push_fanout(stage_gw, requests_mock, caplog):
+    caplog.set_level(logging.INFO, "pubtools-exodus")
+    src = os.path.join(TEST_DATA, "source-2")
+
+    entry_point(
+        [
+            "--engine",
+            "native",
+            "--env",
+            "test",
+            "--env",
+            "stage",
+            "staged:%s" % src,
+        ]
+    )
+
+    # Both files were uploaded to, and published in, each environment.
+    for env in ("test", "stage"):
+        assert len(requests_to(requests_mock, "PUT", "/upload/%s/" % env)) == 2
+        items = requests_to(requests_mock, "PUT", "/%s/publish/" % env)
+        assert sorted(i["web_uri"] for i in items[0].json()) == [
+            "/origin/RAW/test-2.txt",
+            "/origin/RAW/test.txt",
+        ]
+        assert requests_to(requests_mock, "POST", "/%s/publish/" % env)
+
+    assert "Exodus push is complete" in caplog.text
+
+
+def test_push_fanout_env_failure(stage_gw, requests_mock, caplog):
+    src = os.path.join(TEST_DATA, "source-2")
+    requests_mock.put(re.compile(GW_URL + "/upload/stage/"), status_code=403)
+
+    with pytest.raises(RuntimeError) as exc_info:
+        entry_point(
+            [
+                "--engine",
+                "native",
+                "--env",
+                "test",
+                "--env",
+                "stage",
+                "staged:%s" % src,
+            ]
+        )
+
+    assert str(exc_info.value) == (
+        "Exodus push failed for environment(s): stage"
+    )
+    assert "Push to exodus-gw environment stage failed" in caplog.text
+
+    # The healthy environment was still published and committed...
+    assert requests_to(requests_mock, "PUT", "/test/publish/")
+    assert requests_to(requests_mock, "POST", "/test/publish/497f")
+    # ...but the failed one wasn't committed.
+    assert not requests_to(requests_mock, "POST", stage_gw["links"]["commit"])
+
+
+def test_push_fanout_rsync_engine(patch_env_vars, capsys):
+    with pytest.raises(SystemExit):
+        entry_point(["--env", "test", "--env", "stage", "staged:/tmp"])
+
+    assert "--env may be given only once" in capsys.readouterr().err
+
+
+def test_push_single_env(successful_gw_task, requests_mock, monkeypatch):
+    # A single --env is used in place of EXODUS_GW_ENV.
+    monkeypatch.setenv("EXODUS_GW_ENV", "other")
+    src = os.path.join(TEST_DATA, "source-2")
+    requests_mock.head(re.compile(GW_URL + "/upload/test/"), status_code=200)
+    requests_mock.put(
+        GW_URL + successful_gw_task["publish"]["response"]["links"]["self"]
+    )
+
+    entry_point(["--engine", "native", "--env", "test", "staged:%s" % src])
+
+    assert requests_to(requests_mock, "POST", "/test/publish")
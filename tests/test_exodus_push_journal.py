@@ -0,0 +1,204 @@
+import io
+import json
+import os
+
+import mock
+import pytest
+from pushsource import PushItem
+from six import u
+
+from pubtools.exodus._handles import Publish
+from pubtools.exodus._tasks.journal import PushJournal, item_digest
+from pubtools.exodus._tasks.push import ExodusPushTask
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data", "exodus_push")
+SOURCE = "staged:%s" % os.path.join(TEST_DATA, "source-1")
+PUBLISH_ID = "497f6eca-6276-4993-bfeb-53cbbbba6f08"
+
+
+def fake_proc(ret):
+    proc = mock.Mock()
+    proc.stdout = io.StringIO(u("output\n"))
+    proc.wait.return_value = ret
+    return proc
+
+
+def dests(mock_popen):
+    # Sorted, as items may be loaded from the source in any order.
+    return sorted(call[0][0][-1] for call in mock_popen.call_args_list)
+
+
+def mock_publish_state(successful_gw_task, requests_mock, **kwargs):
+    """Mocks exodus-gw's response for the state of the journaled publish."""
+
+    publish = successful_gw_task["publish"]
+    requests_mock.get(
+        publish["url"] + "/" + PUBLISH_ID,
+        **(kwargs or {"json": dict(publish["response"], state="PENDING")})
+    )
+
+
+def fail_second_item(mock_popen, args):
+    """Runs a journaled push which fails on its second item."""
+
+    mock_popen.side_effect = lambda cmd, **_: fake_proc(
+        1 if "x86_64" in cmd[-1] else 0
+    )
+    with pytest.raises(RuntimeError):
+        ExodusPushTask(args=args).run()
+
+
+@mock.patch("pubtools.exodus._tasks.push.subprocess.Popen")
+def test_push_resume(mock_popen, successful_gw_task, requests_mock, tmpdir):
+    journal = str(tmpdir.join("journal"))
+    args = ["--journal", journal, SOURCE]
+
+    # First push fails on the second item
+    fail_second_item(mock_popen, args)
+
+    assert dests(mock_popen) == [
+        "exodus:kickstart-repo-s390x",
+        "exodus:kickstart-repo-x86_64",
+    ]
+    with open(journal) as f:
+        records = [json.loads(line) for line in f]
+    assert records[0]["publish"]["id"] == PUBLISH_ID
+    assert len(records) == 2
+
+    # Resumed push should only push the failed item, to the same publish
+    mock_popen.reset_mock()
+    mock_popen.side_effect = lambda cmd, **_: fake_proc(0)
+    mock_publish_state(successful_gw_task, requests_mock)
+    publishes = requests_mock.call_count
+
+    ExodusPushTask(args=["--resume"] + args).run()
+
+    assert dests(mock_popen) == ["exodus:kickstart-repo-x86_64"]
+    assert mock_popen.call_args[0][0][2] == PUBLISH_ID
+    new_requests = requests_mock.request_history[publishes:]
+    assert [r.method for r in new_requests if r.url.endswith("/publish")] == []
+
+    # Journal is removed once the push is complete
+    assert not os.path.exists(journal)
+
+
+@pytest.mark.parametrize(
+    "response,state",
+    [
+        ({"json": {"id": PUBLISH_ID, "state": "COMMITTED"}}, "COMMITTED"),
+        ({"json": {"id": PUBLISH_ID, "state": "FAILED"}}, "FAILED"),
+        ({"status_code": 404, "json": {"detail": "Not Found"}}, "missing"),
+    ],
+)
+@mock.patch("pubtools.exodus._tasks.push.subprocess.Popen")
+def test_push_resume_stale_publish(
+    mock_popen,
+    successful_gw_task,
+    requests_mock,
+    tmpdir,
+    caplog,
+    response,
+    state,
+):
+    journal = str(tmpdir.join("journal"))
+    args = ["--journal", journal, SOURCE]
+
+    fail_second_item(mock_popen, args)
+
+    # The journaled publish can no longer be written to...
+    mock_popen.reset_mock()
+    mock_popen.side_effect = lambda cmd, **_: fake_proc(0)
+    mock_publish_state(successful_gw_task, requests_mock, **response)
+    publishes = requests_mock.call_count
+
+    ExodusPushTask(args=["--resume"] + args).run()
+
+    assert (
+        "Journaled exodus-gw publish %s is %s, starting a new push"
+        % (PUBLISH_ID, state)
+        in caplog.text
+    )
+
+    # ...so everything is pushed again, to a new publish.
+    assert dests(mock_popen) == [
+        "exodus:kickstart-repo-s390x",
+        "exodus:kickstart-repo-x86_64",
+    ]
+    new_requests = requests_mock.request_history[publishes:]
+    assert [r.method for r in new_requests if r.url.endswith("/publish")] == [
+        "POST"
+    ]
+    assert not os.path.exists(journal)
+
+
+@mock.patch("pubtools.exodus._tasks.push.subprocess.Popen")
+def test_push_resume_missing_journal(
+    mock_popen, successful_gw_task, tmpdir, caplog
+):
+    mock_popen.side_effect = lambda cmd, **_: fake_proc(0)
+    journal = str(tmpdir.join("journal"))
+
+    ExodusPushTask(args=["--resume", "--journal", journal, SOURCE]).run()
+
+    # Should push everything to a new publish
+    assert "No push journal at %s to resume" % journal in caplog.text
+    assert mock_popen.call_count == 2
+
+
+def test_push_resume_different_source(successful_gw_task, tmpdir):
+    journal = PushJournal(str(tmpdir.join("journal")))
+    journal.start(
+        {"id": PUBLISH_ID, "links": {}},
+        "staged:/other",
+        "https://exodus-gw.test.redhat.com",
+        "test",
+    )
+    journal.close()
+
+    task = ExodusPushTask(args=["--resume", "--journal", journal.path, SOURCE])
+    with pytest.raises(RuntimeError) as exc_info:
+        task.run()
+
+    assert "is for a push of staged:/other to test" in str(exc_info.value)
+
+
+def test_push_resume_requires_journal(successful_gw_task):
+    with pytest.raises(SystemExit):
+        ExodusPushTask(args=["--resume", SOURCE]).run()
+
+
+def test_journal_incomplete_line(tmpdir):
+    path = str(tmpdir.join("journal"))
+    journal = PushJournal(path)
+    journal.start({"id": "abc", "links": {}}, "src", "url", "env")
+    journal.done("digest-1")
+    journal.close()
+
+    # Simulate a crash part way through writing a line
+    with open(path, "a") as f:
+        f.write('{"done": "dig')
+
+    journal = PushJournal(path)
+    assert journal.read("src", "url", "env") == Publish(id="abc", links={})
+    assert journal.completed == set(["digest-1"])
+
+    journal.reopen()
+    journal.done("digest-2")
+    journal.close()
+
+    journal = PushJournal(path)
+    journal.read("src", "url", "env")
+    assert journal.completed == set(["digest-1", "digest-2"])
+
+
+def test_item_digest_changes(tmpdir):
+    src = tmpdir.mkdir("src")
+    src.join("file").write("1")
+    item = PushItem(name="src", src=str(src), dest=["/dest"])
+
+    digest = item_digest(item)
+    assert item_digest(item) == digest
+    assert item_digest(item, extra=["--dry-run"]) != digest
+
+    src.join("file").write("22")
+    assert item_digest(item) != digest
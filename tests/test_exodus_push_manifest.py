@@ -0,0 +1,183 @@
+import io
+import os
+import re
+
+import mock
+import pytest
+from six import u
+
+from pubtools.exodus._tasks.manifest import PushManifest
+from pubtools.exodus._tasks.push import ExodusPushTask
+
+UPLOAD_URL = "https://exodus-gw.test.redhat.com/upload/test/"
+
+
+class FakeRsync(object):
+    """Records exodus-rsync runs, including the content of any
+    --files-from, which is removed after the push."""
+
+    def __init__(self, ret=0):
+        self.ret = ret
+        self.runs = []
+
+    def __call__(self, cmd, **_):
+        files = None
+        for arg in cmd:
+            if arg.startswith("--files-from="):
+                with open(arg.split("=", 1)[1]) as f:
+                    files = f.read().split()
+        self.runs.append((cmd[-2], cmd[-1], files))
+
+        proc = mock.Mock()
+        proc.stdout = io.StringIO(u("output\n"))
+        proc.wait.return_value = self.ret
+        return proc
+
+
+@pytest.fixture
+def staged(tmpdir):
+    raw = tmpdir.mkdir("staged").mkdir("dest").mkdir("RAW")
+    raw.join("a.txt").write("a")
+    raw.mkdir("sub").join("b.txt").write("b")
+    return tmpdir.join("staged")
+
+
+def push(staged, manifest, *args):
+    task = ExodusPushTask(
+        args=list(args) + ["--manifest", manifest, "staged:%s" % staged]
+    )
+    task.run()
+
+
+@pytest.mark.parametrize(
+    "args", [[], ["--hash-processes", "2"]], ids=["threads", "processes"]
+)
+@mock.patch("pubtools.exodus._tasks.push.subprocess.Popen")
+def test_manifest_rsync(mock_popen, successful_gw_task, staged, tmpdir, args):
+    manifest = str(tmpdir.join("manifest.db"))
+    raw = staged.join("dest", "RAW")
+
+    # First push: everything is new, so item is pushed as usual
+    mock_popen.side_effect = rsync = FakeRsync()
+    push(staged, manifest, *args)
+    assert rsync.runs == [(str(raw), "exodus:dest", None)]
+
+    # Nothing changed: nothing is pushed
+    mock_popen.side_effect = rsync = FakeRsync()
+    push(staged, manifest, *args)
+    assert rsync.runs == []
+
+    # Only added and changed files are pushed, to the same destination
+    raw.join("sub", "b.txt").write("bb")
+    raw.join("c.txt").write("c")
+    mock_popen.side_effect = rsync = FakeRsync()
+    push(staged, manifest, *args)
+    assert rsync.runs == [
+        (str(raw) + "/", "exodus:/dest/RAW", ["c.txt", "sub/b.txt"])
+    ]
+
+
+@mock.patch("pubtools.exodus._tasks.push.subprocess.Popen")
+def test_manifest_failed_push(mock_popen, successful_gw_task, staged, tmpdir):
+    manifest = str(tmpdir.join("manifest.db"))
+
+    mock_popen.side_effect = FakeRsync(ret=1)
+    with pytest.raises(RuntimeError):
+        push(staged, manifest)
+
+    # Failed push isn't recorded, so everything is pushed again
+    mock_popen.side_effect = rsync = FakeRsync()
+    push(staged, manifest)
+    assert len(rsync.runs) == 1
+    assert rsync.runs[0][2] is None
+
+
+@mock.patch("pubtools.exodus._tasks.push.subprocess.Popen")
+def test_manifest_dry_run(mock_popen, successful_gw_task, staged, tmpdir):
+    manifest = str(tmpdir.join("manifest.db"))
+    raw = staged.join("dest", "RAW")
+
+    mock_popen.side_effect = rsync = FakeRsync()
+    push(staged, manifest, "--dry-run")
+    assert len(rsync.runs) == 1
+
+    # A dry run published nothing, so a real push must push everything...
+    mock_popen.side_effect = rsync = FakeRsync()
+    push(staged, manifest)
+    assert rsync.runs == [(str(raw), "exodus:dest", None)]
+
+    # ...after which it's up to date.
+    mock_popen.side_effect = rsync = FakeRsync()
+    push(staged, manifest)
+    assert rsync.runs == []
+
+
+def test_manifest_native(successful_gw_task, requests_mock, staged, tmpdir):
+    manifest = str(tmpdir.join("manifest.db"))
+    publish_url = "https://exodus-gw.test.redhat.com/test/publish/%s" % (
+        successful_gw_task["publish"]["response"]["id"]
+    )
+    requests_mock.put(publish_url)
+    requests_mock.head(re.compile(UPLOAD_URL), status_code=404)
+    requests_mock.put(re.compile(UPLOAD_URL))
+    seen = []
+
+    def added_items():
+        out = []
+        for req in requests_mock.request_history[len(seen) :]:
+            seen.append(req)
+            if req.method == "PUT" and req.url == publish_url:
+                out.extend(item["web_uri"] for item in req.json())
+        return sorted(out)
+
+    push(staged, manifest, "--engine=native")
+    assert added_items() == ["/dest/RAW/a.txt", "/dest/RAW/sub/b.txt"]
+
+    push(staged, manifest, "--engine=native")
+    assert added_items() == []
+
+    staged.join("dest", "RAW", "a.txt").write("aa")
+    push(staged, manifest, "--engine=native")
+    assert added_items() == ["/dest/RAW/a.txt"]
+
+
+def test_manifest_scopes(tmpdir):
+    path = str(tmpdir.join("manifest.db"))
+
+    with PushManifest(path, "scope-1") as manifest:
+        assert not manifest.is_current("/a", 1, "abc")
+        manifest.record("/a", 1, "abc")
+        manifest.commit()
+        assert manifest.is_current("/a", 1, "abc")
+        assert not manifest.is_current("/a", 1, "def")
+
+    # Entries are separate per scope
+    with PushManifest(path, "scope-2") as manifest:
+        assert not manifest.is_current("/a", 1, "abc")
+
+
+def test_manifest_shared(tmpdir):
+    path = str(tmpdir.join("manifest.db"))
+    first = PushManifest(path, "scope-1")
+    second = PushManifest(path, "scope-2")
+
+    # Pushes sharing a manifest don't lock each other out while running...
+    assert not first.is_current("/a", 1, "abc")
+    first.record("/a", 1, "abc")
+    assert not second.is_current("/b", 1, "def")
+    second.record("/b", 1, "def")
+    second.commit()
+    assert first.is_current("/a", 1, "abc")
+    first.commit()
+
+    # ...and each sees only the other's committed entries.
+    third = PushManifest(path, "scope-1")
+    third.record("/c", 1, "ghi")
+    assert second.is_current("/b", 1, "def")
+    third.close()
+
+    with PushManifest(path, "scope-1") as manifest:
+        assert manifest.is_current("/a", 1, "abc")
+        assert not manifest.is_current("/c", 1, "ghi")
+    first.close()
+    second.close()
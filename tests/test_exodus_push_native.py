@@ -0,0 +1,183 @@
+import hashlib
+import logging
+import os
+
+import mock
+import pytest
+from pushsource import PushItem, Source
+
+from pubtools.exodus._tasks.native import walk_item
+from pubtools.exodus._tasks.push import entry_point
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data", "exodus_push")
+
+
+def sha256(path):
+    with open(path, "rb") as fileobj:
+        return hashlib.sha256(fileobj.read()).hexdigest()
+
+
+def test_walk_item_dir(tmpdir):
+    tmpdir.mkdir("RAW").mkdir("sub").join("b.txt").write("b")
+    tmpdir.join("RAW", "a.txt").write("a")
+    tmpdir.join("RAW", ".lock").write("")
+    tmpdir.join("RAW", ".nfs0001").write("")
+
+    src = str(tmpdir.join("RAW"))
+    excludes = [".nfs*", ".lock"]
+
+    # Without a trailing slash, directory itself goes under dest.
+    item = PushItem(name="test", src=src, dest=["some/dest"])
+    assert [uri for _, uri in walk_item(item, excludes)] == [
+        "/some/dest/RAW/a.txt",
+        "/some/dest/RAW/sub/b.txt",
+    ]
+
+    # With a trailing slash, only the directory content does.
+    item = PushItem(name="test", src=src + "/", dest=["some/dest"])
+    assert [uri for _, uri in walk_item(item, excludes)] == [
+        "/some/dest/a.txt",
+        "/some/dest/sub/b.txt",
+    ]
+
+
+def test_walk_item_file(tmpdir):
+    tmpdir.join("a.txt").write("a")
+    src = str(tmpdir.join("a.txt"))
+
+    item = PushItem(name="test", src=src, dest=["some/dest/"])
+    assert list(walk_item(item)) == [(src, "/some/dest/a.txt")]
+
+    item = PushItem(name="test", src=src, dest=["some/dest/renamed"])
+    assert list(walk_item(item)) == [(src, "/some/dest/renamed")]
+
+
+@pytest.mark.parametrize(
+    "extra_args", [[], ["--hash-processes", "2"]], ids=["threads", "processes"]
+)
+def test_exodus_push_native(
+    successful_gw_task, requests_mock, caplog, extra_args
+):
+    caplog.set_level(logging.DEBUG, "pubtools-exodus")
+
+    src = os.path.join(TEST_DATA, "source-2")
+    test_txt = os.path.join(src, "origin", "RAW", "test.txt")
+    test2_txt = os.path.join(src, "origin", "RAW", "test-2.txt")
+
+    upload_url = "https://exodus-gw.test.redhat.com/upload/test/%s"
+    # One blob already exists, the other must be uploaded.
+    requests_mock.head(upload_url % sha256(test2_txt), status_code=200)
+    requests_mock.head(upload_url % sha256(test_txt), status_code=404)
+    requests_mock.put(upload_url % sha256(test_txt), status_code=200)
+
+    publish_url = "https://exodus-gw.test.redhat.com/test/publish/%s" % (
+        successful_gw_task["publish"]["response"]["id"]
+    )
+    requests_mock.put(publish_url, status_code=200)
+
+    entry_point(
+        ["--engine", "native", "--workers", "2", "staged:%s" % src]
+        + extra_args
+    )
+
+    puts = [
+        req for req in requests_mock.request_history if req.method == "PUT"
+    ]
+    assert [req.url for req in puts] == [
+        upload_url % sha256(test_txt),
+        publish_url,
+    ]
+    # Items may be added in any order.
+    assert sorted(puts[1].json(), key=lambda item: item["web_uri"]) == [
+        {
+            "web_uri": "/origin/RAW/test-2.txt",
+            "object_key": sha256(test2_txt),
+            "content_type": "text/plain",
+        },
+        {
+            "web_uri": "/origin/RAW/test.txt",
+            "object_key": sha256(test_txt),
+            "content_type": "text/plain",
+        },
+    ]
+
+    # Publish is committed after items were added.
+    assert requests_mock.request_history[-2].url.endswith("/commit")
+    assert "Exodus push is complete" in caplog.text
+
+
+def test_exodus_push_native_upload_error(successful_gw_task, requests_mock):
+    src = os.path.join(TEST_DATA, "source-2")
+
+    requests_mock.head(
+        "/upload/test/%s" % sha256(os.path.join(src, "origin/RAW/test.txt")),
+        status_code=404,
+    )
+    requests_mock.head(
+        "/upload/test/%s" % sha256(os.path.join(src, "origin/RAW/test-2.txt")),
+        status_code=403,
+    )
+
+    with pytest.raises(Exception) as exc_info:
+        entry_point(["--engine", "native", "staged:%s" % src])
+
+    assert "403" in str(exc_info.value)
+    assert not any(
+        req.url.endswith("/commit") for req in requests_mock.request_history
+    )
+
+
+def test_exodus_push_native_extra_args(successful_gw_task):
+    with pytest.raises(SystemExit):
+        entry_point(["--engine", "native", "--dry-run", "staged:/some/path"])
+
+
+@mock.patch("pubtools.exodus.gateway.UPLOAD_CHUNK_SIZE", 4)
+def test_exodus_push_native_multipart(
+    successful_gw_task, requests_mock, tmpdir
+):
+    tmpdir.join("big.bin").write("0123456789")
+    key = sha256(str(tmpdir.join("big.bin")))
+
+    upload_url = "https://exodus-gw.test.redhat.com/upload/test/%s" % key
+    requests_mock.head(upload_url, status_code=404)
+    requests_mock.post(
+        upload_url + "?uploads=",
+        text=(
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<InitiateMultipartUploadResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+            "<UploadId>my-upload</UploadId>"
+            "</InitiateMultipartUploadResult>"
+        ),
+    )
+    requests_mock.put(upload_url, headers={"ETag": '"etag"'})
+    requests_mock.post(upload_url + "?uploadId=my-upload", text="")
+    requests_mock.put("/test/publish/497f6eca-6276-4993-bfeb-53cbbbba6f08")
+
+    Source.register_backend(
+        "bigfile",
+        lambda: [
+            PushItem(
+                name="big.bin",
+                src=str(tmpdir.join("big.bin")),
+                dest=["/content/"],
+            )
+        ],
+    )
+
+    entry_point(["--engine", "native", "bigfile:"])
+
+    parts = [
+        req
+        for req in requests_mock.request_history
+        if req.method == "PUT" and "partNumber" in req.url
+    ]
+    assert [req.body for req in parts] == [b"0123", b"4567", b"89"]
+    assert [req.qs["partnumber"] for req in parts] == [["1"], ["2"], ["3"]]
+
+    complete = [
+        req
+        for req in requests_mock.request_history
+        if req.method == "POST" and "uploadid=my-upload" in req.url.lower()
+    ][0]
+    assert complete.body.count(b'<ETag>"etag"</ETag>') == 3
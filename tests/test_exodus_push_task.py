@@ -8,6 +8,7 @@ from pushsource import PushItem, Source
 from six import u
 
 from pubtools.exodus._tasks.push import ExodusPushTask, doc_parser, entry_point
+from pubtools.exodus._tasks.rsyncout import BUFFER_SIZE
 
 TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data", "exodus_push")
 
@@ -19,6 +20,18 @@ def test_exodus_push_task_args():
     assert task.args.__dict__ == {
         "debug": False,
         "verbose": 0,
+        "workers": 1,
+        "engine": "rsync",
+        "hash_cache": None,
+        "hash_cache_size": 1000000,
+        "coalesce": True,
+        "hash_processes": 0,
+        "item_retries": 3,
+        "retry_budget": 10,
+        "envs": None,
+        "manifest": None,
+        "journal": None,
+        "resume": False,
         "source": "staged:/some/path",
     }
     # Should have no extra_args
@@ -111,10 +124,35 @@ def test_exodus_push_typical(
     assert mock_popen.call_count == 2
     for cmd in cmds:
         mock_popen.assert_any_call(
-            cmd, stderr=-2, stdout=-1, universal_newlines=True
+            cmd,
+            stderr=-2,
+            stdout=-1,
+            universal_newlines=True,
+            bufsize=BUFFER_SIZE,
         )
 
 
+@mock.patch("pubtools.exodus._tasks.push.subprocess.Popen")
+def test_exodus_push_single_publish(
+    mock_popen, successful_gw_task, requests_mock, monkeypatch
+):
+    monkeypatch.setenv("EXODUS_PULP_EAGER_PUBLISH", "true")
+    mock_popen.return_value.stdout = io.StringIO(u(""))
+    mock_popen.return_value.wait.return_value = 0
+
+    entry_point(["staged:%s" % os.path.join(TEST_DATA, "source-1")])
+
+    # The push creates its own publish, and the pulp hooks loaded by its
+    # task context must not create another.
+    posts = [
+        req
+        for req in requests_mock.request_history
+        if req.method == "POST"
+        and req.url == successful_gw_task["publish"]["url"]
+    ]
+    assert len(posts) == 1
+
+
 @mock.patch(
     "sys.argv",
     [
@@ -156,7 +194,11 @@ def test_exodus_push_subprocess_error(mock_popen, successful_gw_task, caplog):
     assert "fake task info" in caplog.text
     assert "Exodus push is complete" not in caplog.text
     mock_popen.assert_called_with(
-        cmd, stderr=-2, stdout=-1, universal_newlines=True
+        cmd,
+        stderr=-2,
+        stdout=-1,
+        universal_newlines=True,
+        bufsize=BUFFER_SIZE,
     )
 
 
@@ -182,3 +224,159 @@ def test_exodus_push_unexpected_push_item(
 
     assert "Unexpected push item" in caplog.text
     mock_popen.assert_not_called()
+
+
+def fake_proc(output, ret):
+    proc = mock.Mock()
+    proc.stdout = io.StringIO(u(output))
+    proc.wait.return_value = ret
+    return proc
+
+
+@mock.patch("pubtools.exodus._tasks.push.subprocess.Popen")
+def test_exodus_push_workers(mock_popen, successful_gw_task, caplog):
+    caplog.set_level(logging.DEBUG, "pubtools-exodus")
+
+    mock_popen.side_effect = lambda cmd, **_: fake_proc(
+        "synced %s\n" % cmd[-1], 0
+    )
+
+    entry_point(
+        ["--workers", "4", "staged:%s" % os.path.join(TEST_DATA, "source-1")]
+    )
+
+    assert mock_popen.call_count == 2
+    assert "synced exodus:kickstart-repo-x86_64" in caplog.text
+    assert "synced exodus:kickstart-repo-s390x" in caplog.text
+
+    # Output of concurrent processes is labelled with the item it
+    # belongs to.
+    synced = [r.message for r in caplog.records if "synced" in r.message]
+    assert sorted(synced) == [
+        "exodus:%s: synced exodus:%s" % (dest, dest)
+        for dest in ("kickstart-repo-s390x", "kickstart-repo-x86_64")
+    ]
+
+    # Publish should've been committed once all items were pushed.
+    assert "Committed exodus-gw publish" in caplog.text
+    assert "Exodus push is complete" in caplog.text
+
+
+@mock.patch("pubtools.exodus._tasks.push.subprocess.Popen")
+def test_exodus_push_workers_fail_fast(
+    mock_popen, successful_gw_task, requests_mock, caplog
+):
+    caplog.set_level(logging.DEBUG, "pubtools-exodus")
+
+    items = [
+        PushItem(name="item-%s" % i, src="/src/%s" % i, dest=["dest-%s" % i])
+        for i in range(20)
+    ]
+    Source.register_backend("many", lambda: items)
+
+    def popen(cmd, **_):
+        if cmd[-1] == "exodus:dest-2":
+            return fake_proc("rsync error: some error\n", 23)
+        return fake_proc("", 0)
+
+    mock_popen.side_effect = popen
+
+    with pytest.raises(RuntimeError) as exc_info:
+        entry_point(["--workers", "2", "many:"])
+
+    assert str(exc_info.value) == "Exodus push failed"
+    assert "rsync error: some error" in caplog.text
+
+    # Remaining items should not have been pushed after the failure
+    # was noticed, and nothing should have been committed.
+    assert mock_popen.call_count < len(items)
+    assert not requests_mock.request_history[-1].url.endswith("/commit")
+    assert "Committing exodus-gw publish" not in caplog.text
+
+
+class FlakyRsync(object):
+    """Fakes exodus-rsync, failing pushes to some destinations a number of
+    times before succeeding."""
+
+    def __init__(self, failures, output="rsync error: error in socket IO\n"):
+        self.failures = dict(failures)
+        self.output = output
+        self.calls = []
+
+    def __call__(self, cmd, **_):
+        dest = cmd[-1]
+        self.calls.append(dest)
+        if self.failures.get(dest):
+            self.failures[dest] -= 1
+            return fake_proc(self.output, 10)
+        return fake_proc("", 0)
+
+
+@pytest.fixture
+def many_items():
+    items = [
+        PushItem(name="item-%s" % i, src="/src/%s" % i, dest=["dest-%s" % i])
+        for i in range(6)
+    ]
+    Source.register_backend("many", lambda: items)
+    yield items
+
+
+@mock.patch("pubtools.exodus._tasks.push.subprocess.Popen")
+@mock.patch.object(ExodusPushTask, "retry_wait", 0.2)
+def test_exodus_push_retry(mock_popen, successful_gw_task, many_items, caplog):
+    mock_popen.side_effect = rsync = FlakyRsync({"exodus:dest-0": 2})
+
+    entry_point(["--workers", "2", "many:"])
+
+    # The failed item was retried until it succeeded...
+    assert rsync.calls.count("exodus:dest-0") == 3
+    assert "Retrying /src/0 in" in caplog.text
+    assert "Exodus push is complete" in caplog.text
+
+    # ...while the other items were pushed in the meantime, rather than
+    # waiting for it.
+    assert rsync.calls.index("exodus:dest-5") < len(rsync.calls) - 1
+
+
+@mock.patch("pubtools.exodus._tasks.push.subprocess.Popen")
+@mock.patch.object(ExodusPushTask, "retry_wait", 0)
+def test_exodus_push_retry_fatal(mock_popen, successful_gw_task, many_items):
+    # Output shows this failure won't be fixed by retrying.
+    mock_popen.side_effect = rsync = FlakyRsync(
+        {"exodus:dest-0": 1}, output="error: 403 Forbidden\n"
+    )
+
+    with pytest.raises(RuntimeError):
+        entry_point(["many:"])
+
+    assert rsync.calls.count("exodus:dest-0") == 1
+
+
+@mock.patch("pubtools.exodus._tasks.push.subprocess.Popen")
+@mock.patch.object(ExodusPushTask, "retry_wait", 0)
+def test_exodus_push_item_retries_exhausted(
+    mock_popen, successful_gw_task, many_items, caplog
+):
+    mock_popen.side_effect = rsync = FlakyRsync({"exodus:dest-0": 10})
+
+    with pytest.raises(RuntimeError):
+        entry_point(["--item-retries", "2", "many:"])
+
+    assert rsync.calls.count("exodus:dest-0") == 3
+    assert "Giving up on /src/0 after 3 attempts" in caplog.text
+
+
+@mock.patch("pubtools.exodus._tasks.push.subprocess.Popen")
+@mock.patch.object(ExodusPushTask, "retry_wait", 0)
+def test_exodus_push_retry_budget(
+    mock_popen, successful_gw_task, many_items, caplog
+):
+    mock_popen.side_effect = FlakyRsync(
+        {"exodus:dest-0": 1, "exodus:dest-1": 1, "exodus:dest-2": 1}
+    )
+
+    with pytest.raises(RuntimeError):
+        entry_point(["--retry-budget", "2", "many:"])
+
+    assert "Retry budget of 2 exhausted" in caplog.text
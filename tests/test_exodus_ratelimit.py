@@ -0,0 +1,133 @@
+import logging
+import threading
+import time
+
+import pytest
+from requests.exceptions import HTTPError
+
+from pubtools.exodus._pool import GatewayRetry
+from pubtools.exodus._ratelimit import RateLimiter
+from pubtools.exodus.gateway import ExodusGatewaySession
+
+GW_URL = "https://exodus-gw.test.redhat.com"
+
+
+def timed(fn, *args):
+    start = time.time()
+    fn(*args)
+    return time.time() - start
+
+
+def test_rate():
+    limiter = RateLimiter(rate=50, burst=1)
+
+    def acquire_many():
+        for _ in range(11):
+            limiter.acquire()
+
+    # First request uses the burst, the rest are limited to 50/s.
+    assert timed(acquire_many) >= 0.19
+
+
+def test_unlimited():
+    limiter = RateLimiter()
+
+    assert timed(lambda: [limiter.acquire() for _ in range(1000)]) < 0.5
+
+
+def test_throttle_pauses_all_callers():
+    limiter = RateLimiter()
+    limiter.throttle(0.3)
+
+    waited = []
+    thread = threading.Thread(
+        target=lambda: waited.append(timed(limiter.acquire))
+    )
+    thread.start()
+    thread.join()
+
+    assert waited[0] >= 0.25
+
+
+def test_throttle_reduces_rate():
+    limiter = RateLimiter(rate=100)
+
+    limiter.throttle(0)
+    assert limiter._state["rate"] == pytest.approx(50, rel=0.01)
+    limiter.throttle(0)
+    assert limiter._state["rate"] == pytest.approx(25, rel=0.01)
+
+    # Rate recovers, but no higher than configured.
+    limiter._state["updated"] -= 1000
+    limiter.acquire()
+    assert limiter._state["rate"] == 100
+
+
+def test_shared_between_processes(tmpdir):
+    path = str(tmpdir.join("limiter.json"))
+
+    # Limiters sharing a file behave as one, as would limiters in
+    # different processes.
+    first = RateLimiter(path=path)
+    second = RateLimiter(path=path)
+
+    first.throttle(0.3)
+    assert timed(second.acquire) >= 0.25
+
+
+def test_gateway_retry():
+    retry = GatewayRetry(total=5, status_forcelist=[429, 503])
+
+    # Throttled responses are left to the caller...
+    assert not retry.is_retry("GET", 429)
+    assert not retry.is_retry("GET", 503, has_retry_after=True)
+    # ...while other failures are retried as usual.
+    assert retry.is_retry("GET", 503)
+
+
+def test_gateway_throttled(patch_env_vars, requests_mock, caplog):
+    caplog.set_level(logging.INFO, "pubtools-exodus")
+    url = GW_URL + "/whoami"
+    requests_mock.get(
+        url,
+        [
+            {"status_code": 429, "headers": {"Retry-After": "0.3"}},
+            {"status_code": 200, "json": {}},
+        ],
+    )
+
+    first = ExodusGatewaySession()
+    first._populate_exodus_gw_vars()
+    second = ExodusGatewaySession()
+    second._populate_exodus_gw_vars()
+
+    # The throttled request is retried after Retry-After...
+    assert first.do_request(method="GET", url=url).status_code == 200
+    assert requests_mock.call_count == 2
+    assert first.metrics.counters["throttled"] == 1
+    assert "pausing requests for 0.3s" in caplog.text
+
+    # ...and every session for the same exodus-gw shares the limiter.
+    assert first.limiter is not None
+    second.do_request(method="GET", url=url)
+    assert second.limiter is first.limiter
+
+
+def test_gateway_throttled_retries_exhausted(
+    patch_env_vars, requests_mock, monkeypatch
+):
+    monkeypatch.setenv("EXODUS_GW_RETRIES", "2")
+    url = GW_URL + "/whoami"
+    requests_mock.get(
+        url, status_code=503, headers={"Retry-After": "0"}, reason="Busy"
+    )
+
+    session = ExodusGatewaySession()
+    session._populate_exodus_gw_vars()
+
+    with pytest.raises(HTTPError) as exc_info:
+        session.do_request(method="GET", url=url)
+
+    assert "503 Server Error" in str(exc_info.value)
+
+    assert requests_mock.call_count == 3
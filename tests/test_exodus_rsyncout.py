@@ -0,0 +1,147 @@
+import io
+import logging
+
+import mock
+import pytest
+from six import u
+
+from pubtools.exodus._metrics import Metrics
+from pubtools.exodus._tasks import rsyncout
+from pubtools.exodus._tasks.rsyncout import RsyncOutput
+
+STATS_OUTPUT = u("""origin/RAW/test.txt
+origin/RAW/test-2.txt
+
+Number of files: 1,234 (reg: 1,200, dir: 34)
+Number of created files: 2
+Number of regular files transferred: 2
+Total file size: 12,345,678 bytes
+Total transferred file size: 2,048 bytes
+
+sent 2,310 bytes  received 57 bytes  4,734.00 bytes/sec
+total size is 12,345,678  speedup is 5,215.71
+""")
+
+
+def test_stats(caplog):
+    caplog.set_level(logging.INFO, "pubtools-exodus")
+    metrics = Metrics()
+
+    output = RsyncOutput("exodus:origin", metrics)
+    output.consume(io.StringIO(STATS_OUTPUT))
+    output.finish(0)
+
+    assert output.stats == {
+        "rsync_files": 1234,
+        "rsync_files_transferred": 2,
+        "rsync_total_bytes": 12345678,
+        "rsync_transferred_bytes": 2048,
+        "rsync_sent_bytes": 2310,
+        "rsync_received_bytes": 57,
+        "rsync_speed": 4734.0,
+    }
+    assert metrics.counters["rsync_files"] == 1234
+    assert metrics.counters["rsync_transferred_bytes"] == 2048
+    assert "rsync_speed" not in metrics.counters
+
+    # Only the summary was logged, not the output.
+    assert [r.message for r in caplog.records] == [
+        "exodus:origin: sent 2310 bytes at 4734.00 bytes/sec"
+    ]
+
+
+def test_debug_logs_everything(caplog):
+    caplog.set_level(logging.DEBUG, "pubtools-exodus")
+
+    output = RsyncOutput("exodus:origin")
+    output.consume(io.StringIO(u("a\nb\n")))
+
+    assert [r.message for r in caplog.records] == [
+        "exodus:origin: a",
+        "exodus:origin: b",
+    ]
+
+
+def test_progress_rate_limited(caplog):
+    caplog.set_level(logging.INFO, "pubtools-exodus")
+    now = [0.0]
+
+    with mock.patch.object(rsyncout, "monotonic", lambda: now[0]):
+        output = RsyncOutput("exodus:origin")
+        for i in range(100):
+            now[0] = i
+            output.feed("line %s" % i)
+
+    # One line logged per interval, at most.
+    assert [r.message for r in caplog.records] == [
+        "exodus:origin: line 30",
+        "exodus:origin: line 60",
+        "exodus:origin: line 90",
+    ]
+
+
+def test_failure_logs_tail(caplog):
+    caplog.set_level(logging.INFO, "pubtools-exodus")
+
+    output = RsyncOutput("exodus:origin")
+    output.consume(
+        io.StringIO(u("".join("line %s\n" % i for i in range(1000))))
+    )
+    output.finish(23)
+
+    (record,) = caplog.records
+    assert record.levelno == logging.ERROR
+    lines = record.getMessage().splitlines()
+    assert lines[0] == (
+        "exodus:origin: exodus-rsync failed with exit code 23, "
+        "last 50 of 1000 line(s) of output:"
+    )
+    assert lines[1:] == ["line %s" % i for i in range(950, 1000)]
+
+
+@pytest.mark.parametrize(
+    "returncode,lines,retryable",
+    [
+        (0, [], False),
+        (10, ["rsync error: error in socket IO"], True),
+        (30, [], True),
+        (1, ["Error: 503 Service Unavailable"], True),
+        (1, ["upload failed: status code: 502"], True),
+        (1, ["HTTP/1.1 429"], True),
+        (1, ["dial tcp: i/o timeout"], True),
+        (1, ["syntax error"], False),
+        (10, ["Error: 403 Forbidden"], False),
+        (10, ["request failed, status 401"], False),
+        (-15, ["connection reset by peer"], False),
+    ],
+)
+def test_retryable(returncode, lines, retryable):
+    output = RsyncOutput("exodus:origin")
+    for line in lines:
+        output.feed(line)
+
+    assert output.retryable(returncode) is retryable
+
+
+@pytest.mark.parametrize("returncode", [1, 23])
+def test_not_retryable_numbers(returncode):
+    output = RsyncOutput("exodus:origin")
+    # Numbers which happen to match HTTP statuses, outside of any error.
+    for line in [
+        "Packages/kernel-503.rpm",
+        "Packages/libfoo-429.1-504.el9.x86_64.rpm",
+        "sent 502 bytes  received 401 bytes  903.00 bytes/sec",
+        "Total transferred file size: 403 bytes",
+        "rsync error: some files could not be transferred (code 23)",
+    ]:
+        output.feed(line)
+
+    assert output.retryable(returncode) is False
+
+
+def test_status_in_file_name_not_fatal():
+    output = RsyncOutput("exodus:origin")
+    output.feed("Packages/kernel-403.rpm")
+    output.feed("Error: 503 Service Unavailable")
+
+    assert output.retryable(1) is True